@@ -0,0 +1,102 @@
+"""
+"Recent Activities" stream.
+
+The newest comments are kept in a small cached buffer of
+``(message_id, is_premium)`` pairs. Rendering the sidebar therefore costs one
+primary-key lookup of at most ``ACTIVITY_STREAM_SIZE`` comments (with user
+and room joined), and the Jobs & Referrals filter is applied to the buffered
+flag instead of joining the topic table.
+
+base.signals drops the buffer when comments are created or deleted and when
+a post is edited, and the next read rebuilds it with one query. Dropping is
+safe when two comments arrive at once; editing the cached list in place
+would let one of them overwrite the other. As with the topic cache, signals
+only reach the process that made the change, so the buffer also expires
+after ``ACTIVITY_CACHE_TIMEOUT`` seconds.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import SimpleLazyObject
+
+from .topics import JOBS_REFERRALS_SLUG, topic_id_for_slug
+
+ACTIVITY_BUFFER_CACHE_KEY = 'activity:recent'
+# Entries kept in the buffer; larger than the page size so that hiding
+# premium activity for free users still leaves a full page.
+ACTIVITY_BUFFER_SIZE = 200
+
+
+def stream_size():
+    return getattr(settings, 'ACTIVITY_STREAM_SIZE', 20)
+
+
+def _timeout():
+    return getattr(settings, 'ACTIVITY_CACHE_TIMEOUT', 60)
+
+
+def _load_buffer():
+    from .models import Message
+
+    jobs_topic_id = topic_id_for_slug(JOBS_REFERRALS_SLUG)
+    rows = (
+        Message.objects.order_by('-created', '-id')
+        .values_list('id', 'room__topic_id')[:ACTIVITY_BUFFER_SIZE]
+    )
+    return [
+        (message_id, jobs_topic_id is not None and topic_id == jobs_topic_id)
+        for message_id, topic_id in rows
+    ]
+
+
+def _get_buffer():
+    entries = cache.get(ACTIVITY_BUFFER_CACHE_KEY)
+    if entries is None:
+        entries = _load_buffer()
+        cache.set(ACTIVITY_BUFFER_CACHE_KEY, entries, timeout=_timeout())
+    return entries
+
+
+def forget_message(message_id):
+    entries = cache.get(ACTIVITY_BUFFER_CACHE_KEY)
+    if entries is None:
+        return
+    if any(entry[0] == message_id for entry in entries):
+        # Drop the buffer instead of leaving it short; the next read refills it.
+        reset()
+
+
+def reset():
+    """Drop the buffer now, and again once the current transaction commits."""
+    cache.delete(ACTIVITY_BUFFER_CACHE_KEY)
+    # A read between now and the commit rebuilds it without the change.
+    transaction.on_commit(lambda: cache.delete(ACTIVITY_BUFFER_CACHE_KEY))
+
+
+def recent_activity(include_premium, limit=None):
+    """
+    Return the newest visible comments, newest first, with user and room loaded.
+
+    The list is built on first use, so views whose template never renders
+    the sidebar pay nothing.
+    """
+    return SimpleLazyObject(lambda: _recent_activity(include_premium, limit or stream_size()))
+
+
+def _recent_activity(include_premium, limit):
+    from .models import Message
+
+    ids = [
+        message_id for message_id, is_premium in _get_buffer()
+        if include_premium or not is_premium
+    ][:limit]
+    if not ids:
+        return []
+    messages = Message.objects.filter(id__in=ids).select_related('user', 'room')
+    by_id = {message.id: message for message in messages}
+    return [by_id[message_id] for message_id in ids if message_id in by_id]
+
+
+def bounded_activity(queryset, limit=None):
+    """Cap an already-filtered Message queryset for the activity sidebar."""
+    return queryset.select_related('user', 'room').order_by('-created', '-id')[:limit or stream_size()]
@@ -15,7 +15,18 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ["id", "username", "name", "affiliation", "is_paid"]
 
 
-class RoomSerializer(serializers.ModelSerializer):
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """ModelSerializer that takes an optional ``fields`` argument restricting which fields are output."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class RoomSerializer(DynamicFieldsModelSerializer):
     host = UserSerializer(read_only=True)
     topic = TopicSerializer(read_only=True)
     participants = UserSerializer(many=True, read_only=True)
@@ -32,3 +43,78 @@ class RoomSerializer(serializers.ModelSerializer):
             "updated",
             "created",
         ]
+
+
+class RoomValuesSerializer:
+    """
+    Read-only fast path producing exactly RoomSerializer's output from ``.values()`` rows.
+
+    ``values(queryset, fields)`` turns a Room queryset into dict rows with the
+    host columns joined in; ``RoomValuesSerializer(rows, fields).data`` then
+    builds the same dicts RoomSerializer would, without model instances or
+    per-row field objects. Topics come from the cached catalogue and
+    participants from one query over the page. Datetimes go through DRF's own
+    DateTimeField so formatting and time zones match.
+    """
+
+    host_columns = {f"host__{name}": name for name in UserSerializer.Meta.fields}
+
+    def __init__(self, rows, fields=None):
+        self.rows = rows
+        self.fields = [name for name in RoomSerializer.Meta.fields if fields is None or name in fields]
+        self._datetime = serializers.DateTimeField()
+
+    @classmethod
+    def values(cls, queryset, fields=None):
+        columns = ["id", "created", "updated"]
+        for name in ("name", "description"):
+            if fields is None or name in fields:
+                columns.append(name)
+        if fields is None or "topic" in fields:
+            columns.append("topic_id")
+        if fields is None or "host" in fields:
+            columns += ["host_id", *cls.host_columns]
+        return queryset.values(*columns)
+
+    @property
+    def data(self):
+        from base.topics import get_topics
+
+        fields = self.fields
+        topics = {}
+        if "topic" in fields:
+            topics = {topic.id: {"id": topic.id, "name": topic.name, "slug": topic.slug} for topic in get_topics()}
+        participants = {}
+        if "participants" in fields and self.rows:
+            participants = self._participants([row["id"] for row in self.rows])
+        to_datetime = self._datetime.to_representation
+
+        data = []
+        for row in self.rows:
+            item = {}
+            for name in fields:
+                if name == "host":
+                    item[name] = self._host(row) if row["host_id"] is not None else None
+                elif name == "topic":
+                    item[name] = topics.get(row["topic_id"]) if row["topic_id"] is not None else None
+                elif name == "participants":
+                    item[name] = participants.get(row["id"], [])
+                elif name in ("updated", "created"):
+                    item[name] = to_datetime(row[name])
+                else:
+                    item[name] = row[name]
+            data.append(item)
+        return data
+
+    def _host(self, row):
+        return {name: row[column] for column, name in self.host_columns.items()}
+
+    @staticmethod
+    def _participants(room_ids):
+        through = Room.participants.through
+        columns = [f"user__{name}" for name in UserSerializer.Meta.fields]
+        by_room = {}
+        rows = through.objects.filter(room_id__in=room_ids).order_by("room_id", "user_id").values_list("room_id", *columns)
+        for room_id, *values in rows:
+            by_room.setdefault(room_id, []).append(dict(zip(UserSerializer.Meta.fields, values)))
+        return by_room
@@ -5,5 +5,8 @@ from . import views
 urlpatterns = [
     path("", views.getRoutes, name="api-routes"),
     path("rooms/", views.getRooms, name="api-rooms"),
+    path("rooms/batch/", views.getRoomsBatch, name="api-rooms-batch"),
+    path("rooms/changes/", views.getRoomChanges, name="api-room-changes"),
     path("rooms/<str:pk>/", views.getRoom, name="api-room"),
+    path("export/<str:dataset>/", views.exportData, name="api-export"),
 ]
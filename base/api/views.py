@@ -1,13 +1,119 @@
+import hashlib
+from collections.abc import Mapping
+
+from django.conf import settings
+from django.db.models import Count, Max, Prefetch, Sum
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
 from rest_framework.decorators import api_view
 from rest_framework.decorators import permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from base.models import Room
-from .serializers import RoomSerializer
+from base import events, export
+from base.changes import CursorExpired, room_changes
+from base.models import Room, User
+from base.pagination import InvalidCursor, keyset_paginate
+from base.topics import JOBS_REFERRALS_SLUG, attach_topics, get_topics, topic_id_for_slug
+from .serializers import RoomSerializer, RoomValuesSerializer, UserSerializer
+
+
+def _requested_fields(raw):
+    """
+    Parse a ``fields=a,b`` value into a list of RoomSerializer fields (None = all).
+
+    Raises ValueError naming any unknown field.
+    """
+    if not raw:
+        return None
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in RoomSerializer.Meta.fields]
+    if unknown:
+        raise ValueError(', '.join(unknown))
+    return fields
+
+
+def _room_queryset(fields, rooms=None):
+    """Rooms with exactly the relations the requested fields need loaded up front."""
+    rooms = Room.objects.all() if rooms is None else rooms
+    if fields is None or 'host' in fields:
+        rooms = rooms.select_related('host')
+    if fields is None or 'participants' in fields:
+        rooms = rooms.prefetch_related(
+            Prefetch('participants', queryset=User.objects.only(*UserSerializer.Meta.fields).order_by('id'))
+        )
+    return rooms
+
+
+def _visible_rooms(request):
+    """``(rooms, hidden_topic_id)``: every room the caller may see, and the premium topic hidden from them."""
+    rooms = Room.objects.all()
+    jobs_topic_id = topic_id_for_slug(JOBS_REFERRALS_SLUG)
+    if jobs_topic_id is None or getattr(request.user, 'is_paid', False):
+        return rooms, None
+    return rooms.exclude(topic_id=jobs_topic_id), jobs_topic_id
+
+
+def _room_listing(request, rooms, fields):
+    """
+    The queryset a list endpoint paginates, and the function that serializes one page of it.
+
+    Endpoints named in ``API_FAST_SERIALIZERS`` read ``.values()`` rows and
+    use RoomValuesSerializer; the others load model instances for RoomSerializer.
+    Both produce the same JSON.
+    """
+    if request.resolver_match.url_name in getattr(settings, 'API_FAST_SERIALIZERS', ()):
+        return RoomValuesSerializer.values(rooms, fields), lambda items: RoomValuesSerializer(items, fields).data
+
+    def serialize(items):
+        if fields is None or 'topic' in fields:
+            attach_topics(items)
+        return RoomSerializer(items, many=True, fields=fields).data
 
+    return _room_queryset(fields, rooms), serialize
 
-JOBS_REFERRALS_SLUG = 'jobs-referrals'
+
+def _etag(request, parts):
+    """
+    The ETag for a response built from ``parts``.
+
+    The caller's premium flag and query string are always part of it, so
+    paid and free users (and different pages or field sets) never share one.
+    There is no ``Last-Modified``: deletions, topic renames and a second edit
+    within the same second leave ``updated`` where it was, so
+    If-Modified-Since alone would get stale 304s.
+    """
+    parts = [getattr(request.user, 'is_paid', False), request.query_params.urlencode(), *parts]
+    return quote_etag(hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest())
+
+
+def _topics_signature():
+    # Topic renames change the nested topic without touching Room.updated.
+    return hashlib.md5(repr([(t.id, t.name, t.slug) for t in get_topics()]).encode()).hexdigest()
+
+
+def _conditional(request, etag, build):
+    """Answer with 304 when the client's ETag still matches; otherwise ``build()`` the response."""
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = build()
+    response['ETag'] = etag
+    # Private and always revalidated: the content depends on who is asking.
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie', 'Authorization'])
+    return response
+
+
+def _api_page_size(request):
+    default = getattr(settings, 'API_PAGE_SIZE', 50)
+    maximum = getattr(settings, 'API_MAX_PAGE_SIZE', 200)
+    try:
+        size = int(request.query_params.get('page_size', default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
 
 
 @api_view(['GET'])
@@ -15,25 +121,192 @@ JOBS_REFERRALS_SLUG = 'jobs-referrals'
 def getRoutes(request):
     routes = [
         'GET /api',
-        'GET /api/rooms',
-        'GET /api/rooms/:id'
+        'GET /api/rooms?fields=&page_size=&cursor=',
+        'GET /api/rooms/changes?since=&fields=&page_size=',
+        'GET /api/rooms/batch?ids=1,2,3&fields=',
+        'POST /api/rooms/batch {"ids": [1, 2, 3], "fields": [...]}',
+        'GET /api/rooms/:id',
+        'GET /api/export/:dataset?output=ndjson|csv (staff only)',
     ]
     return Response(routes)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def getRooms(request):
-    rooms = Room.objects.all()
-    if not getattr(request.user, 'is_paid', False):
-        rooms = rooms.exclude(topic__slug=JOBS_REFERRALS_SLUG)
-    serializer = RoomSerializer(rooms, many=True)
-    return Response(serializer.data)
+    """
+    Rooms, newest first, one keyset page at a time.
+
+    The body stays a plain list; the next page is advertised in a
+    ``Link: <...>; rel="next"`` header. ``?fields=id,name`` limits the
+    output (and the queries) to those fields, ``?page_size=`` sets the page length.
+    """
+    try:
+        fields = _requested_fields(request.query_params.get('fields'))
+    except ValueError as exc:
+        return Response({'detail': f'Unknown fields: {exc}.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    rooms, _ = _visible_rooms(request)
+
+    # One aggregate over the visible set decides whether anything changed:
+    # edits (and host or participant profile changes) bump ``updated``,
+    # deletions lower the count and joins move the participant total.
+    state = rooms.order_by().aggregate(
+        latest=Max('updated'), total=Count('id'), participants=Sum('participant_count'),
+    )
+    parts = ['rooms', state['latest'], state['total'], state['participants']]
+    if fields is None or 'topic' in fields:
+        parts.append(_topics_signature())
+    etag = _etag(request, parts)
+
+    def build():
+        listing, serialize = _room_listing(request, rooms, fields)
+        try:
+            page = keyset_paginate(listing, 'created', request.query_params.get('cursor'), _api_page_size(request))
+        except InvalidCursor:
+            return Response({'detail': 'Invalid cursor.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = Response(serialize(page.items))
+        if page.has_next:
+            params = request.query_params.copy()
+            params['cursor'] = page.next_cursor
+            response['Link'] = f'<{request.build_absolute_uri(request.path)}?{params.urlencode()}>; rel="next"'
+        return response
+
+    return _conditional(request, etag, build)
+
+def _batch_ids(raw):
+    """Parse a list of ids (or a comma-separated string) into unique ints, keeping order."""
+    if isinstance(raw, str):
+        raw = [part for part in raw.split(',') if part.strip()]
+    if not isinstance(raw, list):
+        raise ValueError('ids must be a list')
+    ids = []
+    for value in raw:
+        if isinstance(value, bool):
+            raise ValueError(value)
+        value = int(value)
+        if value not in ids:
+            ids.append(value)
+    return ids
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def getRoomsBatch(request):
+    """
+    Many rooms by id in one round trip, in the order asked for.
+
+    ``GET ?ids=1,2,3`` or ``POST {"ids": [...]}`` for long lists, up to
+    ``API_MAX_PAGE_SIZE`` ids. Rooms that don't exist are listed under
+    ``missing`` and premium rooms the caller can't open under ``forbidden``;
+    neither fails the rest of the batch. ``fields`` works as for /api/rooms/.
+    """
+    params = request.data if request.method == 'POST' else request.query_params
+    if not isinstance(params, Mapping):
+        return Response({'detail': 'Expected a JSON object with "ids".'}, status=status.HTTP_400_BAD_REQUEST)
+    raw_fields = params.get('fields')
+    if isinstance(raw_fields, list):
+        raw_fields = ','.join(map(str, raw_fields))
+    try:
+        fields = _requested_fields(raw_fields)
+    except ValueError as exc:
+        return Response({'detail': f'Unknown fields: {exc}.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        ids = _batch_ids(params.get('ids', []))
+    except (TypeError, ValueError):
+        return Response({'detail': 'ids must be a list of room ids.'}, status=status.HTTP_400_BAD_REQUEST)
+    max_ids = getattr(settings, 'API_MAX_PAGE_SIZE', 200)
+    if len(ids) > max_ids:
+        return Response({'detail': f'At most {max_ids} ids per batch.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # One narrow query sorts the ids into visible, forbidden and missing.
+    topics = dict(Room.objects.filter(id__in=ids).values_list('id', 'topic_id'))
+    _, hidden_topic_id = _visible_rooms(request)
+    forbidden = [
+        room_id for room_id in ids
+        if room_id in topics and hidden_topic_id is not None and topics[room_id] == hidden_topic_id
+    ]
+    visible = [room_id for room_id in ids if room_id in topics and room_id not in forbidden]
+
+    rooms = []
+    if visible:
+        listing, serialize = _room_listing(request, Room.objects.filter(id__in=visible), fields)
+        position = {room_id: i for i, room_id in enumerate(visible)}
+        items = sorted(listing, key=lambda item: position[item['id'] if isinstance(item, dict) else item.pk])
+        rooms = serialize(items)
+    return Response({
+        'rooms': rooms,
+        'missing': [room_id for room_id in ids if room_id not in topics],
+        'forbidden': forbidden,
+    })
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def getRoom(request, pk):
-    room = Room.objects.get(id=pk)
-    if getattr(room.topic, 'slug', None) == JOBS_REFERRALS_SLUG and not getattr(request.user, 'is_paid', False):
+    state = get_object_or_404(Room.objects.values('topic_id', 'updated', 'participant_count'), id=pk)
+    jobs_topic_id = topic_id_for_slug(JOBS_REFERRALS_SLUG)
+    if jobs_topic_id is not None and state['topic_id'] == jobs_topic_id and not getattr(request.user, 'is_paid', False):
         return Response({'detail': 'Premium access required for Jobs & Referrals.'}, status=status.HTTP_403_FORBIDDEN)
-    serializer = RoomSerializer(room, many=False)
-    return Response(serializer.data)
\ No newline at end of file
+    etag = _etag(request, ['room', pk, state['updated'], state['participant_count'], _topics_signature()])
+
+    def build():
+        room = _room_queryset(None).get(id=pk)
+        attach_topics([room])
+        serializer = RoomSerializer(room, many=False)
+        return Response(serializer.data)
+
+    return _conditional(request, etag, build)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def getRoomChanges(request):
+    """
+    Rooms created or updated since ``?since=<cursor>``, and the ids of rooms deleted since then.
+
+    Pass the returned ``cursor`` as ``since`` on the next call; while
+    ``more`` is true there are further changes waiting. Without ``since``
+    every room is sent. An expired cursor gets 410 Gone: start over
+    without ``since``.
+    """
+    try:
+        fields = _requested_fields(request.query_params.get('fields'))
+    except ValueError as exc:
+        return Response({'detail': f'Unknown fields: {exc}.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    rooms, hidden_topic_id = _visible_rooms(request)
+    listing, serialize = _room_listing(request, rooms, fields)
+    try:
+        change_set = room_changes(listing, request.query_params.get('since'), _api_page_size(request), hidden_topic_id)
+    except InvalidCursor:
+        return Response({'detail': 'Invalid cursor.'}, status=status.HTTP_400_BAD_REQUEST)
+    except CursorExpired:
+        return Response({'detail': 'Cursor expired; sync again without "since".'}, status=status.HTTP_410_GONE)
+
+    return Response({
+        'rooms': serialize(change_set.rooms),
+        'deleted': change_set.deleted,
+        'cursor': change_set.cursor,
+        'more': change_set.has_more,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def exportData(request, dataset):
+    """Stream a whole dataset (see base.export.DATASETS) as NDJSON, or CSV with ``?output=csv``."""
+    # Not ``?format=``: DRF reserves that for picking a renderer.
+    output_format = request.query_params.get('output', 'ndjson')
+    if dataset not in export.DATASETS:
+        return Response({'detail': f'Unknown dataset "{dataset}".'}, status=status.HTTP_404_NOT_FOUND)
+    if output_format not in export.FORMATS:
+        return Response({'detail': f'Unknown output "{output_format}".'}, status=status.HTTP_400_BAD_REQUEST)
+    blocks = export.export_blocks(dataset, output_format)
+    if events.streaming_supported(request._request):
+        blocks = export.async_blocks(blocks)
+    content_type = 'text/csv' if output_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(blocks, content_type=f'{content_type}; charset=utf-8')
+    extension = 'csv' if output_format == 'csv' else 'ndjson'
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{extension}"'
+    return response
@@ -0,0 +1,135 @@
+"""
+Delta sync for clients that keep a local copy of the rooms feed.
+
+``/api/rooms/changes/?since=<cursor>`` returns the rooms created or updated
+after the cursor, walking the ``(updated, id)`` index forwards, plus the ids
+of rooms deleted since then, read from the RoomTombstone log that
+base.signals appends to. Every response carries the cursor for the next
+call, so a polling client only ever transfers what changed.
+
+A room moved into the premium topic gets a tombstone too, filed under the
+topic it left, so free clients drop it. Tombstones of rooms the caller can
+currently see (a paid client, or a room moved back out) are not sent; those
+rooms come back as updates instead.
+
+Anything that bumps ``Room.updated`` re-sends the room, including comments
+and votes, whose counts are not part of the payload. Clients may receive a
+room whose fields are all unchanged; that is the price of keysetting on the
+one indexed timestamp the feed caches already rely on.
+
+A call without ``since`` starts a full sync: every room, oldest change
+first, and no tombstones (there is nothing to delete yet).
+
+Tombstones are pruned after ``CHANGES_TOMBSTONE_RETENTION_DAYS`` (see the
+``prune_room_tombstones`` command). A cursor issued before that window
+raises CursorExpired and the client has to start over.
+"""
+import base64
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Room, RoomTombstone
+from .pagination import InvalidCursor, cursor_for, keyset_paginate
+
+
+class CursorExpired(Exception):
+    pass
+
+
+class ChangeSet:
+    def __init__(self, rooms, deleted, cursor, has_more):
+        self.rooms = rooms
+        self.deleted = deleted
+        self.cursor = cursor
+        self.has_more = has_more
+
+
+def tombstone_retention():
+    return timedelta(days=getattr(settings, 'CHANGES_TOMBSTONE_RETENTION_DAYS', 30))
+
+
+def _encode(room_cursor, tombstone_id, issued):
+    raw = json.dumps([room_cursor, tombstone_id, issued], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        room_cursor, tombstone_id, issued = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        tombstone_id, issued = int(tombstone_id), int(issued)
+    except (ValueError, TypeError):
+        raise InvalidCursor(token)
+    if room_cursor is not None and not isinstance(room_cursor, str):
+        raise InvalidCursor(token)
+    return room_cursor, tombstone_id, issued
+
+
+def room_changes(rooms, since=None, page_size=50, hidden_topic_id=None):
+    """
+    Return a ChangeSet of ``rooms`` changed after the ``since`` cursor.
+
+    ``rooms`` is the caller's visible queryset (model instances or
+    ``.values()`` rows with ``id`` and ``updated``); ``hidden_topic_id`` hides the
+    tombstones of rooms from a topic the caller can't see. Raises
+    InvalidCursor for a malformed cursor and CursorExpired for one older
+    than the tombstone retention window.
+    """
+    issued = int(time.time())
+    if since:
+        room_cursor, tombstone_id, since_issued = _decode(since)
+        if since_issued <= issued - tombstone_retention().total_seconds():
+            raise CursorExpired(since)
+    else:
+        room_cursor = None
+        tombstone_id = RoomTombstone.objects.aggregate(last=Max('id'))['last'] or 0
+
+    page = keyset_paginate(rooms, 'updated', room_cursor, page_size, descending=False)
+    if page.has_next:
+        room_cursor = page.next_cursor
+    elif page.items:
+        room_cursor = cursor_for(page.items[-1], 'updated')
+
+    tombstones = RoomTombstone.objects.filter(id__gt=tombstone_id).order_by('id')
+    if hidden_topic_id is not None:
+        tombstones = tombstones.exclude(topic_id=hidden_topic_id)
+    tombstones = list(tombstones.values_list('id', 'room_id')[:page_size + 1])
+    more_tombstones = len(tombstones) > page_size
+    tombstones = tombstones[:page_size]
+    if tombstones:
+        tombstone_id = tombstones[-1][0]
+    deleted = [room_id for _, room_id in tombstones]
+    if deleted:
+        visible = Room.objects.filter(id__in=deleted)
+        if hidden_topic_id is not None:
+            visible = visible.exclude(topic_id=hidden_topic_id)
+        visible = set(visible.values_list('id', flat=True))
+        deleted = [room_id for room_id in deleted if room_id not in visible]
+
+    return ChangeSet(
+        rooms=page.items,
+        deleted=deleted,
+        cursor=_encode(room_cursor, tombstone_id, issued),
+        has_more=page.has_next or more_tombstones,
+    )
+
+
+def record_deletion(room):
+    RoomTombstone.objects.create(room_id=room.pk, topic_id=room.topic_id)
+
+
+def record_hidden(room, previous_topic_id):
+    """Log ``room`` as gone for everyone who saw it in ``previous_topic_id`` (it moved into the premium topic)."""
+    RoomTombstone.objects.create(room_id=room.pk, topic_id=previous_topic_id)
+
+
+def prune_tombstones(now=None):
+    """Delete tombstones older than the retention window; returns how many were removed."""
+    cutoff = (now or timezone.now()) - tombstone_retention()
+    deleted, _ = RoomTombstone.objects.filter(deleted__lt=cutoff).delete()
+    return deleted
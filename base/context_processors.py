@@ -1,12 +1,19 @@
-from .models import DirectMessage
+from django.utils.functional import SimpleLazyObject
+
+from .events import streaming_supported
+from .messaging import unread_count
 
 
 def unread_message_count(request):
-    """Add unread message count to all templates."""
-    if request.user.is_authenticated:
-        count = DirectMessage.objects.filter(
-            receiver=request.user,
-            is_read=False
-        ).count()
-        return {'unread_message_count': count}
-    return {'unread_message_count': 0}
+    """Add unread message count to all templates; only looked up when a template uses it."""
+    def count():
+        if request.user.is_authenticated:
+            return unread_count(request.user.id)
+        return 0
+
+    return {'unread_message_count': SimpleLazyObject(count)}
+
+
+def live_message_events(request):
+    """Whether pages should open the live direct-message stream (ASGI only, see base.events)."""
+    return {'live_message_events': streaming_supported(request)}
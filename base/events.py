@@ -0,0 +1,197 @@
+"""
+Live events for the direct-message Server-Sent Events stream.
+
+Events are small JSON-serialisable dicts addressed to one user. base.signals
+publishes them after the surrounding transaction commits, and
+``views.message_events`` relays them to the user's open connections.
+
+The backend is chosen with the ``EVENTS_BACKEND`` setting:
+
+* ``InProcessEventBackend`` (default) fans events out to asyncio queues in the
+  current process. Publishing and listening must happen in the same process,
+  so it only suits a single worker.
+* ``CacheEventBackend`` writes events to the shared cache under a per-user
+  sequence number and subscribers poll it. It works across workers whenever
+  the cache itself is shared (Redis, Memcached, database or file cache).
+
+A subscription is awaited without a thread or a database connection, so an
+idle stream only costs a coroutine. That only holds under ASGI. Under WSGI
+(``runserver``, ``gunicorn webappname.wsgi``) Django collects a streaming
+async response in full before sending it, so a stream that never ends would
+send nothing and hold its worker for good. Pages therefore only open the
+stream when ``streaming_supported`` says so.
+"""
+import asyncio
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = 'base.events.InProcessEventBackend'
+
+
+class EventBackend:
+    """Interface for event backends."""
+
+    def publish(self, user_id, event):
+        """Deliver ``event`` to every current subscriber of ``user_id``. Callable from sync code."""
+        raise NotImplementedError
+
+    def subscribe(self, user_id):
+        """
+        Start listening for ``user_id``'s events; must be called on the event loop.
+
+        Returns a Subscription.
+        """
+        raise NotImplementedError
+
+
+class Subscription:
+    async def get(self, timeout):
+        """Wait up to ``timeout`` seconds; return the pending events (empty on timeout)."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class _QueueSubscription(Subscription):
+    def __init__(self, backend, user_id):
+        self.backend = backend
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    def deliver(self, event):
+        # publish() may run in a worker thread; hand the event to the subscriber's loop.
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+    async def get(self, timeout):
+        try:
+            events = [await asyncio.wait_for(self.queue.get(), timeout)]
+        except asyncio.TimeoutError:
+            return []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        return events
+
+    def close(self):
+        self.backend._unsubscribe(self)
+
+
+class InProcessEventBackend(EventBackend):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.deliver(event)
+            except RuntimeError:
+                # The subscriber's event loop has shut down.
+                self._unsubscribe(subscription)
+
+    def subscribe(self, user_id):
+        subscription = _QueueSubscription(self, user_id)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+
+class _CacheSubscription(Subscription):
+    def __init__(self, backend, user_id):
+        self.backend = backend
+        self.user_id = user_id
+        self.last_seen = None
+        self.waiting_for = None
+
+    async def _fetch(self, latest):
+        seqs = range(self.last_seen + 1, latest + 1)
+        found = await cache.aget_many([self.backend.event_key(self.user_id, seq) for seq in seqs])
+        events = []
+        for seq in seqs:
+            event = found.get(self.backend.event_key(self.user_id, seq))
+            if event is None and seq != self.waiting_for:
+                # The publisher bumps the sequence before storing the event;
+                # give it one more poll before treating the event as expired.
+                self.waiting_for = seq
+                break
+            if event is not None:
+                events.append(event)
+            self.last_seen = seq
+        return events
+
+    async def get(self, timeout):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            latest = await cache.aget(self.backend.sequence_key(self.user_id), 0)
+            if self.last_seen is None:
+                # Only events published after subscribing are delivered.
+                self.last_seen = latest
+            elif latest > self.last_seen:
+                events = await self._fetch(latest)
+                if events:
+                    return events
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return []
+            await asyncio.sleep(min(self.backend.poll_interval, remaining))
+
+
+class CacheEventBackend(EventBackend):
+    def __init__(self, poll_interval=None, event_timeout=60):
+        self.poll_interval = poll_interval or getattr(settings, 'EVENTS_POLL_INTERVAL', 1.0)
+        self.event_timeout = event_timeout
+
+    @staticmethod
+    def sequence_key(user_id):
+        return f'events:{user_id}:seq'
+
+    @staticmethod
+    def event_key(user_id, seq):
+        return f'events:{user_id}:{seq}'
+
+    def publish(self, user_id, event):
+        key = self.sequence_key(user_id)
+        cache.add(key, 0, None)
+        seq = cache.incr(key)
+        cache.set(self.event_key(user_id, seq), event, self.event_timeout)
+
+    def subscribe(self, user_id):
+        return _CacheSubscription(self, user_id)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(getattr(settings, 'EVENTS_BACKEND', DEFAULT_BACKEND))()
+    return _backend
+
+
+def publish(user_id, event):
+    get_backend().publish(user_id, event)
+
+
+def streaming_supported(request):
+    """True when ``request`` is served over ASGI, where an open event stream costs no worker."""
+    return isinstance(request, ASGIRequest)
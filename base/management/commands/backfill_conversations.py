@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = "Creates missing conversations for direct messages and recomputes last message and unread counters."
+
+    def handle(self, *args, **options):
+        from base.messaging import backfill_conversations
+
+        with transaction.atomic():
+            total = backfill_conversations()
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} conversations."))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams a dataset (rooms, messages, votes or direct-messages) as NDJSON or CSV, "
+        "reading it in id-ordered chunks so memory use stays flat however large the table is."
+    )
+
+    def add_arguments(self, parser):
+        from base.export import DATASETS, DEFAULT_CHUNK_SIZE, FORMATS
+
+        parser.add_argument("dataset", choices=sorted(DATASETS))
+        parser.add_argument("--format", choices=FORMATS, default="ndjson", dest="output_format")
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="File to write to (default: standard output).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help="Number of rows read per query.",
+        )
+
+    def handle(self, *args, **options):
+        from base.export import export_lines
+
+        lines = export_lines(options["dataset"], options["output_format"], max(1, options["chunk_size"]))
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as out:
+                written = self._write(lines, out)
+            self.stderr.write(self.style.SUCCESS(f"Exported {written} lines to {options['output']}."))
+        else:
+            self._write(lines, self.stdout)
+
+    @staticmethod
+    def _write(lines, out):
+        written = 0
+        for line in lines:
+            out.write(line)
+            written += 1
+        return written
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Applies votes waiting in the write-behind buffer (VOTE_WRITE_BEHIND) to the database. "
+        "Run it once (e.g. from cron, or after a crash to replay the spool) or with --loop as a flusher process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep flushing every VOTE_BUFFER_FLUSH_INTERVAL_MS until interrupted.",
+        )
+
+    def handle(self, *args, **options):
+        from base.vote_buffer import flush
+
+        if not options["loop"]:
+            self.stdout.write(self.style.SUCCESS(f"Flushed {flush()} buffered votes."))
+            return
+
+        interval = max(getattr(settings, "VOTE_BUFFER_FLUSH_INTERVAL_MS", 500), 50) / 1000
+        try:
+            while True:
+                flushed = flush()
+                if flushed:
+                    self.stdout.write(f"Flushed {flushed} buffered votes.")
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes deleted-room tombstones older than CHANGES_TOMBSTONE_RETENTION_DAYS. "
+        "Run it periodically (e.g. daily from cron); sync cursors older than the window get 410 Gone."
+    )
+
+    def handle(self, *args, **options):
+        from base.changes import prune_tombstones
+
+        pruned = prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {pruned} room tombstones."))
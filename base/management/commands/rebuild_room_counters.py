@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def _vote_total(aggregate):
+    from base.models import PostVote
+
+    votes = PostVote.objects.filter(room=OuterRef("pk")).values("room").annotate(total=aggregate).values("total")
+    return Coalesce(Subquery(votes, output_field=IntegerField()), Value(0))
+
+
+class Command(BaseCommand):
+    help = "Recomputes the denormalized per-post counters (score, up/down votes, participants)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of posts updated per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        from base.models import Room
+        from base.signals import participant_count_expression
+
+        chunk_size = max(1, options["chunk_size"])
+        last_id = 0
+        updated = 0
+        while True:
+            ids = list(
+                Room.objects.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                updated += Room.objects.filter(id__in=ids).update(
+                    score=_vote_total(Sum("value")),
+                    upvotes=_vote_total(Count("id", filter=Q(value=1))),
+                    downvotes=_vote_total(Count("id", filter=Q(value=-1))),
+                    participant_count=participant_count_expression(),
+                )
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt counters for {updated} posts."))
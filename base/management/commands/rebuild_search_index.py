@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search indexes for posts, comments and users from the source tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Number of rows indexed per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        from base import search
+
+        if not search.is_available():
+            raise CommandError("Full-text search is not available on this database (SQLite with FTS5 required).")
+
+        rooms, messages, users = search.rebuild(chunk_size=max(1, options["chunk_size"]))
+        summary = f"Indexed posts={rooms}, comments={messages}"
+        if users is not None:
+            summary += f", users={users}"
+        self.stdout.write(self.style.SUCCESS(summary + "."))
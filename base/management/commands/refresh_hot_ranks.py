@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the stored 'hot' feed rank (and comment count) of posts from their score and comments. "
+        "Run it periodically (e.g. from cron) to repair drift, or after changing the ranking formula."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=None,
+            help="Only refresh posts created in the last N days (default: all posts).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of posts updated per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        from base.models import Room
+        from base.ranking import hot_rank
+
+        rooms = Room.objects.all()
+        if options["days"] is not None:
+            rooms = rooms.filter(created__gte=timezone.now() - timedelta(days=options["days"]))
+
+        chunk_size = max(1, options["chunk_size"])
+        last_id = 0
+        refreshed = 0
+        while True:
+            chunk = list(
+                rooms.filter(id__gt=last_id)
+                .order_by("id")
+                .annotate(comments=Count("message"))
+                .only("id", "score", "created")[:chunk_size]
+            )
+            if not chunk:
+                break
+            for room in chunk:
+                room.comment_count = room.comments
+                room.hot_rank = hot_rank(room.score, room.comments, room.created)
+            with transaction.atomic():
+                Room.objects.bulk_update(chunk, ["comment_count", "hot_rank"])
+            refreshed += len(chunk)
+            last_id = chunk[-1].id
+
+        self.stdout.write(self.style.SUCCESS(f"Refreshed hot rank for {refreshed} posts."))
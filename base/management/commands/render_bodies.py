@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders post descriptions and comment bodies to stored HTML where it is missing or was "
+        "produced by an older renderer (base.rendering.RENDERER_VERSION). Run it after deploying a renderer change."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Re-render every row, not just stale ones.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of rows re-rendered per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        from base.models import Message, Room
+
+        for model, source, target in ((Room, "description", "description_html"), (Message, "body", "body_html")):
+            total = self._render(model, source, target, max(1, options["chunk_size"]), options["all"])
+            self.stdout.write(self.style.SUCCESS(f"Rendered {total} {model._meta.verbose_name_plural}."))
+
+    @staticmethod
+    def _render(model, source, target, chunk_size, everything):
+        from base.rendering import RENDERER_VERSION, render
+
+        rows = model.objects.all() if everything else model.objects.exclude(render_version=RENDERER_VERSION)
+        last_id = 0
+        rendered = 0
+        while True:
+            chunk = list(rows.filter(id__gt=last_id).order_by("id").only("id", source)[:chunk_size])
+            if not chunk:
+                break
+            for row in chunk:
+                setattr(row, target, render(getattr(row, source)))
+                row.render_version = RENDERER_VERSION
+            with transaction.atomic():
+                model.objects.bulk_update(chunk, [target, "render_version"])
+            rendered += len(chunk)
+            last_id = chunk[-1].id
+        return rendered
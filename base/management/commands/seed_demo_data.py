@@ -1,3 +1,6 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from django.utils import timezone
@@ -376,6 +379,9 @@ class Command(BaseCommand):
         vote("Selling: used textbooks (CS + Math)", student2, 1)
         vote("Need: second-hand bicycle", student1, 1)
 
+        # Votes above bypass voteRoom, so bring the per-post counters up to date.
+        call_command("rebuild_room_counters", stdout=StringIO())
+
         self.stdout.write(self.style.SUCCESS("Seeded demo data."))
         self.stdout.write("\nDemo users:")
         for data in demo_users:
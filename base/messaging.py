@@ -0,0 +1,200 @@
+"""
+Direct messages and the denormalized Conversation rows behind the inbox.
+
+Every message belongs to the Conversation for its (ordered) pair of users.
+The conversation keeps a pointer to its newest message and one unread
+counter per side, so listing a user's inbox is one indexed query. All writes
+go through ``send_direct_message`` and ``mark_conversation_read``;
+``manage.py backfill_conversations`` rebuilds the rows from the messages.
+
+Each user's total unread count (the navbar badge) is cached separately: it is
+incremented when a message to them commits, dropped when they read a
+conversation, and recomputed with one COUNT on a miss. Both changes are also
+pushed to the user's live event streams (see base.events). Like the topic
+cache, this only reaches other processes through a shared cache backend; with
+the default per-process cache a badge can be off in another worker until the
+entry expires after ``UNREAD_COUNT_CACHE_TIMEOUT`` seconds.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import dateformat, timezone
+
+from . import events
+from .models import Conversation, DirectMessage
+from .pagination import keyset_paginate
+
+UNREAD_COUNT_CACHE_KEY = 'messaging:unread:{}'
+
+
+def _ordered_pair(user_id, other_id):
+    return (user_id, other_id) if user_id <= other_id else (other_id, user_id)
+
+
+def _unread_field(conversation, user_id):
+    return 'unread_a' if user_id == conversation.user_a_id else 'unread_b'
+
+
+def get_conversation(user, other_user):
+    """The conversation between two users, or ``None`` if they have never written."""
+    user_a_id, user_b_id = _ordered_pair(user.id, other_user.id)
+    return Conversation.objects.filter(user_a_id=user_a_id, user_b_id=user_b_id).first()
+
+
+def get_or_create_conversation(user, other_user):
+    user_a_id, user_b_id = _ordered_pair(user.id, other_user.id)
+    # get_or_create retries the lookup if both users write first at the same time.
+    conversation, _ = Conversation.objects.get_or_create(user_a_id=user_a_id, user_b_id=user_b_id)
+    return conversation
+
+
+def send_direct_message(sender, receiver, content):
+    """Create a message and advance its conversation's last message and unread counter."""
+    conversation = get_or_create_conversation(sender, receiver)
+    unread_field = _unread_field(conversation, receiver.id)
+    with transaction.atomic():
+        message = DirectMessage.objects.create(
+            conversation=conversation,
+            sender=sender,
+            receiver=receiver,
+            content=content,
+        )
+        Conversation.objects.filter(id=conversation.id).update(
+            last_message=message,
+            last_message_at=message.created,
+            **{unread_field: F(unread_field) + 1},
+        )
+    return message
+
+
+def message_delivered(message):
+    """Post-commit hook for a new message: bump the receiver's badge and push both to their streams."""
+    _increment_unread_count(message.receiver_id)
+    events.publish(message.receiver_id, {'type': 'message', **message_payload(message, message.receiver_id)})
+    publish_unread_count(message.receiver_id)
+
+
+def mark_conversation_read(conversation, user):
+    """Mark everything ``user`` received in ``conversation`` as read; returns the number of messages."""
+    if conversation is None or not conversation.unread_for(user):
+        return 0
+    with transaction.atomic():
+        marked = DirectMessage.objects.filter(
+            conversation=conversation, receiver=user, is_read=False,
+        ).update(is_read=True)
+        Conversation.objects.filter(id=conversation.id).update(**{_unread_field(conversation, user.id): 0})
+        transaction.on_commit(lambda: (invalidate_unread_count(user.id), publish_unread_count(user.id)))
+    setattr(conversation, _unread_field(conversation, user.id), 0)
+    return marked
+
+
+def history_page(conversation, cursor=None, page_size=None):
+    """
+    One page of a conversation, newest first, as a KeysetPage.
+
+    ``next_cursor`` points at the next (older) page. Raises InvalidCursor for
+    a malformed cursor.
+    """
+    page_size = page_size or getattr(settings, 'CONVERSATION_PAGE_SIZE', 50)
+    messages = DirectMessage.objects.filter(conversation=conversation)
+    return keyset_paginate(messages, 'created', cursor, page_size, descending=True)
+
+
+def message_payload(message, viewer_id):
+    """JSON-ready representation of a message as seen by ``viewer_id``."""
+    return {
+        'id': message.id,
+        'sender': message.sender_id,
+        'content': message.content,
+        'created': message.created.isoformat(),
+        'time': dateformat.format(timezone.localtime(message.created), 'M d, g:i A'),
+        'sent': message.sender_id == viewer_id,
+    }
+
+
+def _unread_count_timeout():
+    return getattr(settings, 'UNREAD_COUNT_CACHE_TIMEOUT', 60)
+
+
+def publish_unread_count(user_id):
+    events.publish(user_id, {'type': 'unread', 'count': unread_count(user_id)})
+
+
+def unread_count(user_id):
+    """Total unread direct messages for a user, from the cache when possible."""
+    key = UNREAD_COUNT_CACHE_KEY.format(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = DirectMessage.objects.filter(receiver_id=user_id, is_read=False).count()
+        cache.set(key, count, _unread_count_timeout())
+    return count
+
+
+def _increment_unread_count(user_id):
+    try:
+        cache.incr(UNREAD_COUNT_CACHE_KEY.format(user_id))
+    except ValueError:
+        # Not cached; the next read recomputes it.
+        pass
+
+
+def invalidate_unread_count(user_id):
+    cache.delete(UNREAD_COUNT_CACHE_KEY.format(user_id))
+
+
+def inbox_conversations(user):
+    """The user's conversations, most recently active first, with both users and the last message loaded."""
+    return (
+        Conversation.objects.filter(Q(user_a=user) | Q(user_b=user))
+        .select_related('user_a', 'user_b', 'last_message')
+        .order_by(F('last_message_at').desc(nulls_last=True), '-id')
+    )
+
+
+def backfill_conversations(conversation_model=Conversation, message_model=DirectMessage):
+    """
+    Create missing conversations, attach orphaned messages and recompute every summary.
+
+    Set-based, so it runs in a handful of statements regardless of volume.
+    Migration 0016 runs a frozen copy of it.
+    Returns the number of conversations.
+    """
+    pairs = (
+        message_model.objects.filter(conversation__isnull=True)
+        .annotate(pair_a=Least('sender_id', 'receiver_id'), pair_b=Greatest('sender_id', 'receiver_id'))
+        .values_list('pair_a', 'pair_b')
+        .distinct()
+    )
+    conversation_model.objects.bulk_create(
+        [conversation_model(user_a_id=a, user_b_id=b) for a, b in pairs],
+        ignore_conflicts=True,
+    )
+
+    message_model.objects.filter(conversation__isnull=True).update(
+        conversation=Subquery(
+            conversation_model.objects.filter(
+                user_a_id=Least(OuterRef('sender_id'), OuterRef('receiver_id')),
+                user_b_id=Greatest(OuterRef('sender_id'), OuterRef('receiver_id')),
+            ).values('id')[:1]
+        )
+    )
+
+    latest = message_model.objects.filter(conversation=OuterRef('pk')).order_by('-created', '-id')
+
+    def unread(side):
+        counts = (
+            message_model.objects.filter(conversation=OuterRef('pk'), receiver=OuterRef(side), is_read=False)
+            .values('conversation')
+            .annotate(total=Count('id'))
+            .values('total')
+        )
+        return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+    return conversation_model.objects.update(
+        last_message=Subquery(latest.values('id')[:1]),
+        last_message_at=Subquery(latest.values('created')[:1]),
+        unread_a=unread('user_a'),
+        unread_b=unread('user_b'),
+    )
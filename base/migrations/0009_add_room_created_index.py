@@ -0,0 +1,17 @@
+# Generated by Django 5.2.9 on 2026-10-18 06:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0008_add_message_attachment'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['created', 'id'], name='room_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.9 on 2026-10-18 06:03
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_vote_counters(apps, schema_editor):
+    Room = apps.get_model("base", "Room")
+    PostVote = apps.get_model("base", "PostVote")
+
+    votes = PostVote.objects.filter(room=OuterRef("pk")).values("room")
+
+    def total(aggregate):
+        return Coalesce(Subquery(votes.annotate(total=aggregate).values("total"), output_field=IntegerField()), Value(0))
+
+    Room.objects.update(
+        score=total(Sum("value")),
+        upvotes=total(Count("id", filter=Q(value=1))),
+        downvotes=total(Count("id", filter=Q(value=-1))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0009_add_room_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='downvotes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='upvotes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['score', 'id'], name='room_score_id_idx'),
+        ),
+        migrations.RunPython(backfill_vote_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.9 on 2026-10-18 06:04
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_participant_count(apps, schema_editor):
+    Room = apps.get_model("base", "Room")
+    through = Room.participants.through
+
+    counts = through.objects.filter(room=OuterRef("pk")).values("room").annotate(total=Count("id")).values("total")
+    Room.objects.update(participant_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0010_add_room_vote_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='participant_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_participant_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,97 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.utils import OperationalError
+
+
+# SQLite FTS5 indexes for posts and comments. Each index row uses the source
+# row's id as its rowid; base.signals keeps them in sync (there are no
+# triggers, see base.search). Backends without FTS5 skip the tables and
+# base.search falls back to icontains filtering.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE base_room_fts USING fts5(
+        name, description, topic,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE base_message_fts USING fts5(
+        body, topic,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    """
+    INSERT INTO base_room_fts (rowid, name, description, topic)
+    SELECT r.id, r.name, coalesce(r.description, ''), coalesce(t.name, '')
+    FROM base_room r LEFT JOIN base_topic t ON t.id = r.topic_id
+    """,
+    """
+    INSERT INTO base_message_fts (rowid, body, topic)
+    SELECT m.id, m.body, coalesce(t.name, '')
+    FROM base_message m JOIN base_room r ON r.id = m.room_id LEFT JOIN base_topic t ON t.id = r.topic_id
+    """,
+]
+
+DROP_SQL = [
+    "DROP TABLE IF EXISTS base_message_fts",
+    "DROP TABLE IF EXISTS base_room_fts",
+]
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.base_fts5_probe USING fts5(x)")
+            cursor.execute("DROP TABLE temp.base_fts5_probe")
+        except OperationalError:
+            # SQLite built without FTS5.
+            return
+        for statement in CREATE_SQL:
+            cursor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for statement in DROP_SQL:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0011_add_room_participant_count"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.CreateModel(
+            name='MessageSearchIndex',
+            fields=[
+                ('message', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='base.message')),
+                ('document', models.TextField(db_column='base_message_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'base_message_fts',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='RoomSearchIndex',
+            fields=[
+                ('room', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='base.room')),
+                ('document', models.TextField(db_column='base_room_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'base_room_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.9 on 2026-10-18 06:12
+
+import math
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+from django.db.models import Count
+
+# The base.ranking formula as of this migration, frozen so later tuning does
+# not change what the backfill computes (run refresh_hot_ranks for that).
+HOT_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+HOT_DECAY_SECONDS = 45000
+HOT_COMMENT_WEIGHT = 0.5
+CHUNK_SIZE = 1000
+
+
+def hot_rank(score, comment_count, created):
+    activity = score + HOT_COMMENT_WEIGHT * comment_count
+    order = math.log10(max(abs(activity), 1))
+    sign = 1 if activity > 0 else -1 if activity < 0 else 0
+    return round(sign * order + (created - HOT_EPOCH).total_seconds() / HOT_DECAY_SECONDS, 7)
+
+
+def backfill_hot_rank(apps, schema_editor):
+    Room = apps.get_model("base", "Room")
+
+    last_id = 0
+    while True:
+        chunk = list(
+            Room.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .annotate(comment_count=Count("message"))
+            .only("id", "score", "created")[:CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        for room in chunk:
+            room.hot_rank = hot_rank(room.score, room.comment_count, room.created)
+        Room.objects.bulk_update(chunk, ["hot_rank"])
+        last_id = chunk[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0012_add_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='hot_rank',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['hot_rank', 'id'], name='room_hot_rank_id_idx'),
+        ),
+        migrations.RunPython(backfill_hot_rank, migrations.RunPython.noop),
+    ]
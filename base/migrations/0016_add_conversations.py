@@ -0,0 +1,97 @@
+# Generated by Django 5.2.9 on 2026-10-18 06:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+
+
+# base.messaging.backfill_conversations as of this migration, frozen so later
+# changes to it or to the models do not change what the migration does.
+def backfill_conversations(apps, schema_editor):
+    Conversation = apps.get_model("base", "Conversation")
+    DirectMessage = apps.get_model("base", "DirectMessage")
+
+    pairs = (
+        DirectMessage.objects.filter(conversation__isnull=True)
+        .annotate(pair_a=Least("sender_id", "receiver_id"), pair_b=Greatest("sender_id", "receiver_id"))
+        .values_list("pair_a", "pair_b")
+        .distinct()
+    )
+    Conversation.objects.bulk_create(
+        [Conversation(user_a_id=a, user_b_id=b) for a, b in pairs],
+        ignore_conflicts=True,
+    )
+
+    DirectMessage.objects.filter(conversation__isnull=True).update(
+        conversation=Subquery(
+            Conversation.objects.filter(
+                user_a_id=Least(OuterRef("sender_id"), OuterRef("receiver_id")),
+                user_b_id=Greatest(OuterRef("sender_id"), OuterRef("receiver_id")),
+            ).values("id")[:1]
+        )
+    )
+
+    latest = DirectMessage.objects.filter(conversation=OuterRef("pk")).order_by("-created", "-id")
+
+    def unread(side):
+        counts = (
+            DirectMessage.objects.filter(conversation=OuterRef("pk"), receiver=OuterRef(side), is_read=False)
+            .values("conversation")
+            .annotate(total=Count("id"))
+            .values("total")
+        )
+        return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+    Conversation.objects.update(
+        last_message=Subquery(latest.values("id")[:1]),
+        last_message_at=Subquery(latest.values("created")[:1]),
+        unread_a=unread("user_a"),
+        unread_b=unread("user_b"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0014_add_room_hot_rank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('unread_a', models.PositiveIntegerField(default=0)),
+                ('unread_b', models.PositiveIntegerField(default=0)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='base.directmessage')),
+                ('user_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='directmessage',
+            name='conversation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='base.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['user_a', '-last_message_at'], name='conversation_a_activity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['user_b', '-last_message_at'], name='conversation_b_activity_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(fields=('user_a', 'user_b'), name='conversation_unique_pair'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.CheckConstraint(condition=models.Q(('user_a__lte', models.F('user_b'))), name='conversation_ordered_pair'),
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
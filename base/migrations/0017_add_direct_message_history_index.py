@@ -0,0 +1,17 @@
+# Generated by Django 5.2.9 on 2026-10-18 06:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0016_add_conversations'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='directmessage',
+            index=models.Index(fields=['conversation', 'created', 'id'], name='dm_conversation_created_idx'),
+        ),
+    ]
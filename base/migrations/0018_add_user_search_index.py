@@ -0,0 +1,69 @@
+# Generated by Django 5.2.9 on 2026-10-18 07:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.utils import OperationalError
+
+
+# SQLite FTS5 index for the start-conversation user lookup, kept in sync by
+# base.signals like the post and comment indexes. Prefix indexes down to one
+# character keep typeahead queries on the index.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE base_user_fts USING fts5(
+        username, name, email,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3'
+    )
+    """,
+    """
+    INSERT INTO base_user_fts (rowid, username, name, email)
+    SELECT id, username, coalesce(name, ''), coalesce(email, '') FROM base_user
+    """,
+]
+
+
+def create_user_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.base_fts5_probe USING fts5(x)")
+            cursor.execute("DROP TABLE temp.base_fts5_probe")
+        except OperationalError:
+            # SQLite built without FTS5.
+            return
+        for statement in CREATE_SQL:
+            cursor.execute(statement)
+
+
+def drop_user_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS base_user_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0017_add_direct_message_history_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_user_search_index, drop_user_search_index),
+        migrations.CreateModel(
+            name='UserSearchIndex',
+            fields=[
+                ('user', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('document', models.TextField(db_column='base_user_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'base_user_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.9 on 2026-10-18 07:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0018_add_user_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room_id', models.PositiveBigIntegerField()),
+                ('topic_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('deleted', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['updated', 'id'], name='room_updated_id_idx'),
+        ),
+    ]
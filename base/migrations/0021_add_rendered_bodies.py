@@ -0,0 +1,33 @@
+# Generated by Django 5.2.9 on 2026-10-18 07:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0020_add_message_room_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='body_html',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='render_version',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='description_html',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='render_version',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-18 07:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0021_add_rendered_bodies'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='attachment_sha256',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='attachment_sha256',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.9 on 2026-10-18 14:12
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_comment_count(apps, schema_editor):
+    Room = apps.get_model("base", "Room")
+    Message = apps.get_model("base", "Message")
+
+    counts = Message.objects.filter(room=OuterRef("pk")).values("room").annotate(total=Count("id")).values("total")
+    Room.objects.update(comment_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0022_add_attachment_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_comment_count, migrations.RunPython.noop),
+    ]
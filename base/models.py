@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+
+from . import rendering
 # Create your models here.
 
 
@@ -58,17 +60,47 @@ class Room(models.Model):
     topic = models.ForeignKey(Topic, on_delete = models.SET_NULL, null = True)
     name = models.TextField()
     description = models.TextField(null= True, blank= True)
+    # ``description`` as safe HTML, rendered on save by base.rendering.
+    description_html = models.TextField(blank=True, default='')
+    render_version = models.PositiveSmallIntegerField(default=0)
     # File attachment (for Study Materials category)
     attachment = models.FileField(upload_to='attachments/', null=True, blank=True)
+    # SHA-256 of the attachment, computed while it was uploaded (base.uploads).
+    attachment_sha256 = models.CharField(max_length=64, blank=True, default='')
     participants = models.ManyToManyField(User, related_name='participants', blank= True)
+    # Denormalized counters (rebuild with `manage.py rebuild_room_counters`).
+    # Vote counters are kept in sync with PostVote by base.votes.
+    score = models.IntegerField(default=0)
+    upvotes = models.PositiveIntegerField(default=0)
+    downvotes = models.PositiveIntegerField(default=0)
+    # Kept in sync with `participants` by base.signals.
+    participant_count = models.PositiveIntegerField(default=0)
+    # Precomputed "hot" feed position, see base.ranking.
+    hot_rank = models.FloatField(default=0)
+    # Comments on the post, stored by base.ranking so votes can rerank without counting them.
+    comment_count = models.PositiveIntegerField(default=0)
     updated = models.DateTimeField(auto_now= True)
     created = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-updated', '-created']
+        indexes = [
+            # Keyset pagination of the feed walks (created, id) backwards.
+            models.Index(fields=['created', 'id'], name='room_created_id_idx'),
+            models.Index(fields=['score', 'id'], name='room_score_id_idx'),
+            models.Index(fields=['hot_rank', 'id'], name='room_hot_rank_id_idx'),
+            # /api/rooms/changes/ walks (updated, id) forwards.
+            models.Index(fields=['updated', 'id'], name='room_updated_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        kwargs['update_fields'] = rendering.render_fields(
+            self, 'description', 'description_html', kwargs.get('update_fields'),
+        )
+        super().save(*args, **kwargs)
     
     def get_attachment_filename(self):
         """Return just the filename from the attachment path."""
@@ -83,6 +115,21 @@ class Room(models.Model):
             return self.topic.slug in ['exams-study', 'tech-projects']
         return False
 
+    @staticmethod
+    def vote_counter_deltas(old_value, new_value):
+        """``{counter: change}`` when one vote goes from ``old_value`` (or 0 for none) to ``new_value``; unchanged counters are left out."""
+        deltas = {
+            'score': new_value - old_value,
+            'upvotes': (new_value == PostVote.Value.UP) - (old_value == PostVote.Value.UP),
+            'downvotes': (new_value == PostVote.Value.DOWN) - (old_value == PostVote.Value.DOWN),
+        }
+        return {name: delta for name, delta in deltas.items() if delta}
+
+    @classmethod
+    def vote_counter_changes(cls, old_value, new_value):
+        """F() updates that move the vote counters from one vote value (or 0 for none) to another."""
+        return {name: models.F(name) + delta for name, delta in cls.vote_counter_deltas(old_value, new_value).items()}
+
 
 class PostVote(models.Model):
     class Value(models.IntegerChoices):
@@ -103,20 +150,79 @@ class PostVote(models.Model):
         return f"{self.user_id}:{self.room_id}:{self.value}"
     
 
+class RoomTombstone(models.Model):
+    """
+    A room deleted or moved into the premium topic, kept so delta-sync
+    clients (base.changes) that can no longer see it drop their copy.
+    """
+    room_id = models.PositiveBigIntegerField()
+    # The topic the room was in, so premium-only deletions stay hidden from free users.
+    topic_id = models.PositiveBigIntegerField(null=True, blank=True)
+    deleted = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"room {self.room_id} deleted {self.deleted:%Y-%m-%d %H:%M}"
+
+
+class FullTextMatch(models.Lookup):
+    """``field__match=query`` -> SQLite FTS5 ``MATCH``."""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class RoomSearchIndex(models.Model):
+    """
+    Read-only view of the ``base_room_fts`` FTS5 table (see base.search).
+
+    ``document`` is the hidden column named after the table, which matches
+    across all indexed columns; ``rank`` is only meaningful in a query that
+    also filters on ``document__match``.
+    """
+    room = models.OneToOneField(
+        Room, primary_key=True, db_column='rowid', on_delete=models.DO_NOTHING,
+        related_name='search_index', db_constraint=False,
+    )
+    document = models.TextField(db_column='base_room_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'base_room_fts'
+
+
+RoomSearchIndex._meta.get_field('document').register_lookup(FullTextMatch)
+    
+
 class Message(models.Model):
     user = models.ForeignKey(User, on_delete= models.CASCADE)
     room = models.ForeignKey(Room, on_delete = models.CASCADE)
     body = models.TextField()
+    # ``body`` as safe HTML, rendered on save by base.rendering.
+    body_html = models.TextField(blank=True, default='')
+    render_version = models.PositiveSmallIntegerField(default=0)
     # File attachment for Study Materials comments
     attachment = models.FileField(upload_to='comment_attachments/', null=True, blank=True)
+    attachment_sha256 = models.CharField(max_length=64, blank=True, default='')
     updated = models.DateTimeField(auto_now= True)
     created = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-updated', '-created']
+        indexes = [
+            # The room page keyset-paginates a post's comments on (created, id), newest first.
+            models.Index(fields=['room', 'created', 'id'], name='message_room_created_idx'),
+        ]
 
     def __str__(self):
         return self.body[0:50]
+
+    def save(self, *args, **kwargs):
+        kwargs['update_fields'] = rendering.render_fields(self, 'body', 'body_html', kwargs.get('update_fields'))
+        super().save(*args, **kwargs)
     
     def get_attachment_filename(self):
         """Return just the filename from the attachment path."""
@@ -126,8 +232,51 @@ class Message(models.Model):
         return None
 
 
+class Conversation(models.Model):
+    """
+    A direct-message thread, stored once per pair of users with ``user_a_id <= user_b_id``.
+
+    The last message and the per-side unread counters are denormalized so the
+    inbox is a single query; they are maintained by base.messaging (rebuild
+    with ``manage.py backfill_conversations``).
+    """
+    user_a = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    user_b = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    last_message = models.ForeignKey(
+        'DirectMessage', on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    # Messages not yet read by user_a / user_b.
+    unread_a = models.PositiveIntegerField(default=0)
+    unread_b = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_a', 'user_b'], name='conversation_unique_pair'),
+            models.CheckConstraint(condition=models.Q(user_a__lte=models.F('user_b')), name='conversation_ordered_pair'),
+        ]
+        indexes = [
+            # The inbox lists a user's threads on either side by last activity.
+            models.Index(fields=['user_a', '-last_message_at'], name='conversation_a_activity_idx'),
+            models.Index(fields=['user_b', '-last_message_at'], name='conversation_b_activity_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_a_id} ↔ {self.user_b_id}"
+
+    def other_user(self, user):
+        return self.user_b if user.id == self.user_a_id else self.user_a
+
+    def unread_for(self, user):
+        return self.unread_a if user.id == self.user_a_id else self.unread_b
+
+
 class DirectMessage(models.Model):
     """Private messages between users."""
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.CASCADE, null=True, blank=True, related_name='messages',
+    )
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
     receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_messages')
     content = models.TextField()
@@ -136,11 +285,49 @@ class DirectMessage(models.Model):
 
     class Meta:
         ordering = ['created']
+        indexes = [
+            # Conversation history is keyset-paginated on (created, id) within a thread.
+            models.Index(fields=['conversation', 'created', 'id'], name='dm_conversation_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sender.username} → {self.receiver.username}: {self.content[:30]}"
 
 
+class MessageSearchIndex(models.Model):
+    """Read-only view of the ``base_message_fts`` FTS5 table, like RoomSearchIndex."""
+    message = models.OneToOneField(
+        Message, primary_key=True, db_column='rowid', on_delete=models.DO_NOTHING,
+        related_name='search_index', db_constraint=False,
+    )
+    document = models.TextField(db_column='base_message_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'base_message_fts'
+
+
+MessageSearchIndex._meta.get_field('document').register_lookup(FullTextMatch)
+
+
+class UserSearchIndex(models.Model):
+    """Read-only view of the ``base_user_fts`` FTS5 table (username, name, email), like RoomSearchIndex."""
+    user = models.OneToOneField(
+        User, primary_key=True, db_column='rowid', on_delete=models.DO_NOTHING,
+        related_name='search_index', db_constraint=False,
+    )
+    document = models.TextField(db_column='base_user_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'base_user_fts'
+
+
+UserSearchIndex._meta.get_field('document').register_lookup(FullTextMatch)
+
+
 class MentorProfile(models.Model):
     """Tracks user's mentorship availability and interests."""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='mentor_profile')
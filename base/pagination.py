@@ -0,0 +1,93 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset."""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(value, pk):
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    raw = json.dumps([value, pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def cursor_for(row, key):
+    """Cursor pointing just past ``row``, a model instance or a ``.values()`` dict."""
+    if isinstance(row, dict):
+        return encode_cursor(row[key], row['id'])
+    return encode_cursor(getattr(row, key), row.pk)
+
+
+def decode_cursor(token, model, key):
+    """Turn a cursor token back into a ``(value, pk)`` pair for ``key``."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        pk = int(pk)
+    except (ValueError, TypeError):
+        raise InvalidCursor(token)
+
+    try:
+        field = model._meta.get_field(key)
+    except FieldDoesNotExist:
+        # Annotations (e.g. a search rank) are always numeric.
+        field = None
+    try:
+        value = field.to_python(value) if field is not None else float(value)
+    except (ValidationError, TypeError, ValueError):
+        raise InvalidCursor(token)
+    if value is None:
+        raise InvalidCursor(token)
+    return value, pk
+
+
+def keyset_paginate(queryset, key, cursor=None, page_size=20, descending=True):
+    """
+    Paginate ``queryset`` on ``(key, id)`` without OFFSET.
+
+    ``.values()`` querysets work too, as long as they include ``key`` and ``id``.
+
+    The cost of any page is one indexed range scan of ``page_size + 1`` rows,
+    no matter how deep the client has scrolled or how big the table is.
+    """
+    if descending:
+        queryset = queryset.order_by(f'-{key}', '-id')
+    else:
+        queryset = queryset.order_by(key, 'id')
+
+    if cursor:
+        value, pk = decode_cursor(cursor, queryset.model, key)
+        op = 'lt' if descending else 'gt'
+        queryset = queryset.filter(
+            Q(**{f'{key}__{op}': value}) | Q(**{key: value, f'id__{op}': pk})
+        )
+
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = cursor_for(rows[-1], key)
+    return KeysetPage(rows, next_cursor)
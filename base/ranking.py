@@ -0,0 +1,48 @@
+"""
+"Hot" ranking for the feed.
+
+The rank is Reddit-style: the log of a post's activity plus its creation time
+divided by ``HOT_DECAY_SECONDS``. Because the time term is anchored to the
+creation date rather than "now", ranks stored at different moments stay
+comparable, so a post only needs recomputing when its votes or comments
+change; older posts sink simply because newer ones are created with a larger
+time term. ``manage.py refresh_hot_ranks`` recomputes stored ranks in bulk.
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.utils import timezone
+
+HOT_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+# A post needs 10x the activity to outrank one created this much later.
+HOT_DECAY_SECONDS = 45000
+# How much one comment counts compared to one net upvote.
+HOT_COMMENT_WEIGHT = 0.5
+
+
+def hot_rank(score, comment_count, created=None):
+    activity = score + HOT_COMMENT_WEIGHT * comment_count
+    order = math.log10(max(abs(activity), 1))
+    sign = 1 if activity > 0 else -1 if activity < 0 else 0
+    seconds = ((created or timezone.now()) - HOT_EPOCH).total_seconds()
+    return round(sign * order + seconds / HOT_DECAY_SECONDS, 7)
+
+
+def refresh_hot_rank(room_id, count_comments=True):
+    """
+    Recompute and store ``hot_rank`` for one room from its current counters.
+
+    Counting the comments also stores the total in ``Room.comment_count``;
+    votes pass ``count_comments=False`` and rank with the stored total.
+    """
+    from .models import Message, Room
+
+    row = Room.objects.filter(id=room_id).values('score', 'comment_count', 'created').first()
+    if row is None:
+        return None
+    changes = {}
+    if count_comments:
+        row['comment_count'] = changes['comment_count'] = Message.objects.filter(room_id=room_id).count()
+    changes['hot_rank'] = hot_rank(row['score'], row['comment_count'], row['created'])
+    Room.objects.filter(id=room_id).update(**changes)
+    return changes['hot_rank']
@@ -0,0 +1,52 @@
+"""
+Render-once HTML for post descriptions and comment bodies.
+
+Study Materials posts show their text with URLs turned into links. Instead
+of escaping and scanning every body on every page view, Room and Message
+render it when they are saved and store the result next to the raw text
+(``description_html`` / ``body_html``), stamped with RENDERER_VERSION.
+
+Bump RENDERER_VERSION whenever ``render`` changes its output, then run
+``manage.py render_bodies`` to re-render the stored HTML in chunks. Until a
+row is re-rendered, templates fall back to the ``linkify`` filter (see
+base.templatetags.linkify_tags), so pages stay correct either way.
+"""
+import re
+
+from django.utils.html import escape
+
+RENDERER_VERSION = 1
+
+URL_PATTERN = re.compile(r'(https?://[^\s<>"\']+)', re.IGNORECASE)
+MAX_LINK_TEXT = 50
+
+
+def _link(match):
+    url = match.group(1)
+    # Truncate display URL if too long
+    display_url = url if len(url) <= MAX_LINK_TEXT else url[:MAX_LINK_TEXT - 3] + '...'
+    return (
+        f'<a href="{url}" target="_blank" rel="noopener noreferrer" '
+        f'style="color: var(--color-main); text-decoration: underline;">{display_url}</a>'
+    )
+
+
+def render(text):
+    """Escape ``text`` and turn its URLs into links; returns an HTML string (empty for no text)."""
+    if not text:
+        return ''
+    return URL_PATTERN.sub(_link, escape(text))
+
+
+def render_fields(instance, source, target, update_fields=None):
+    """
+    Render ``instance.<source>`` into ``instance.<target>`` and stamp the renderer version.
+
+    Returns ``update_fields`` extended with the rendered columns when the
+    source is among them, for use from ``Model.save``.
+    """
+    setattr(instance, target, render(getattr(instance, source)))
+    instance.render_version = RENDERER_VERSION
+    if update_fields is not None and source in update_fields:
+        update_fields = {*update_fields, target, 'render_version'}
+    return update_fields
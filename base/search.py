@@ -0,0 +1,280 @@
+"""
+Full-text search over posts, comments and users.
+
+On SQLite with FTS5 the ``base_room_fts`` / ``base_message_fts`` indexes
+(created by migration 0012) and ``base_user_fts`` (migration 0018) are used
+and results carry a ``search_rank`` (lower is more relevant). Everywhere else
+the search falls back to the original ``icontains`` filters.
+
+The indexes are kept in sync from base.signals rather than SQL triggers:
+Django rebuilds SQLite tables on many schema changes, which drops triggers on
+the rebuilt table and breaks the ones referencing it. Changes made with
+``QuerySet.update()`` to indexed text are not picked up; run
+``manage.py rebuild_search_index`` after such bulk edits.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, Q, Value, When
+
+ROOM_INDEX = 'base_room_fts'
+MESSAGE_INDEX = 'base_message_fts'
+USER_INDEX = 'base_user_fts'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_available = {}
+
+
+def _index_tables():
+    if connection.vendor != 'sqlite':
+        return frozenset()
+    key = connection.settings_dict['NAME']
+    if key not in _available:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN (%s, %s, %s)",
+                [ROOM_INDEX, MESSAGE_INDEX, USER_INDEX],
+            )
+            _available[key] = frozenset(row[0] for row in cursor.fetchall())
+    return _available[key]
+
+
+def is_available():
+    """True when the post and comment FTS5 index tables exist in the default database."""
+    return {ROOM_INDEX, MESSAGE_INDEX} <= _index_tables()
+
+
+def users_available():
+    return USER_INDEX in _index_tables()
+
+
+def build_match_query(q):
+    """
+    Turn free text into a safe FTS5 query: every word must match as a prefix.
+
+    Quoting each token keeps user input from being parsed as FTS5 syntax.
+    """
+    tokens = _TOKEN_RE.findall((q or '').lower())
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_rooms(queryset, q):
+    """
+    Filter a Room queryset by ``q``.
+
+    Returns ``(queryset, ranked)``; when ``ranked`` is true every match has a
+    ``search_rank`` annotation. Only the newest ``SEARCH_RESULT_WINDOW``
+    matches get a bm25 rank; older ones are still returned but rank 0, after
+    every ranked match. Apply other filters first so the window counts the
+    rows the caller will show.
+    """
+    match = build_match_query(q)
+    if not match or not is_available():
+        return queryset.filter(
+            Q(name__icontains=q) |
+            Q(description__icontains=q) |
+            Q(topic__name__icontains=q)
+        ), False
+
+    queryset = queryset.filter(search_index__document__match=match)
+    # bm25 costs the same for every match, so a common term would rank tens of
+    # thousands of posts to show one page. Only the newest SEARCH_RESULT_WINDOW
+    # matches are ranked: FTS5 walks its rowids newest first to find the oldest
+    # one (ordering by the index rowid keeps FTS5 driving the join), and CASE
+    # skips bm25 for anything older. bm25 is negative, so 0 sorts those last.
+    window = getattr(settings, 'SEARCH_RESULT_WINDOW', 1000)
+    oldest = list(
+        queryset.order_by('-search_index__pk').values_list('search_index__pk', flat=True)[window - 1:window]
+    )
+    if not oldest:
+        return queryset.annotate(search_rank=F('search_index__rank')), True
+    return queryset.annotate(search_rank=Case(
+        When(pk__gte=oldest[0], then=F('search_index__rank')),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )), True
+
+
+def search_messages(queryset, q):
+    """Filter a Message queryset by body or by the topic of its room."""
+    match = build_match_query(q)
+    if not match or not is_available():
+        return queryset.filter(Q(room__topic__name__icontains=q) | Q(body__icontains=q))
+    return queryset.filter(search_index__document__match=match)
+
+
+def search_users(queryset, q):
+    """
+    Filter a User queryset by ``q`` (every word a prefix of the username, name or email).
+
+    Returns ``(queryset, ranked)`` like search_rooms.
+    """
+    match = build_match_query(q)
+    if not match or not users_available():
+        return queryset.filter(
+            Q(username__icontains=q) | Q(name__icontains=q) | Q(email__icontains=q)
+        ), False
+
+    queryset = queryset.filter(search_index__document__match=match).annotate(
+        search_rank=F('search_index__rank')
+    )
+    return queryset, True
+
+
+def index_room(room_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {ROOM_INDEX} WHERE rowid = %s', [room_id])
+        cursor.execute(
+            f"""
+            INSERT INTO {ROOM_INDEX} (rowid, name, description, topic)
+            SELECT r.id, r.name, coalesce(r.description, ''), coalesce(t.name, '')
+            FROM base_room r LEFT JOIN base_topic t ON t.id = r.topic_id
+            WHERE r.id = %s
+            """,
+            [room_id],
+        )
+        # The room may have moved to another topic; its comments carry the topic name too.
+        cursor.execute(
+            f"""
+            UPDATE {MESSAGE_INDEX}
+            SET topic = (SELECT topic FROM {ROOM_INDEX} WHERE rowid = %s)
+            WHERE rowid IN (SELECT id FROM base_message WHERE room_id = %s)
+            AND topic IS NOT (SELECT topic FROM {ROOM_INDEX} WHERE rowid = %s)
+            """,
+            [room_id, room_id, room_id],
+        )
+
+
+def unindex_room(room_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {ROOM_INDEX} WHERE rowid = %s', [room_id])
+
+
+def index_message(message_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {MESSAGE_INDEX} WHERE rowid = %s', [message_id])
+        cursor.execute(
+            f"""
+            INSERT INTO {MESSAGE_INDEX} (rowid, body, topic)
+            SELECT m.id, m.body, coalesce(t.name, '')
+            FROM base_message m JOIN base_room r ON r.id = m.room_id
+            LEFT JOIN base_topic t ON t.id = r.topic_id
+            WHERE m.id = %s
+            """,
+            [message_id],
+        )
+
+
+def unindex_message(message_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {MESSAGE_INDEX} WHERE rowid = %s', [message_id])
+
+
+def index_user(user_id):
+    if not users_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {USER_INDEX} WHERE rowid = %s', [user_id])
+        cursor.execute(
+            f"""
+            INSERT INTO {USER_INDEX} (rowid, username, name, email)
+            SELECT id, username, coalesce(name, ''), coalesce(email, '') FROM base_user WHERE id = %s
+            """,
+            [user_id],
+        )
+
+
+def unindex_user(user_id):
+    if not users_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {USER_INDEX} WHERE rowid = %s', [user_id])
+
+
+def rename_topic(topic_id, name):
+    """Rewrite the topic column of every indexed post and comment in ``topic_id``."""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {ROOM_INDEX} SET topic = %s WHERE rowid IN (SELECT id FROM base_room WHERE topic_id = %s)',
+            [name, topic_id],
+        )
+        cursor.execute(
+            f"""
+            UPDATE {MESSAGE_INDEX} SET topic = %s
+            WHERE rowid IN (SELECT m.id FROM base_message m JOIN base_room r ON r.id = m.room_id
+                            WHERE r.topic_id = %s)
+            """,
+            [name, topic_id],
+        )
+
+
+def rebuild(chunk_size=5000):
+    """
+    Repopulate the indexes from the source tables in id-ordered chunks.
+
+    Returns ``(room_rows, message_rows, user_rows)``; ``user_rows`` is None
+    when the user index does not exist.
+    """
+    statements = [
+        (
+            ROOM_INDEX,
+            'base_room',
+            f"""
+            INSERT INTO {ROOM_INDEX} (rowid, name, description, topic)
+            SELECT r.id, r.name, coalesce(r.description, ''), coalesce(t.name, '')
+            FROM base_room r LEFT JOIN base_topic t ON t.id = r.topic_id
+            WHERE r.id > %s AND r.id <= %s
+            """,
+        ),
+        (
+            MESSAGE_INDEX,
+            'base_message',
+            f"""
+            INSERT INTO {MESSAGE_INDEX} (rowid, body, topic)
+            SELECT m.id, m.body, coalesce(t.name, '')
+            FROM base_message m JOIN base_room r ON r.id = m.room_id
+            LEFT JOIN base_topic t ON t.id = r.topic_id
+            WHERE m.id > %s AND m.id <= %s
+            """,
+        ),
+    ]
+    if users_available():
+        statements.append((
+            USER_INDEX,
+            'base_user',
+            f"""
+            INSERT INTO {USER_INDEX} (rowid, username, name, email)
+            SELECT id, username, coalesce(name, ''), coalesce(email, '') FROM base_user
+            WHERE id > %s AND id <= %s
+            """,
+        ))
+
+    totals = []
+    with connection.cursor() as cursor:
+        for index, source, insert_sql in statements:
+            cursor.execute(f'DELETE FROM {index}')
+            cursor.execute(f'SELECT coalesce(max(id), 0) FROM {source}')
+            max_id = cursor.fetchone()[0]
+            start = 0
+            while start < max_id:
+                with transaction.atomic():
+                    cursor.execute(insert_sql, [start, start + chunk_size])
+                start += chunk_size
+            cursor.execute(f"INSERT INTO {index} ({index}) VALUES ('optimize')")
+            cursor.execute(f'SELECT count(*) FROM {index}')
+            totals.append(cursor.fetchone()[0])
+    if len(totals) == 2:
+        totals.append(None)
+    return tuple(totals)
@@ -0,0 +1,208 @@
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import activity, changes, messaging, search
+from .models import DirectMessage, Message, Room, Topic, User
+from .ranking import hot_rank, refresh_hot_rank
+from .topics import JOBS_REFERRALS_SLUG, invalidate_room_counts, invalidate_topics, topic_id_for_slug
+
+
+def participant_count_expression():
+    """Subquery counting a room's participants, for use in ``Room.objects.update()``."""
+    through = Room.participants.through
+    counts = through.objects.filter(room=OuterRef('pk')).values('room').annotate(total=Count('id')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def _recount_participants(room_ids):
+    # Participants are part of the API payload, so membership changes count as updates for delta sync.
+    Room.objects.filter(id__in=room_ids).update(
+        participant_count=participant_count_expression(), updated=timezone.now(),
+    )
+
+
+@receiver(m2m_changed, sender=Room.participants.through)
+def sync_participant_count(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep ``Room.participant_count`` in step with ``Room.participants``."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _recount_participants([instance.pk])
+        return
+
+    # user.participants.add(room) / remove / clear
+    if action == 'pre_clear':
+        instance._cleared_participant_room_ids = list(instance.participants.values_list('id', flat=True))
+    elif action == 'post_clear':
+        _recount_participants(getattr(instance, '_cleared_participant_room_ids', []))
+    elif action in ('post_add', 'post_remove') and pk_set:
+        _recount_participants(pk_set)
+
+
+@receiver(post_save, sender=Room)
+def set_initial_hot_rank(sender, instance, created, raw=False, **kwargs):
+    # post_save: ``created`` is only filled in by auto_now_add during the save itself.
+    if created and not raw and not instance.hot_rank:
+        instance.hot_rank = hot_rank(instance.score, 0, instance.created)
+        Room.objects.filter(id=instance.id).update(hot_rank=instance.hot_rank)
+
+
+@receiver(post_save, sender=Message)
+def bump_hot_rank_on_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        refresh_hot_rank(instance.room_id)
+
+
+@receiver(post_delete, sender=Message)
+def drop_hot_rank_on_comment_delete(sender, instance, **kwargs):
+    refresh_hot_rank(instance.room_id)
+
+
+@receiver(post_save, sender=Room)
+def index_room(sender, instance, **kwargs):
+    search.index_room(instance.pk)
+
+
+@receiver(post_delete, sender=Room)
+def unindex_room(sender, instance, **kwargs):
+    search.unindex_room(instance.pk)
+
+
+@receiver(post_delete, sender=Room)
+def record_room_deletion(sender, instance, **kwargs):
+    changes.record_deletion(instance)
+
+
+@receiver(pre_save, sender=Room)
+def note_move_into_premium(sender, instance, raw=False, **kwargs):
+    instance._moved_into_premium = False
+    jobs_topic_id = topic_id_for_slug(JOBS_REFERRALS_SLUG)
+    if raw or instance._state.adding or jobs_topic_id is None or instance.topic_id != jobs_topic_id:
+        return
+    stored = Room.objects.filter(pk=instance.pk).values('topic_id').first()
+    if stored is not None and stored['topic_id'] != jobs_topic_id:
+        instance._moved_into_premium = True
+        instance._previous_topic_id = stored['topic_id']
+
+
+@receiver(post_save, sender=Room)
+def record_move_into_premium(sender, instance, **kwargs):
+    # Free delta-sync clients can no longer see the room: tell them to drop it.
+    if getattr(instance, '_moved_into_premium', False):
+        changes.record_hidden(instance, instance._previous_topic_id)
+
+
+@receiver(post_save, sender=Message)
+def index_message(sender, instance, **kwargs):
+    search.index_message(instance.pk)
+
+
+@receiver(post_delete, sender=Message)
+def unindex_message(sender, instance, **kwargs):
+    search.unindex_message(instance.pk)
+
+
+SEARCHABLE_USER_FIELDS = {'username', 'name', 'email'}
+
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, update_fields=None, **kwargs):
+    # Logins save last_login only; skip saves that cannot change the indexed text.
+    if update_fields is not None and not SEARCHABLE_USER_FIELDS & set(update_fields):
+        return
+    search.index_user(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def unindex_user(sender, instance, **kwargs):
+    search.unindex_user(instance.pk)
+
+
+def _room_payload_user_fields():
+    # The user fields nested into every API room as its host or a participant.
+    from .api.serializers import UserSerializer
+
+    return [name for name in UserSerializer.Meta.fields if name != 'id']
+
+
+@receiver(pre_save, sender=User)
+def note_room_payload_change(sender, instance, update_fields=None, raw=False, **kwargs):
+    instance._room_payload_changed = False
+    fields = _room_payload_user_fields()
+    if raw or instance._state.adding or (update_fields is not None and not set(fields) & set(update_fields)):
+        return
+    stored = User.objects.filter(pk=instance.pk).values(*fields).first()
+    instance._room_payload_changed = stored is not None and any(
+        stored[name] != getattr(instance, name) for name in fields
+    )
+
+
+@receiver(post_save, sender=User)
+def touch_rooms_on_profile_change(sender, instance, **kwargs):
+    # Room.updated drives the API validators, delta sync and feed row cache,
+    # none of which would otherwise notice a host or participant renamed.
+    if getattr(instance, '_room_payload_changed', False):
+        room_ids = Room.objects.filter(Q(host_id=instance.pk) | Q(participants=instance.pk)).values('id')
+        Room.objects.filter(id__in=room_ids).update(updated=timezone.now())
+
+
+@receiver(post_save, sender=Topic)
+def reindex_topic(sender, instance, created, **kwargs):
+    if not created:
+        search.rename_topic(instance.pk, instance.name)
+
+
+@receiver(pre_delete, sender=Topic)
+def unindex_topic(sender, instance, **kwargs):
+    # Rooms are detached (SET_NULL) by a bulk update that sends no signals.
+    search.rename_topic(instance.pk, '')
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+def reset_room_counts(sender, **kwargs):
+    invalidate_room_counts()
+
+
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+def reset_topic_catalogue(sender, **kwargs):
+    invalidate_topics()
+
+
+@receiver(post_save, sender=Message)
+def push_activity(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        activity.reset()
+
+
+@receiver(post_delete, sender=Message)
+def drop_activity(sender, instance, **kwargs):
+    activity.forget_message(instance.pk)
+
+
+@receiver(post_save, sender=Room)
+def reset_activity(sender, instance, created, **kwargs):
+    # An edited post may have moved in or out of the premium category.
+    if not created:
+        activity.reset()
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def touch_room_on_comment(sender, instance, raw=False, **kwargs):
+    # Room.updated is part of the feed row cache version (and API validators).
+    if not raw:
+        Room.objects.filter(id=instance.room_id).update(updated=timezone.now())
+
+
+@receiver(post_save, sender=DirectMessage)
+def announce_direct_message(sender, instance, created, raw=False, **kwargs):
+    # Unread badge and live event stream (base.messaging / base.events).
+    if created and not raw:
+        transaction.on_commit(lambda: messaging.message_delivered(instance))
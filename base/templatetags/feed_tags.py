@@ -0,0 +1,87 @@
+import hashlib
+import logging
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+from django.utils.timesince import timesince
+
+register = template.Library()
+logger = logging.getLogger(__name__)
+
+STATS_KEY = 'feed_row_cache_stats'
+
+
+def feed_row_cache_key(room):
+    """
+    Cache key for one rendered feed row.
+
+    The version covers everything the row shows: ``updated`` (bumped by edits,
+    comments and votes), the score, the participant count, the topic name
+    (renaming a topic does not touch its rooms), the host's name and avatar,
+    and the displayed age, so a row is re-rendered exactly when its output
+    would change.
+    """
+    host = room.host
+    topic = room.topic if room.topic_id else None
+    parts = [
+        room.updated.isoformat() if room.updated else '',
+        str(room.score),
+        str(room.participant_count),
+        str(room.topic_id or ''),
+        topic.name if topic else '',
+        host.username if host else '',
+        host.avatar.name if host and host.avatar else '',
+        timesince(room.created) if room.created else '',
+    ]
+    version = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return f'feed-row:{room.pk}:{version}'
+
+
+class FeedRowCacheNode(template.Node):
+    def __init__(self, nodelist, room):
+        self.nodelist = nodelist
+        self.room = room
+
+    def render(self, context):
+        room = self.room.resolve(context)
+        stats = context.render_context.setdefault(STATS_KEY, {'hits': 0, 'misses': 0})
+        key = feed_row_cache_key(room)
+        html = cache.get(key)
+        if html is None:
+            stats['misses'] += 1
+            html = self.nodelist.render(context)
+            cache.set(key, html, getattr(settings, 'FEED_ROW_CACHE_TIMEOUT', 3600))
+        else:
+            stats['hits'] += 1
+        return html
+
+
+@register.tag('cachefeedrow')
+def cache_feed_row(parser, token):
+    """
+    Cache the enclosed feed row markup per room and version::
+
+        {% cachefeedrow room %} ... {% endcachefeedrow %}
+    """
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes exactly one argument (the room)")
+    nodelist = parser.parse(('endcachefeedrow',))
+    parser.delete_first_token()
+    return FeedRowCacheNode(nodelist, parser.compile_filter(bits[1]))
+
+
+@register.simple_tag(takes_context=True)
+def feed_row_cache_stats(context):
+    """Log the row cache hit rate for this render; also emit it as an HTML comment when DEBUG is on."""
+    stats = context.render_context.get(STATS_KEY)
+    if not stats:
+        return ''
+    total = stats['hits'] + stats['misses']
+    summary = f"feed row cache: {stats['hits']}/{total} hits ({100 * stats['hits'] // total}%)"
+    logger.debug(summary)
+    if settings.DEBUG:
+        return mark_safe(f'<!-- {summary} -->')
+    return ''
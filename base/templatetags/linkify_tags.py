@@ -1,7 +1,7 @@
-import re
 from django import template
 from django.utils.safestring import mark_safe
-from django.utils.html import escape
+
+from base import rendering
 
 register = template.Library()
 
@@ -10,25 +10,20 @@ register = template.Library()
 def linkify(text):
     """
     Convert URLs in text to clickable links.
-    Only used for Study Materials comments.
+    Only used for Study Materials comments, as the fallback for rows
+    whose stored HTML predates the current renderer (see ``rendered``).
     """
     if not text:
         return text
-    
-    # Escape HTML first to prevent XSS
-    text = escape(text)
-    
-    # URL pattern
-    url_pattern = re.compile(
-        r'(https?://[^\s<>"\']+)',
-        re.IGNORECASE
-    )
-    
-    def replace_url(match):
-        url = match.group(1)
-        # Truncate display URL if too long
-        display_url = url if len(url) <= 50 else url[:47] + '...'
-        return f'<a href="{url}" target="_blank" rel="noopener noreferrer" style="color: var(--color-main); text-decoration: underline;">{display_url}</a>'
-    
-    result = url_pattern.sub(replace_url, text)
-    return mark_safe(result)
+    return mark_safe(rendering.render(text))
+
+
+@register.filter(name='rendered')
+def rendered(obj, field):
+    """
+    ``{{ message|rendered:"body" }}``: the stored ``<field>_html`` when it is
+    current, otherwise ``field`` rendered on the fly.
+    """
+    if obj.render_version == rendering.RENDERER_VERSION:
+        return mark_safe(getattr(obj, f'{field}_html'))
+    return linkify(getattr(obj, field))
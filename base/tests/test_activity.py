@@ -0,0 +1,68 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from base import activity
+from base.models import Message, Room, Topic, User
+
+
+class ActivityStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="user1", email="user1@th-deg.de", password="pass12345")
+        self.jobs_topic, _ = Topic.objects.get_or_create(slug="jobs-referrals", defaults={"name": "Jobs & Referrals"})
+        self.general_topic, _ = Topic.objects.get_or_create(slug="general", defaults={"name": "General"})
+        self.jobs_room = Room.objects.create(host=self.user, topic=self.jobs_topic, name="Jobs Room")
+        self.general_room = Room.objects.create(host=self.user, topic=self.general_topic, name="General Room")
+
+    def comment(self, room, body):
+        return Message.objects.create(user=self.user, room=room, body=body)
+
+    @override_settings(ACTIVITY_STREAM_SIZE=3)
+    def test_returns_latest_visible_comments_newest_first(self):
+        old = self.comment(self.general_room, "old")
+        premium = self.comment(self.jobs_room, "premium")
+        newer = [self.comment(self.general_room, f"new {i}") for i in range(3)]
+
+        self.assertEqual(list(activity.recent_activity(include_premium=False)), newer[::-1])
+        self.assertEqual(list(activity.recent_activity(include_premium=True)), [newer[2], newer[1], newer[0]])
+        self.assertEqual(
+            list(activity.recent_activity(include_premium=True, limit=5)),
+            newer[::-1] + [premium, old],
+        )
+
+    def test_buffer_tracks_new_and_deleted_comments(self):
+        first = self.comment(self.general_room, "first")
+        list(activity.recent_activity(include_premium=False))  # warm the buffer
+        with self.assertNumQueries(1):
+            stream = list(activity.recent_activity(include_premium=False))
+            # user and room come with the same query
+            [(m.user.username, m.room.name) for m in stream]
+
+        second = self.comment(self.general_room, "second")
+        with self.assertNumQueries(2):  # the buffer is rebuilt once
+            stream = list(activity.recent_activity(include_premium=False))
+        self.assertEqual(stream, [second, first])
+
+        second.delete()
+        self.assertEqual(list(activity.recent_activity(include_premium=False)), [first])
+
+    def test_moving_a_post_into_premium_hides_its_activity(self):
+        message = self.comment(self.general_room, "hello")
+        self.assertEqual(list(activity.recent_activity(include_premium=False)), [message])
+
+        self.general_room.topic = self.jobs_topic
+        self.general_room.save()
+        self.assertEqual(list(activity.recent_activity(include_premium=False)), [])
+        self.assertEqual(list(activity.recent_activity(include_premium=True)), [message])
+
+    def test_buffer_is_dropped_again_when_the_comment_commits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            message = self.comment(self.general_room, "hello")
+            # Another request rebuilt the buffer before the comment was committed.
+            cache.set(activity.ACTIVITY_BUFFER_CACHE_KEY, [], None)
+        self.assertEqual(list(activity.recent_activity(include_premium=False)), [message])
+
+    def test_is_lazy(self):
+        self.comment(self.general_room, "hello")
+        with self.assertNumQueries(0):
+            activity.recent_activity(include_premium=True)
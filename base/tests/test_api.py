@@ -1,8 +1,15 @@
+import functools
+import json
+import time
+from unittest import mock
+
 from django.test import TestCase
 from django.urls import reverse
+from django.utils.http import http_date
 
 from rest_framework.test import APIClient
 
+from base import export
 from base.models import Room, Topic, User
 
 
@@ -69,3 +76,234 @@ class ApiTests(TestCase):
         job_room_resp = self.client_api.get(reverse("api-room", kwargs={"pk": self.jobs_room.id}))
         self.assertEqual(job_room_resp.status_code, 200)
         self.assertEqual(job_room_resp.json()["id"], self.jobs_room.id)
+
+    def test_rooms_are_paginated_with_link_header(self):
+        for i in range(4):
+            Room.objects.create(host=self.user, topic=self.general_topic, name=f"Extra {i}")
+        self.client_api.force_authenticate(user=self.user)
+
+        seen = []
+        url = reverse("api-rooms") + "?page_size=2"
+        while url:
+            resp = self.client_api.get(url)
+            self.assertEqual(resp.status_code, 200)
+            seen.extend(room["id"] for room in resp.json())
+            link = resp.headers.get("Link")
+            url = link[1:link.index(">")] if link else None
+        expected = list(
+            Room.objects.exclude(topic=self.jobs_topic).order_by("-created", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+        resp = self.client_api.get(reverse("api-rooms"), {"cursor": "nope"})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_rooms_sparse_fieldsets_and_constant_queries(self):
+        members = [
+            User.objects.create_user(username=f"member{i}", email=f"member{i}@th-deg.de", password="pass12345")
+            for i in range(3)
+        ]
+        for i in range(6):
+            room = Room.objects.create(host=members[i % 3], topic=self.general_topic, name=f"Room {i}")
+            room.participants.add(*members)
+        self.client_api.force_authenticate(user=self.user)
+        self.client_api.get(reverse("api-rooms"))  # warm the topic catalogue
+
+        with self.assertNumQueries(3):
+            # The validator aggregate, rooms with hosts, then one prefetch for every participant.
+            resp = self.client_api.get(reverse("api-rooms"))
+        self.assertEqual(len(resp.json()[0]["participants"]), 3)
+
+        with self.assertNumQueries(2):
+            resp = self.client_api.get(reverse("api-rooms"), {"fields": "id,name"})
+        self.assertEqual(set(resp.json()[0]), {"id", "name"})
+
+        resp = self.client_api.get(reverse("api-rooms"), {"fields": "id,password"})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_rooms_answer_conditional_requests(self):
+        self.client_api.force_authenticate(user=self.user)
+        url = reverse("api-rooms")
+        resp = self.client_api.get(url)
+        etag = resp["ETag"]
+        # Deletions don't move Max(updated), so the list offers no Last-Modified.
+        self.assertNotIn("Last-Modified", resp)
+
+        with self.assertNumQueries(1):
+            # Only the aggregate over the visible rooms; nothing is serialized.
+            resp = self.client_api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp["ETag"], etag)
+
+        self.assertNotEqual(self.client_api.get(url, {"fields": "id"})["ETag"], etag)
+
+        self.general_room.name = "Renamed"
+        self.general_room.save()
+        resp = self.client_api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+
+        since = http_date(time.time() + 60)
+        self.general_room.delete()
+        resp = self.client_api.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_room_validators_differ_for_paid_and_free_users(self):
+        self.client_api.force_authenticate(user=self.user)
+        free_etag = self.client_api.get(reverse("api-rooms"))["ETag"]
+        room_url = reverse("api-room", kwargs={"pk": self.general_room.id})
+        resp = self.client_api.get(room_url)
+        free_room_etag = resp["ETag"]
+        self.assertNotIn("Last-Modified", resp)
+        resp = self.client_api.get(room_url, HTTP_IF_NONE_MATCH=free_room_etag)
+        self.assertEqual(resp.status_code, 304)
+
+        self.user.is_paid = True
+        self.user.save(update_fields=["is_paid"])
+        resp = self.client_api.get(reverse("api-rooms"), HTTP_IF_NONE_MATCH=free_etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.json()), 2)
+        resp = self.client_api.get(room_url, HTTP_IF_NONE_MATCH=free_room_etag)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_validators_follow_host_and_participant_profiles(self):
+        self.client_api.force_authenticate(user=self.user)
+        guest = User.objects.create_user(username="guest", email="guest@th-deg.de", password="pass12345")
+        self.general_room.participants.add(guest)
+        list_url = reverse("api-rooms")
+        room_url = reverse("api-room", kwargs={"pk": self.general_room.id})
+        etags = [self.client_api.get(url)["ETag"] for url in (list_url, room_url)]
+
+        guest.last_login = self.general_room.created
+        guest.save(update_fields=["last_login"])  # not part of the payload
+        for url, etag in zip((list_url, room_url), etags):
+            self.assertEqual(self.client_api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        for user, name in ((guest, "Guest Renamed"), (self.user, "Host Renamed")):
+            user.name = name
+            user.save()
+            for url, etag in zip((list_url, room_url), etags):
+                resp = self.client_api.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(resp.status_code, 200)
+                self.assertIn(name, resp.content.decode())
+            etags = [self.client_api.get(url)["ETag"] for url in (list_url, room_url)]
+
+    def test_missing_room_is_404(self):
+        self.client_api.force_authenticate(user=self.user)
+        resp = self.client_api.get(reverse("api-room", kwargs={"pk": self.general_room.id + 100}))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_room_changes_sync_updates_and_deletions(self):
+        self.client_api.force_authenticate(user=self.user)
+        url = reverse("api-room-changes")
+
+        data = self.client_api.get(url, {"fields": "id,name"}).json()
+        self.assertEqual([room["id"] for room in data["rooms"]], [self.general_room.id])
+        self.assertEqual((data["deleted"], data["more"]), ([], False))
+        cursor = data["cursor"]
+
+        data = self.client_api.get(url, {"since": cursor}).json()
+        self.assertEqual((data["rooms"], data["deleted"]), ([], []))
+
+        Room.objects.create(host=self.user, topic=self.general_topic, name="New")
+        self.jobs_room.delete()
+        gone_id = self.general_room.id
+        Room.objects.get(id=gone_id).delete()
+        Room.objects.create(host=self.user, topic=self.general_topic, name="Newest")
+
+        data = self.client_api.get(url, {"since": cursor, "page_size": 1}).json()
+        self.assertEqual([room["name"] for room in data["rooms"]], ["New"])
+        # The free user never saw the jobs room, so its deletion is not reported.
+        self.assertEqual(data["deleted"], [gone_id])
+        self.assertTrue(data["more"])
+        data = self.client_api.get(url, {"since": data["cursor"], "page_size": 1}).json()
+        self.assertEqual(([room["name"] for room in data["rooms"]], data["deleted"]), (["Newest"], []))
+        self.assertFalse(data["more"])
+
+        self.assertEqual(self.client_api.get(url, {"since": "garbage"}).status_code, 400)
+        with self.settings(CHANGES_TOMBSTONE_RETENTION_DAYS=0):
+            self.assertEqual(self.client_api.get(url, {"since": cursor}).status_code, 410)
+
+    def test_room_changes_drop_a_room_moved_into_premium(self):
+        paid = User.objects.create_user(username="paid", email="paid@th-deg.de", password="pass12345", is_paid=True)
+        url = reverse("api-room-changes")
+        cursors = {}
+        for user in (self.user, paid):
+            self.client_api.force_authenticate(user=user)
+            cursors[user] = self.client_api.get(url).json()["cursor"]
+
+        self.general_room.topic = self.jobs_topic
+        self.general_room.save()
+
+        self.client_api.force_authenticate(user=self.user)
+        data = self.client_api.get(url, {"since": cursors[self.user]}).json()
+        self.assertEqual((data["rooms"], data["deleted"]), ([], [self.general_room.id]))
+        # Paid users still see it: an update, not a deletion.
+        self.client_api.force_authenticate(user=paid)
+        data = self.client_api.get(url, {"since": cursors[paid], "fields": "id"}).json()
+        self.assertEqual((data["rooms"], data["deleted"]), ([{"id": self.general_room.id}], []))
+
+        # Moved back out, free users get it again as an update.
+        self.general_room.topic = self.general_topic
+        self.general_room.save()
+        self.client_api.force_authenticate(user=self.user)
+        data = self.client_api.get(url, {"since": cursors[self.user], "fields": "id"}).json()
+        self.assertEqual((data["rooms"], data["deleted"]), ([{"id": self.general_room.id}], []))
+
+    def test_export_is_staff_only_and_streams(self):
+        self.client_api.force_authenticate(user=self.user)
+        url = reverse("api-export", args=["rooms"])
+        self.assertEqual(self.client_api.get(url).status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save(update_fields=["is_staff"])
+        resp = self.client_api.get(url, {"output": "csv"})
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(len(b"".join(resp.streaming_content).decode().splitlines()), 3)
+        self.assertEqual(self.client_api.get(reverse("api-export", args=["users"])).status_code, 404)
+
+    async def test_export_streams_block_by_block_under_asgi(self):
+        self.user.is_staff = True
+        await self.user.asave(update_fields=["is_staff"])
+        await self.async_client.aforce_login(self.user)
+        one_row_blocks = functools.partial(export.export_blocks, chunk_size=1)
+        with mock.patch("base.export.export_blocks", one_row_blocks):
+            resp = await self.async_client.get(reverse("api-export", args=["rooms"]))
+        self.assertTrue(resp.is_async)
+
+        blocks = resp.streaming_content
+        self.assertEqual(json.loads(await anext(blocks))["id"], self.jobs_room.id)
+        # Rows are read as the body is sent, not before: a room created now still makes it.
+        late = await Room.objects.acreate(host=self.user, topic=self.general_topic, name="Late")
+        rest = [json.loads(block)["id"] async for block in blocks]
+        self.assertEqual(rest, [self.general_room.id, late.id])
+
+    def test_batch_reports_missing_and_forbidden_ids(self):
+        self.client_api.force_authenticate(user=self.user)
+        other = Room.objects.create(host=self.user, topic=self.general_topic, name="Other")
+        other.participants.add(self.user)
+        missing_id = other.id + 100
+        self.client_api.get(reverse("api-rooms"))  # warm the topic catalogue
+
+        url = reverse("api-rooms-batch")
+        ids = [other.id, self.jobs_room.id, missing_id, self.general_room.id, other.id]
+        with self.assertNumQueries(3):
+            # Id/topic lookup, the visible rooms with hosts, their participants.
+            resp = self.client_api.get(url, {"ids": ",".join(map(str, ids))})
+        data = resp.json()
+        self.assertEqual([room["id"] for room in data["rooms"]], [other.id, self.general_room.id])
+        self.assertEqual(data["rooms"][0]["participants"][0]["id"], self.user.id)
+        self.assertEqual((data["missing"], data["forbidden"]), ([missing_id], [self.jobs_room.id]))
+
+        resp = self.client_api.post(url, {"ids": ids, "fields": ["id", "name"]}, format="json")
+        self.assertEqual(resp.json()["rooms"], [{"id": other.id, "name": "Other"}, {"id": self.general_room.id, "name": "General Room"}])
+
+        self.user.is_paid = True
+        self.user.save(update_fields=["is_paid"])
+        data = self.client_api.get(url, {"ids": f"{self.jobs_room.id}"}).json()
+        self.assertEqual(([room["id"] for room in data["rooms"]], data["forbidden"]), ([self.jobs_room.id], []))
+
+        self.assertEqual(self.client_api.get(url, {"ids": "1,x"}).status_code, 400)
+        self.assertEqual(self.client_api.post(url, {"ids": "nope"}, format="json").status_code, 400)
+        self.assertEqual(self.client_api.post(url, [1, 2], format="json").status_code, 400)
@@ -0,0 +1,107 @@
+import csv
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from base.models import Message, PostVote, Room, Topic, User
+from base.rendering import RENDERER_VERSION, render
+from base.templatetags.linkify_tags import linkify, rendered
+
+
+class RebuildRoomCountersTests(TestCase):
+    def setUp(self):
+        self.topic, _ = Topic.objects.get_or_create(slug="general", defaults={"name": "General"})
+        self.users = [
+            User.objects.create_user(username=f"user{i}", email=f"user{i}@th-deg.de", password="pass12345")
+            for i in range(3)
+        ]
+        self.room = Room.objects.create(host=self.users[0], topic=self.topic, name="Room")
+        self.quiet_room = Room.objects.create(host=self.users[0], topic=self.topic, name="Quiet", score=7, upvotes=7)
+
+    def test_rebuild_room_counters_recomputes_from_votes(self):
+        PostVote.objects.create(user=self.users[0], room=self.room, value=1)
+        PostVote.objects.create(user=self.users[1], room=self.room, value=1)
+        PostVote.objects.create(user=self.users[2], room=self.room, value=-1)
+        self.room.participants.add(*self.users)
+        Room.objects.filter(id=self.room.id).update(participant_count=0)
+
+        out = StringIO()
+        call_command("rebuild_room_counters", "--chunk-size", "1", stdout=out)
+        self.assertIn("2 posts", out.getvalue())
+
+        self.room.refresh_from_db()
+        self.assertEqual((self.room.score, self.room.upvotes, self.room.downvotes), (1, 2, 1))
+        self.assertEqual(self.room.participant_count, 3)
+        self.quiet_room.refresh_from_db()
+        self.assertEqual((self.quiet_room.score, self.quiet_room.upvotes, self.quiet_room.downvotes), (0, 0, 0))
+
+
+class RefreshHotRanksTests(TestCase):
+    def test_refresh_hot_ranks_recomputes_stored_rank(self):
+        from base.ranking import hot_rank
+
+        topic, _ = Topic.objects.get_or_create(slug="general", defaults={"name": "General"})
+        user = User.objects.create_user(username="user1", email="user1@th-deg.de", password="pass12345")
+        room = Room.objects.create(host=user, topic=topic, name="Room")
+        Room.objects.filter(id=room.id).update(score=10, hot_rank=0)
+
+        out = StringIO()
+        call_command("refresh_hot_ranks", "--days", "1", stdout=out)
+        self.assertIn("1 posts", out.getvalue())
+        room.refresh_from_db()
+        self.assertAlmostEqual(room.hot_rank, hot_rank(10, 0, room.created))
+
+
+class ExportDataTests(TestCase):
+    def setUp(self):
+        topic, _ = Topic.objects.get_or_create(slug="general", defaults={"name": "General"})
+        self.user = User.objects.create_user(username="user1", email="user1@th-deg.de", password="pass12345")
+        self.rooms = [Room.objects.create(host=self.user, topic=topic, name=f"Room {i}") for i in range(5)]
+        PostVote.objects.create(user=self.user, room=self.rooms[0], value=1)
+
+    def test_export_ndjson_walks_table_in_chunks(self):
+        out = StringIO()
+        with self.assertNumQueries(4):
+            # Two rooms per query, then the empty query that ends the walk.
+            call_command("export_data", "rooms", "--chunk-size", "2", stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row["id"] for row in rows], [room.id for room in self.rooms])
+        self.assertEqual(rows[0]["host_id"], self.user.id)
+        self.assertIsNone(rows[0]["description"])
+
+    def test_export_csv(self):
+        out = StringIO()
+        call_command("export_data", "votes", "--format", "csv", stdout=out)
+        rows = list(csv.reader(StringIO(out.getvalue())))
+        self.assertEqual(rows[0], ["id", "user_id", "room_id", "value", "created_at"])
+        self.assertEqual(rows[1][1:4], [str(self.user.id), str(self.rooms[0].id), "1"])
+
+
+class RenderBodiesTests(TestCase):
+    def setUp(self):
+        topic, _ = Topic.objects.get_or_create(slug="exams-study", defaults={"name": "Exams & Study Help"})
+        self.user = User.objects.create_user(username="user1", email="user1@th-deg.de", password="pass12345")
+        self.room = Room.objects.create(host=self.user, topic=topic, name="Notes", description="See https://example.com <b>")
+
+    def test_bodies_are_rendered_on_save_and_backfilled(self):
+        self.assertIn('<a href="https://example.com"', self.room.description_html)
+        self.assertIn("&lt;b&gt;", self.room.description_html)
+        message = Message.objects.create(user=self.user, room=self.room, body="old")
+        message.body = "new https://example.org"
+        message.save(update_fields=["body"])
+        message.refresh_from_db()
+        self.assertIn('href="https://example.org"', message.body_html)
+        self.assertEqual(message.render_version, RENDERER_VERSION)
+
+        # Rows written before rendering existed (or by an older renderer).
+        Message.objects.update(body_html="", render_version=0)
+        self.assertEqual(rendered(Message.objects.get(), "body"), linkify(message.body))
+
+        out = StringIO()
+        call_command("render_bodies", "--chunk-size", "1", stdout=out)
+        self.assertIn("Rendered 1 messages", out.getvalue())
+        self.assertIn("Rendered 0 rooms", out.getvalue())
+        message.refresh_from_db()
+        self.assertEqual((message.body_html, message.render_version), (render(message.body), RENDERER_VERSION))
@@ -0,0 +1,107 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from base import events
+from base.events import CacheEventBackend, EventBackend, InProcessEventBackend
+from base.messaging import send_direct_message
+from base.models import User
+
+
+class RecordingBackend(EventBackend):
+    def __init__(self):
+        self.published = []
+
+    def publish(self, user_id, event):
+        self.published.append((user_id, event))
+
+
+class EventBackendTests(SimpleTestCase):
+    async def test_in_process_backend_delivers_across_threads(self):
+        backend = InProcessEventBackend()
+        subscription = backend.subscribe(1)
+        await sync_to_async(backend.publish, thread_sensitive=False)(1, {"type": "unread", "count": 3})
+        backend.publish(2, {"type": "unread", "count": 9})
+
+        self.assertEqual(await subscription.get(1), [{"type": "unread", "count": 3}])
+        self.assertEqual(await subscription.get(0.01), [])
+        subscription.close()
+        self.assertEqual(backend._subscriptions, {})
+
+    async def test_cache_backend_delivers_events_published_after_subscribing(self):
+        await sync_to_async(cache.clear)()
+        backend = CacheEventBackend(poll_interval=0.01)
+        await sync_to_async(backend.publish)(1, {"type": "unread", "count": 1})
+        subscription = backend.subscribe(1)
+        self.assertEqual(await subscription.get(0.05), [])
+
+        await sync_to_async(backend.publish)(1, {"type": "unread", "count": 2})
+        await sync_to_async(backend.publish)(1, {"type": "unread", "count": 3})
+        self.assertEqual([e["count"] for e in await subscription.get(1)], [2, 3])
+
+
+@override_settings(EVENTS_BACKEND="base.tests.test_events.RecordingBackend")
+class DirectMessageEventTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        events._backend = None
+        self.addCleanup(setattr, events, "_backend", None)
+        self.alice = User.objects.create_user(username="alice", email="alice@th-deg.de", password="pass12345")
+        self.bob = User.objects.create_user(username="bob", email="bob@th-deg.de", password="pass12345")
+
+    def test_new_message_is_published_to_receiver_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            message = send_direct_message(self.alice, self.bob, "Hello")
+        self.assertEqual(events.get_backend().published, [])
+
+        for callback in callbacks:
+            callback()
+        published = events.get_backend().published
+        self.assertEqual([(user_id, event["type"]) for user_id, event in published], [(self.bob.id, "message"), (self.bob.id, "unread")])
+        self.assertEqual(published[0][1]["id"], message.id)
+        self.assertFalse(published[0][1]["sent"])
+        self.assertEqual(published[1][1]["count"], 1)
+
+
+@override_settings(EVENTS_BACKEND="base.events.InProcessEventBackend", EVENTS_KEEPALIVE_SECONDS=0.05)
+class MessageEventStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        events._backend = None
+        self.addCleanup(setattr, events, "_backend", None)
+        self.alice = User.objects.create_user(username="alice", email="alice@th-deg.de", password="pass12345")
+
+    async def test_stream_sends_unread_count_keepalives_and_events(self):
+        await self.async_client.aforce_login(self.alice)
+        response = await self.async_client.get(reverse("message-events"))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+        chunks = response.streaming_content
+        self.assertEqual(await anext(chunks), b"retry: 5000\n\n")
+        first = (await anext(chunks)).decode()
+        self.assertEqual(json.loads(first.split("data: ", 1)[1]), {"type": "unread", "count": 0})
+        self.assertEqual(await anext(chunks), b": keepalive\n\n")
+
+        events.publish(self.alice.id, {"type": "unread", "count": 4})
+        self.assertEqual(await anext(chunks), b'event: unread\ndata: {"type": "unread", "count": 4}\n\n')
+        await chunks.aclose()
+
+    def test_stream_is_refused_under_wsgi(self):
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse("message-events"))
+        self.assertEqual(response.status_code, 204)
+        # Pages served over WSGI don't open the stream either.
+        self.assertNotContains(self.client.get(reverse("home")), "data-events-url")
+
+    async def test_pages_served_over_asgi_open_the_stream(self):
+        await self.async_client.aforce_login(self.alice)
+        response = await self.async_client.get(reverse("home"))
+        self.assertContains(response, 'data-events-url="%s"' % reverse("message-events"))
+
+    def test_stream_requires_login(self):
+        response = self.client.get(reverse("message-events"))
+        self.assertEqual(response.status_code, 302)
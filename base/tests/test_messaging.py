@@ -0,0 +1,102 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from base.context_processors import unread_message_count
+from base.messaging import send_direct_message, unread_count
+from base.models import Conversation, DirectMessage, User
+
+
+class ConversationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username="alice", email="alice@th-deg.de", password="pass12345")
+        self.bob = User.objects.create_user(username="bob", email="bob@th-deg.de", password="pass12345")
+        self.client.login(email=self.alice.email, password="pass12345")
+
+    def test_sending_maintains_conversation(self):
+        self.client.post(reverse("conversation", args=[self.bob.id]), {"content": "Hi Bob"})
+        send_direct_message(self.bob, self.alice, "Hi Alice")
+        last = send_direct_message(self.bob, self.alice, "Still there?")
+
+        conversation = Conversation.objects.get()
+        self.assertEqual((conversation.user_a, conversation.user_b), (self.alice, self.bob))
+        self.assertEqual(conversation.last_message, last)
+        self.assertEqual(conversation.unread_for(self.alice), 2)
+        self.assertEqual(conversation.unread_for(self.bob), 1)
+        self.assertEqual(DirectMessage.objects.filter(conversation=conversation).count(), 3)
+
+        self.client.get(reverse("conversation", args=[self.bob.id]))
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.unread_for(self.alice), 0)
+        self.assertFalse(DirectMessage.objects.filter(receiver=self.alice, is_read=False).exists())
+
+    def test_inbox_is_one_query_regardless_of_conversations(self):
+        for i in range(5):
+            other = User.objects.create_user(username=f"user{i}", email=f"user{i}@th-deg.de", password="pass12345")
+            send_direct_message(other, self.alice, f"Message {i}")
+        self.client.get(reverse("inbox"))  # warm session and context processor state
+
+        with self.assertNumQueries(3):
+            # Session, user and the conversation list; the unread badge is cached.
+            resp = self.client.get(reverse("inbox"))
+        conversations = resp.context["conversations"]
+        self.assertEqual([c["last_message"].content for c in conversations], [f"Message {i}" for i in range(4, -1, -1)])
+        self.assertEqual(resp.context["total_unread"], 5)
+
+    def test_backfill_builds_conversations_from_messages(self):
+        DirectMessage.objects.create(sender=self.bob, receiver=self.alice, content="old one")
+        newest = DirectMessage.objects.create(sender=self.alice, receiver=self.bob, content="old two", is_read=True)
+
+        call_command("backfill_conversations", stdout=StringIO())
+
+        conversation = Conversation.objects.get()
+        self.assertEqual(conversation.last_message, newest)
+        self.assertEqual((conversation.unread_a, conversation.unread_b), (1, 0))
+        self.assertFalse(DirectMessage.objects.filter(conversation__isnull=True).exists())
+
+    def test_unread_badge_is_cached_and_kept_in_sync(self):
+        send_direct_message(self.bob, self.alice, "one")
+        resp = self.client.get(reverse("inbox"))
+        self.assertEqual(resp.context["unread_message_count"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            send_direct_message(self.bob, self.alice, "two")
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.alice.id), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("conversation", args=[self.bob.id]))
+        self.assertEqual(unread_count(self.alice.id), 0)
+
+    def test_context_processor_is_lazy(self):
+        request = RequestFactory().get("/")
+        request.user = self.alice
+        with self.assertNumQueries(0):
+            context = unread_message_count(request)
+        with self.assertNumQueries(1):
+            self.assertEqual(context["unread_message_count"], 0)
+
+    def test_conversation_shows_newest_page_and_loads_earlier(self):
+        for i in range(7):
+            send_direct_message(self.bob if i % 2 else self.alice, self.alice if i % 2 else self.bob, f"m{i}")
+
+        with self.settings(CONVERSATION_PAGE_SIZE=3):
+            resp = self.client.get(reverse("conversation", args=[self.bob.id]))
+            self.assertEqual([m.content for m in resp.context["conversation_messages"]], ["m4", "m5", "m6"])
+
+            history_url = reverse("conversation-history", args=[self.bob.id])
+            seen = []
+            cursor = resp.context["earlier_cursor"]
+            while cursor:
+                data = self.client.get(history_url, {"cursor": cursor}).json()
+                seen = [m["content"] for m in data["messages"]] + seen
+                cursor = data["next_cursor"]
+        self.assertEqual(seen, ["m0", "m1", "m2", "m3"])
+        self.assertTrue(data["messages"][0]["sent"])
+
+        resp = self.client.get(history_url, {"cursor": "garbage"})
+        self.assertEqual(resp.status_code, 400)
@@ -0,0 +1,126 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from base import search
+from base.models import Message, Room, Topic, User
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="user1",
+            email="user1@th-deg.de",
+            password="pass12345",
+        )
+        self.topic, _ = Topic.objects.get_or_create(slug="general", defaults={"name": "General"})
+        self.housing, _ = Topic.objects.get_or_create(slug="housing", defaults={"name": "Housing & Roommates"})
+
+        self.weak = Room.objects.create(
+            host=self.user, topic=self.topic, name="Misc", description="one mention of algorithms here and more words"
+        )
+        self.strong = Room.objects.create(
+            host=self.user, topic=self.topic, name="Algorithms", description="algorithms algorithms"
+        )
+        self.other = Room.objects.create(host=self.user, topic=self.housing, name="Flat share", description="Cheap")
+
+    def login(self):
+        self.assertTrue(self.client.login(email=self.user.email, password="pass12345"))
+
+    def test_fts_is_available_on_sqlite(self):
+        self.assertEqual(search.is_available(), connection.vendor == "sqlite")
+
+    def test_build_match_query_quotes_tokens(self):
+        self.assertEqual(search.build_match_query('algo "OR" NEAR('), '"algo"* "or"* "near"*')
+        self.assertEqual(search.build_match_query("  !! "), "")
+
+    def test_search_ranks_better_matches_first(self):
+        self.login()
+        resp = self.client.get(reverse("home"), {"q": "algorithm"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(list(resp.context["rooms"]), [self.strong, self.weak])
+        self.assertEqual(resp.context["current_sort"], "relevance")
+
+    def test_search_ranks_only_the_newest_matches(self):
+        newest = Room.objects.create(host=self.user, topic=self.topic, name="Intro", description="algorithms")
+        with self.settings(SEARCH_RESULT_WINDOW=2):
+            rooms, ranked = search.search_rooms(Room.objects.all(), "algorithms")
+            # Older matches are still found, after the ranked ones.
+            self.assertEqual(list(rooms.order_by("search_rank", "id")), [self.strong, newest, self.weak])
+            self.assertEqual(rooms.get(id=self.weak.id).search_rank, 0)
+            # The window is taken after the caller's filters.
+            rooms, _ = search.search_rooms(Room.objects.exclude(id=newest.id), "algorithms")
+            self.assertEqual(list(rooms.order_by("search_rank", "id")), [self.strong, self.weak])
+            self.assertLess(rooms.get(id=self.weak.id).search_rank, 0)
+
+            self.login()
+            resp = self.client.get(reverse("home"), {"q": "algorithms", "sort": "new"})
+            self.assertEqual(list(resp.context["rooms"]), [newest, self.strong, self.weak])
+
+    def test_search_index_follows_updates_deletes_and_topic_renames(self):
+        rooms, ranked = search.search_rooms(Room.objects.all(), "roommates")
+        self.assertTrue(ranked)
+        self.assertEqual(list(rooms), [self.other])
+
+        self.housing.name = "Accommodation"
+        self.housing.save()
+        self.assertFalse(search.search_rooms(Room.objects.all(), "roommates")[0].exists())
+        self.assertEqual(list(search.search_rooms(Room.objects.all(), "accommodation")[0]), [self.other])
+
+        self.other.description = "Quiet neighbourhood"
+        self.other.save()
+        self.assertEqual(list(search.search_rooms(Room.objects.all(), "neighbourhood")[0]), [self.other])
+
+        self.other.delete()
+        self.assertFalse(search.search_rooms(Room.objects.all(), "neighbourhood")[0].exists())
+
+    def test_search_messages(self):
+        message = Message.objects.create(user=self.user, room=self.weak, body="Try the dijkstra lecture notes")
+        Message.objects.create(user=self.user, room=self.weak, body="Unrelated")
+        self.assertEqual(list(search.search_messages(Message.objects.all(), "dijk")), [message])
+
+    def test_falls_back_to_icontains_without_fts(self):
+        with mock.patch.object(search, "is_available", return_value=False):
+            rooms, ranked = search.search_rooms(Room.objects.all(), "gorith")
+            self.assertFalse(ranked)
+            self.assertEqual(set(rooms), {self.weak, self.strong})
+
+            self.login()
+            resp = self.client.get(reverse("home"), {"q": "flat"})
+            self.assertEqual(list(resp.context["rooms"]), [self.other])
+            self.assertEqual(resp.context["current_sort"], "new")
+
+    def test_rebuild_search_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.ROOM_INDEX}")
+        self.assertFalse(search.search_rooms(Room.objects.all(), "algorithms")[0].exists())
+
+        out = StringIO()
+        call_command("rebuild_search_index", "--chunk-size", "1", stdout=out)
+        self.assertIn("posts=3", out.getvalue())
+        self.assertEqual(set(search.search_rooms(Room.objects.all(), "algorithms")[0]), {self.weak, self.strong})
+
+    def test_user_search_and_typeahead(self):
+        ada = User.objects.create_user(username="ada", email="lovelace@th-deg.de", password="pass12345", name="Ada Lovelace")
+        User.objects.create_user(username="bob", email="bob@th-deg.de", password="pass12345", name="Bob Builder")
+        self.login()
+
+        resp = self.client.get(reverse("start-conversation"), {"q": "love"})
+        self.assertEqual(list(resp.context["users"]), [ada])
+        self.assertEqual(resp.context["search_query"], "love")
+
+        resp = self.client.get(reverse("user-search"), {"q": "ad lov"})
+        self.assertEqual([u["username"] for u in resp.json()["results"]], ["ada"])
+        # The current user is never suggested.
+        resp = self.client.get(reverse("user-search"), {"q": "user1"})
+        self.assertEqual(resp.json()["results"], [])
+
+        ada.name = "Augusta King"
+        ada.save()
+        self.assertEqual(list(search.search_users(User.objects.all(), "augusta")[0]), [ada])
+        ada.delete()
+        self.assertFalse(search.search_users(User.objects.all(), "augusta")[0].exists())
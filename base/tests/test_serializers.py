@@ -0,0 +1,64 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from base.api.serializers import RoomSerializer, RoomValuesSerializer
+from base.api.views import _room_queryset
+from base.models import Room, Topic, User
+from base.topics import attach_topics
+
+
+class RoomValuesSerializerContractTests(TestCase):
+    """RoomValuesSerializer must render byte-for-byte what RoomSerializer renders."""
+
+    def setUp(self):
+        self.topic, _ = Topic.objects.get_or_create(slug="general", defaults={"name": "General"})
+        self.users = [
+            User.objects.create_user(
+                username=f"user{i}", email=f"user{i}@th-deg.de", password="pass12345",
+                name=f"User {i}" if i else None, is_paid=bool(i % 2),
+            )
+            for i in range(4)
+        ]
+        full = Room.objects.create(host=self.users[1], topic=self.topic, name="Full", description="Déjà vu \"quoted\"")
+        full.participants.add(self.users[3], self.users[0], self.users[2])
+        Room.objects.create(host=self.users[0], topic=None, name="No topic")
+        orphan = Room.objects.create(host=self.users[2], topic=self.topic, name="Orphan")
+        orphan.participants.add(self.users[1])
+        self.users[2].delete()  # leaves the room with host NULL
+
+    def render_both(self, fields):
+        rooms = Room.objects.order_by("-created", "-id")
+        instances = attach_topics(list(_room_queryset(fields, rooms)))
+        slow = JSONRenderer().render(RoomSerializer(instances, many=True, fields=fields).data)
+        fast = JSONRenderer().render(RoomValuesSerializer(list(RoomValuesSerializer.values(rooms, fields)), fields).data)
+        return slow, fast
+
+    def test_output_is_byte_identical(self):
+        for fields in (None, ["id", "name"], ["host", "participants"], ["topic", "description", "updated", "created"]):
+            with self.subTest(fields=fields):
+                slow, fast = self.render_both(fields)
+                self.assertEqual(fast, slow)
+
+    @override_settings(TIME_ZONE="Europe/Berlin")
+    def test_datetimes_follow_the_current_time_zone(self):
+        slow, fast = self.render_both(["id", "created"])
+        self.assertIn(b"+0", fast)
+        self.assertEqual(fast, slow)
+
+    def test_endpoints_respond_identically_on_either_path(self):
+        client = APIClient()
+        client.force_authenticate(user=self.users[1])
+        url = reverse("api-rooms")
+        fast = client.get(url)
+        with self.settings(API_FAST_SERIALIZERS=[]):
+            slow = client.get(url)
+        self.assertEqual(fast.content, slow.content)
+
+        url = reverse("api-room-changes")
+        fast = client.get(url).json()["rooms"]
+        with self.settings(API_FAST_SERIALIZERS=[]):
+            slow = client.get(url).json()["rooms"]
+        self.assertEqual(fast, slow)
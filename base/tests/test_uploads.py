@@ -0,0 +1,129 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import SkipFile, StopUpload
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from base import uploads
+from base.models import Message, Room, Topic, User
+
+PDF = b'%PDF-1.7\n' + b'0' * 2000
+DOCX = b'PK\x03\x04' + b'\x14\x00' * 100
+
+
+class AttachmentUploadHandlerTests(TestCase):
+    def start(self, content_length=None, field_name='attachment', file_name='notes.pdf'):
+        handler = uploads.AttachmentUploadHandler()
+        handler.new_file(field_name, file_name, 'application/pdf', content_length)
+        return handler
+
+    def test_sniffs_kind_and_hashes_in_one_pass(self):
+        handler = self.start()
+        for start in range(0, len(PDF), 500):
+            self.assertEqual(handler.receive_data_chunk(PDF[start:start + 500], start), PDF[start:start + 500])
+        handler.file_complete(len(PDF))
+        self.assertEqual(handler.kinds['attachment'], 'pdf')
+        self.assertEqual(handler.digests['attachment'], hashlib.sha256(PDF).hexdigest())
+
+    def test_rejects_unknown_magic_on_first_chunk(self):
+        handler = self.start()
+        with self.assertRaises(SkipFile):
+            handler.receive_data_chunk(b'MZ\x90\x00 not a document', 0)
+        self.assertEqual(handler.errors['attachment'], uploads.TYPE_ERROR)
+
+    def test_rejects_kind_that_does_not_match_the_extension(self):
+        with self.assertRaises(SkipFile):
+            self.start(file_name='evil.html')
+        handler = self.start(file_name='notes.docx')
+        with self.assertRaises(SkipFile):
+            handler.receive_data_chunk(PDF, 0)
+        self.assertEqual(handler.errors['attachment'], uploads.TYPE_ERROR)
+
+    @override_settings(ATTACHMENT_MAX_UPLOAD_SIZE=1000)
+    def test_stops_as_soon_as_the_limit_is_passed(self):
+        handler = self.start()
+        handler.receive_data_chunk(PDF[:600], 0)
+        with self.assertRaises(StopUpload) as stopped:
+            handler.receive_data_chunk(PDF[600:1200], 600)
+        self.assertTrue(stopped.exception.connection_reset)
+        self.assertEqual(handler.errors['attachment'], uploads.size_error())
+
+    @override_settings(ATTACHMENT_MAX_UPLOAD_SIZE=1000)
+    def test_declared_length_over_the_limit_is_rejected_up_front(self):
+        with self.assertRaises(StopUpload):
+            self.start(content_length=5000)
+
+    def test_other_fields_pass_through_unchecked(self):
+        handler = self.start(field_name='avatar')
+        self.assertEqual(handler.receive_data_chunk(b'GIF89a', 0), b'GIF89a')
+        self.assertIsNone(handler.file_complete(6))
+        self.assertEqual(handler.errors, {})
+
+
+class AttachmentViewTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = User.objects.create_user(username="user1", email="user1@th-deg.de", password="pass12345")
+        self.client.login(email="user1@th-deg.de", password="pass12345")
+        self.study_topic, _ = Topic.objects.get_or_create(
+            slug="exams-study", defaults={"name": "Exams & Study Help"},
+        )
+
+    def create_post(self, content, name='notes.pdf', content_type='application/pdf'):
+        return self.client.post(
+            reverse("create-room") + "?category=study",
+            data={"description": "Exam notes", "attachment": SimpleUploadedFile(name, content, content_type)},
+        )
+
+    def test_accepts_sniffed_pdf_whatever_the_declared_type(self):
+        resp = self.create_post(PDF, content_type='text/plain')
+        self.assertEqual(resp.status_code, 302)
+        room = Room.objects.get(description="Exam notes")
+        self.assertTrue(room.attachment.name.startswith('attachments/notes'))
+        self.assertEqual(room.attachment_sha256, hashlib.sha256(PDF).hexdigest())
+
+    def test_rejects_pdf_named_as_another_type(self):
+        resp = self.create_post(PDF, name='evil.html', content_type='application/pdf')
+        self.assertContains(resp, uploads.TYPE_ERROR)
+        self.assertFalse(Room.objects.exists())
+        self.assertEqual(os.listdir(self.media_root), [])
+
+    def test_rejects_disguised_file(self):
+        resp = self.create_post(b'#!/bin/sh\nrm -rf /\n', name='notes.pdf')
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, uploads.TYPE_ERROR)
+        self.assertFalse(Room.objects.exists())
+
+    @override_settings(ATTACHMENT_MAX_UPLOAD_SIZE=1024 * 1024)
+    def test_rejects_oversized_file(self):
+        resp = self.create_post(PDF + b'0' * (1024 * 1024))
+        self.assertContains(resp, 'File size must be less than 1MB.')
+        self.assertFalse(Room.objects.exists())
+        self.assertEqual(os.listdir(self.media_root), [])
+
+    def test_comment_attachment_is_checked_and_hashed(self):
+        room = Room.objects.create(host=self.user, topic=self.study_topic, name="Notes", description="Notes")
+        url = reverse("room", kwargs={"pk": room.id})
+
+        resp = self.client.post(url, data={"body": "slides", "attachment": SimpleUploadedFile('s.docx', DOCX)})
+        self.assertEqual(resp.status_code, 302)
+        message = Message.objects.get(body="slides")
+        self.assertEqual(message.attachment_sha256, hashlib.sha256(DOCX).hexdigest())
+
+        self.client.post(url, data={"body": "virus", "attachment": SimpleUploadedFile('v.doc', b'MZ' * 10)})
+        self.assertFalse(Message.objects.filter(body="virus").exists())
+
+    def test_upload_views_still_require_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        resp = client.post(reverse("create-room") + "?category=study", data={"description": "Exam notes"})
+        self.assertEqual(resp.status_code, 403)
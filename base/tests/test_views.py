@@ -1,6 +1,10 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from base import topics
 from base.models import Message, PostVote, Room, Topic, User
 
 
@@ -38,6 +42,31 @@ class ViewTests(TestCase):
         ok = self.client.login(email=user.email, password="pass12345")
         self.assertTrue(ok)
 
+    def test_landing_counts_are_cached_and_invalidated(self):
+        cache.clear()
+        study_topic, _ = Topic.objects.get_or_create(slug="exams-study", defaults={"name": "Exams & Study Help"})
+        Room.objects.create(host=self.user, topic=study_topic, name="Notes")
+
+        resp = self.client.get(reverse("landing"))
+        self.assertEqual(resp.context["study_count"], 1)
+        self.assertEqual(resp.context["jobs_count"], 1)
+
+        # Steady state: anonymous landing hits do no database work at all.
+        with self.assertNumQueries(0):
+            resp = self.client.get(reverse("landing"))
+        self.assertEqual(resp.context["study_count"], 1)
+
+        Room.objects.create(host=self.user, topic=study_topic, name="More notes")
+        self.jobs_room.topic = study_topic
+        self.jobs_room.save()
+        resp = self.client.get(reverse("landing"))
+        self.assertEqual(resp.context["study_count"], 3)
+        self.assertEqual(resp.context["jobs_count"], 0)
+
+        self.jobs_room.delete()
+        resp = self.client.get(reverse("landing"))
+        self.assertEqual(resp.context["study_count"], 2)
+
     def test_home_requires_login(self):
         resp = self.client.get(reverse("home"))
         self.assertEqual(resp.status_code, 302)
@@ -92,6 +121,82 @@ class ViewTests(TestCase):
             Message.objects.filter(room=self.general_room, user=self.user, body="hello").exists()
         )
         self.assertTrue(self.general_room.participants.filter(id=self.user.id).exists())
+        self.general_room.refresh_from_db()
+        self.assertEqual(self.general_room.participant_count, 1)
+
+        # Commenting again does not count the same participant twice.
+        self.client.post(reverse("room", kwargs={"pk": self.general_room.id}), data={"body": "again"})
+        self.general_room.refresh_from_db()
+        self.assertEqual(self.general_room.participant_count, 1)
+
+    def test_participant_count_follows_membership_changes(self):
+        other = User.objects.create_user(username="user2", email="user2@th-deg.de", password="pass12345")
+        self.general_room.participants.add(self.user, other)
+        self.general_room.refresh_from_db()
+        self.assertEqual(self.general_room.participant_count, 2)
+
+        other.participants.remove(self.general_room)
+        self.general_room.refresh_from_db()
+        self.assertEqual(self.general_room.participant_count, 1)
+
+        self.general_room.participants.clear()
+        self.general_room.refresh_from_db()
+        self.assertEqual(self.general_room.participant_count, 0)
+
+    def test_feed_query_count_does_not_depend_on_page_size(self):
+        self.login()
+        others = [
+            User.objects.create_user(username=f"member{i}", email=f"member{i}@th-deg.de", password="pass12345")
+            for i in range(3)
+        ]
+        for i in range(12):
+            room = Room.objects.create(host=others[i % 3], topic=self.general_topic, name=f"Room {i}")
+            room.participants.add(*others)
+
+        def feed_queries(page_size):
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.client.get(reverse("home"), {"page_size": page_size})
+            self.assertEqual(len(resp.context["rooms"]), page_size)
+            return len(ctx.captured_queries)
+
+        self.client.get(reverse("home"))  # warm the topic catalogue
+        self.assertEqual(feed_queries(2), feed_queries(10))
+
+    def test_room_comments_are_paginated_newest_first(self):
+        self.login()
+        authors = [
+            User.objects.create_user(username=f"author{i}", email=f"author{i}@th-deg.de", password="pass12345")
+            for i in range(5)
+        ]
+        for i in range(7):
+            Message.objects.create(user=authors[i % 5], room=self.general_room, body=f"c{i}")
+        self.general_room.participants.add(*authors)
+
+        def room_queries(page_size):
+            with self.settings(ROOM_COMMENTS_PAGE_SIZE=page_size, ROOM_PARTICIPANTS_SHOWN=2):
+                with CaptureQueriesContext(connection) as ctx:
+                    resp = self.client.get(reverse("room", kwargs={"pk": self.general_room.id}))
+            return resp, len(ctx.captured_queries)
+
+        room_queries(2)  # warm the session and topic catalogue
+        resp, few = room_queries(2)
+        _, many = room_queries(7)
+        self.assertEqual(few, many)
+        self.assertEqual([m.body for m in resp.context["room_messages"]], ["c6", "c5"])
+        self.assertEqual((len(resp.context["participants"]), resp.context["more_participants"]), (2, 3))
+        self.assertContains(resp, "and 3 more")
+
+        seen = []
+        cursor = resp.context["older_cursor"]
+        url = reverse("room-comments", kwargs={"pk": self.general_room.id})
+        with self.settings(ROOM_COMMENTS_PAGE_SIZE=2):
+            while cursor:
+                data = self.client.get(url, {"cursor": cursor}).json()
+                seen.append(data["html"].count('class="thread"'))
+                cursor = data["next_cursor"]
+        self.assertEqual(seen, [2, 2, 1])
+        self.assertEqual(self.client.get(url, {"cursor": "junk"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("room-comments", kwargs={"pk": self.jobs_room.id})).status_code, 403)
 
     def test_vote_toggles_same_direction(self):
         self.login()
@@ -117,6 +222,101 @@ class ViewTests(TestCase):
         self.client.post(vote_url, data={"direction": "down"})
         self.assertTrue(PostVote.objects.filter(user=self.user, room=self.general_room, value=-1).exists())
 
+    def test_vote_keeps_room_counters_in_sync(self):
+        self.login()
+        other = User.objects.create_user(username="user2", email="user2@th-deg.de", password="pass12345")
+        vote_url = reverse("vote-room", kwargs={"pk": self.general_room.id})
+
+        self.client.post(vote_url, data={"direction": "up"})
+        self.login(other)
+        self.client.post(vote_url, data={"direction": "up"})
+        self.general_room.refresh_from_db()
+        self.assertEqual((self.general_room.score, self.general_room.upvotes, self.general_room.downvotes), (2, 2, 0))
+
+        self.client.post(vote_url, data={"direction": "down"})
+        self.general_room.refresh_from_db()
+        self.assertEqual((self.general_room.score, self.general_room.upvotes, self.general_room.downvotes), (0, 1, 1))
+
+        self.client.post(vote_url, data={"direction": "down"})
+        self.general_room.refresh_from_db()
+        self.assertEqual((self.general_room.score, self.general_room.upvotes, self.general_room.downvotes), (1, 1, 0))
+
+    def test_vote_and_comment_refresh_hot_rank(self):
+        self.login()
+        initial = Room.objects.get(id=self.general_room.id).hot_rank
+        self.assertGreater(initial, 0)
+
+        self.client.post(reverse("vote-room", kwargs={"pk": self.general_room.id}), data={"direction": "up"})
+        after_vote = Room.objects.get(id=self.general_room.id).hot_rank
+        self.assertEqual(after_vote, initial)  # log10(1) == 0: a single vote only breaks ties
+
+        for i in range(3):
+            self.client.post(reverse("room", kwargs={"pk": self.general_room.id}), data={"body": f"c{i}"})
+        after_comments = Room.objects.get(id=self.general_room.id).hot_rank
+        self.assertGreater(after_comments, after_vote)
+
+    def test_home_hot_sort_prefers_active_posts(self):
+        self.login()
+        other = User.objects.create_user(username="user2", email="user2@th-deg.de", password="pass12345")
+        newer = Room.objects.create(host=self.user, topic=self.general_topic, name="Newer")
+        for user in (self.user, other):
+            self.client.force_login(user)
+            self.client.post(reverse("vote-room", kwargs={"pk": self.general_room.id}), data={"direction": "up"})
+
+        resp = self.client.get(reverse("home"), {"sort": "hot"})
+        rooms = list(resp.context["rooms"])
+        self.assertLess(rooms.index(self.general_room), rooms.index(newer))
+
+    def test_feed_rows_are_served_from_cache_until_they_change(self):
+        cache.clear()
+        self.login()
+
+        with self.assertLogs("base.templatetags.feed_tags", level="DEBUG") as logs:
+            self.client.get(reverse("home"))
+        self.assertIn("feed row cache: 0/1 hits", logs.output[-1])
+
+        with self.assertLogs("base.templatetags.feed_tags", level="DEBUG") as logs:
+            self.client.get(reverse("home"))
+        self.assertIn("feed row cache: 1/1 hits", logs.output[-1])
+
+        # A vote changes the score shown in the row, so the row is re-rendered.
+        self.client.post(reverse("vote-room", kwargs={"pk": self.general_room.id}), data={"direction": "up"})
+        with self.assertLogs("base.templatetags.feed_tags", level="DEBUG") as logs:
+            resp = self.client.get(reverse("home"))
+        self.assertIn("feed row cache: 0/1 hits", logs.output[-1])
+        self.assertContains(resp, "Score: 1")
+
+        # So does renaming the room's topic, which leaves the room itself untouched.
+        self.general_topic.name = "General Chat"
+        self.general_topic.save()
+        with self.assertLogs("base.templatetags.feed_tags", level="DEBUG") as logs:
+            resp = self.client.get(reverse("home"))
+        self.assertIn("feed row cache: 0/1 hits", logs.output[-1])
+        self.assertContains(resp, "General Chat")
+
+    def test_feed_row_cache_stats_in_debug_output(self):
+        cache.clear()
+        self.login()
+        self.client.get(reverse("home"))
+        with self.settings(DEBUG=True):
+            resp = self.client.get(reverse("home"))
+        self.assertContains(resp, "<!-- feed row cache: 1/1 hits (100%) -->")
+
+    def test_comment_bumps_room_updated(self):
+        self.login()
+        before = Room.objects.get(id=self.general_room.id).updated
+        self.client.post(reverse("room", kwargs={"pk": self.general_room.id}), data={"body": "hi"})
+        self.assertGreater(Room.objects.get(id=self.general_room.id).updated, before)
+
+    def test_home_top_sort_orders_by_score(self):
+        self.login()
+        popular = Room.objects.create(host=self.user, topic=self.general_topic, name="Popular", score=5)
+
+        resp = self.client.get(reverse("home"), {"sort": "top"})
+        rooms = list(resp.context["rooms"])
+        self.assertEqual(rooms[0], popular)
+        self.assertEqual(resp.context["current_sort"], "top")
+
     def test_demo_subscribe_unsubscribe(self):
         self.login()
 
@@ -132,3 +332,97 @@ class ViewTests(TestCase):
         self.assertEqual(resp.status_code, 302)
         self.user.refresh_from_db()
         self.assertFalse(self.user.is_paid)
+
+    def test_home_feed_paginates_with_cursor(self):
+        self.login()
+        for i in range(5):
+            Room.objects.create(host=self.user, topic=self.general_topic, name=f"Extra {i}")
+
+        resp = self.client.get(reverse("home"), {"page_size": 3})
+        self.assertEqual(resp.status_code, 200)
+        first_page = list(resp.context["rooms"])
+        self.assertEqual(len(first_page), 3)
+        self.assertEqual(resp.context["room_count"], 6)
+        self.assertIn("cursor=", resp.context["next_page_query"])
+
+        seen = [room.id for room in first_page]
+        query = resp.context["next_page_query"]
+        while query:
+            resp = self.client.get(reverse("home") + "?" + query)
+            self.assertEqual(resp.status_code, 200)
+            seen.extend(room.id for room in resp.context["rooms"])
+            query = resp.context["next_page_query"]
+
+        expected = list(
+            Room.objects.exclude(topic=self.jobs_topic).order_by("-created", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_home_room_count_comes_from_cached_topic_counts(self):
+        self.login()
+        Room.objects.create(host=self.user, topic=None, name="Untopiced")
+        self.client.get(reverse("home"))  # warm the per-topic counts
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse("home"))
+        self.assertEqual(resp.context["room_count"], 2)
+        self.assertFalse([q["sql"] for q in ctx.captured_queries if "COUNT(" in q["sql"]])
+
+        self.assertEqual(self.client.get(reverse("home"), {"topic": "general"}).context["room_count"], 1)
+        self.assertEqual(self.client.get(reverse("home"), {"category": "jobs"}).context["room_count"], 0)
+        self.user.is_paid = True
+        self.user.save()
+        self.assertEqual(self.client.get(reverse("home")).context["room_count"], 3)
+
+    def test_home_search_count_is_capped(self):
+        self.login()
+        for i in range(3):
+            Room.objects.create(host=self.user, topic=self.general_topic, name=f"Needle {i}")
+        with self.settings(FEED_SEARCH_COUNT_LIMIT=2):
+            resp = self.client.get(reverse("home"), {"q": "Needle"})
+        self.assertEqual(resp.context["room_count"], 2)
+        self.assertTrue(resp.context["room_count_capped"])
+        self.assertContains(resp, "2+ posts")
+
+    def test_home_feed_cursor_keeps_filters(self):
+        self.login()
+        for i in range(3):
+            Room.objects.create(host=self.user, topic=self.general_topic, name=f"Needle {i}")
+
+        resp = self.client.get(reverse("home"), {"q": "Needle", "sort": "new", "page_size": 2})
+        self.assertIn("q=Needle", resp.context["next_page_query"])
+        resp = self.client.get(reverse("home") + "?" + resp.context["next_page_query"])
+        self.assertEqual([room.name for room in resp.context["rooms"]], ["Needle 0"])
+        self.assertEqual(resp.context["next_page_query"], "")
+
+    def test_home_feed_ignores_invalid_cursor(self):
+        self.login()
+        resp = self.client.get(reverse("home"), {"cursor": "not-a-cursor"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(self.general_room, list(resp.context["rooms"]))
+
+    def test_home_topic_filters_do_not_touch_topic_table(self):
+        self.login()
+        self.client.get(reverse("home"))  # warm the topic catalogue
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse("home"), {"topic": "general"})
+            self.client.get(reverse("home"), {"category": "jobs"})
+        self.assertEqual(list(resp.context["rooms"]), [self.general_room])
+        self.assertFalse([q["sql"] for q in ctx.captured_queries if "base_topic" in q["sql"]])
+
+        resp = self.client.get(reverse("home"), {"topic": "no-such-topic"})
+        self.assertEqual(list(resp.context["rooms"]), [])
+
+    def test_topic_catalogue_is_invalidated_on_topic_changes(self):
+        self.assertEqual(topics.topic_id_for_slug("general"), self.general_topic.id)
+        with self.assertNumQueries(0):
+            topics.get_topics()
+
+        self.general_topic.name = "General Chat"
+        self.general_topic.save()
+        lounge = Topic.objects.create(name="Lounge", slug="lounge")
+        self.assertEqual(topics.get_topic(str(self.general_topic.id)).name, "General Chat")
+        self.assertEqual(topics.topic_id_for_slug("lounge"), lounge.id)
+        self.assertEqual(topics.get_topic_room_counts().get(self.general_topic.id), 1)
+
+        lounge.delete()
+        self.assertIsNone(topics.topic_id_for_slug("lounge"))
@@ -0,0 +1,206 @@
+import os
+import shutil
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from base.models import PostVote, Room, Topic, User
+from base import vote_buffer
+from base.votes import cast_vote
+
+
+class VoteEndpointTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user1", email="user1@th-deg.de", password="pass12345")
+        topic, _ = Topic.objects.get_or_create(slug="general", defaults={"name": "General"})
+        self.jobs_topic, _ = Topic.objects.get_or_create(slug="jobs-referrals", defaults={"name": "Jobs & Referrals"})
+        self.room = Room.objects.create(host=self.user, topic=topic, name="Room")
+        self.client.login(email=self.user.email, password="pass12345")
+
+    def test_vote_json_toggles_and_returns_counters(self):
+        url = reverse("vote-room-json", args=[self.room.id])
+        self.assertEqual(self.client.post(url, {"direction": "up"}).json(), {"vote": 1, "score": 1, "upvotes": 1, "downvotes": 0})
+        self.assertEqual(self.client.post(url, {"direction": "down"}).json(), {"vote": -1, "score": -1, "upvotes": 0, "downvotes": 1})
+        self.assertEqual(self.client.post(url, {"direction": "down"}).json(), {"vote": 0, "score": 0, "upvotes": 0, "downvotes": 0})
+        self.assertFalse(PostVote.objects.exists())
+
+        self.assertEqual(self.client.post(url, {"direction": "sideways"}).status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(reverse("vote-room-json", args=[0]), {"direction": "up"}).status_code, 404)
+
+    def test_vote_json_respects_premium_topic(self):
+        jobs_room = Room.objects.create(host=self.user, topic=self.jobs_topic, name="Jobs")
+        resp = self.client.post(reverse("vote-room-json", args=[jobs_room.id]), {"direction": "up"})
+        self.assertEqual(resp.status_code, 403)
+        self.assertFalse(PostVote.objects.exists())
+
+    def test_vote_reranks_with_the_stored_comment_count(self):
+        from base.models import Message
+        from base.ranking import hot_rank
+
+        for i in range(20):
+            Message.objects.create(user=self.user, room=self.room, body=f"c{i}")
+        with CaptureQueriesContext(connection) as queries:
+            cast_vote(self.user.id, self.room.id, 1)
+        self.assertFalse([q["sql"] for q in queries if "COUNT(" in q["sql"].upper()])
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.comment_count, 20)
+        self.assertAlmostEqual(self.room.hot_rank, hot_rank(1, 20, self.room.created))
+
+
+@override_settings(VOTE_WRITE_BEHIND=True, VOTE_BUFFER_FLUSH_INTERVAL_MS=0)
+class WriteBehindVoteTests(TestCase):
+    def setUp(self):
+        # The cache-only buffer needs a cache shared with manage.py flush_vote_buffer.
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        shared_cache = override_settings(CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": cache_dir},
+        })
+        shared_cache.enable()
+        self.addCleanup(shared_cache.disable)
+        self.users = [
+            User.objects.create_user(username=f"user{i}", email=f"user{i}@th-deg.de", password="pass12345")
+            for i in range(3)
+        ]
+        self.room = Room.objects.create(host=self.users[0], name="Popular")
+
+    def counters(self):
+        self.room.refresh_from_db()
+        return self.room.score, self.room.upvotes, self.room.downvotes
+
+    def test_voter_reads_own_vote_before_flush(self):
+        self.client.force_login(self.users[0])
+        url = reverse("vote-room-json", args=[self.room.id])
+        self.assertEqual(self.client.post(url, {"direction": "up"}).json(), {"vote": 1, "score": 1, "upvotes": 1, "downvotes": 0})
+        self.assertFalse(PostVote.objects.exists())
+        self.assertEqual(self.counters(), (0, 0, 0))
+
+        resp = self.client.get(reverse("room", args=[self.room.id]))
+        self.assertEqual((resp.context["user_vote"], resp.context["score"]), (1, 1))
+        self.client.force_login(self.users[1])
+        resp = self.client.get(reverse("room", args=[self.room.id]))
+        self.assertEqual((resp.context["user_vote"], resp.context["score"]), (0, 0))
+
+        self.assertEqual(vote_buffer.flush(), 1)
+        self.assertEqual(self.counters(), (1, 1, 0))
+        self.assertIsNone(vote_buffer.pending_vote(self.users[0].id, self.room.id))
+
+    def test_flush_batches_clicks_last_one_wins(self):
+        cast_vote(self.users[0].id, self.room.id, 1)
+        cast_vote(self.users[0].id, self.room.id, -1)  # flip
+        cast_vote(self.users[1].id, self.room.id, 1)
+        cast_vote(self.users[1].id, self.room.id, 1)  # withdrawn
+        cast_vote(self.users[2].id, self.room.id, 1)
+
+        with self.assertNumQueries(9):
+            # Transaction begin/end, live rooms and users, existing votes, one bulk upsert,
+            # one counter update and the hot rank (3).
+            vote_buffer.flush()
+        self.assertEqual(self.counters(), (0, 1, 1))
+        self.assertEqual(dict(PostVote.objects.values_list("user_id", "value")), {self.users[0].id: -1, self.users[2].id: 1})
+
+        cast_vote(self.users[2].id, self.room.id, 1)  # withdraw a stored vote
+        vote_buffer.flush()
+        self.assertEqual(self.counters(), (-1, 0, 1))
+        self.assertEqual(vote_buffer.flush(), 0)
+
+    def test_vote_on_deleted_room_does_not_block_the_buffer(self):
+        doomed = Room.objects.create(host=self.users[0], name="Doomed")
+        cast_vote(self.users[1].id, doomed.id, 1)
+        doomed.delete()
+        cast_vote(self.users[1].id, self.room.id, 1)
+
+        vote_buffer.flush()
+        self.assertEqual(self.counters(), (1, 1, 0))
+        self.assertEqual(vote_buffer.flush(), 0)  # nothing left to replay
+        self.assertEqual(list(PostVote.objects.values_list("room_id", flat=True)), [self.room.id])
+
+    def test_flush_skips_a_pair_that_fails_to_apply(self):
+        with mock.patch("base.ranking.refresh_hot_rank", side_effect=[IntegrityError, IntegrityError, None]):
+            cast_vote(self.users[0].id, self.room.id, 1)
+            other = Room.objects.create(host=self.users[0], name="Other")
+            cast_vote(self.users[1].id, other.id, 1)
+            with self.assertLogs("base.vote_buffer", "WARNING"):
+                vote_buffer.flush()
+        self.assertEqual(vote_buffer.flush(), 0)
+        self.assertEqual(PostVote.objects.count(), 1)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_cache_only_buffer_needs_a_shared_cache(self):
+        for interval in (0, 500):
+            with self.settings(VOTE_BUFFER_FLUSH_INTERVAL_MS=interval), self.assertRaises(ImproperlyConfigured):
+                cast_vote(self.users[0].id, self.room.id, 1)
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir, ignore_errors=True)
+        with self.settings(VOTE_BUFFER_DURABILITY="spool", VOTE_BUFFER_SPOOL_PATH=os.path.join(spool_dir, "votes.spool")):
+            cast_vote(self.users[0].id, self.room.id, 1)
+
+    def test_spool_survives_losing_the_cache(self):
+        spool = os.path.join(tempfile.mkdtemp(), "votes.spool")
+        with self.settings(VOTE_BUFFER_DURABILITY="fsync", VOTE_BUFFER_SPOOL_PATH=spool):
+            cast_vote(self.users[0].id, self.room.id, 1)
+            cast_vote(self.users[1].id, self.room.id, -1)
+            cache.clear()  # e.g. the web process crashed
+
+            out = StringIO()
+            call_command("flush_vote_buffer", stdout=out)
+            self.assertIn("Flushed 2", out.getvalue())
+        self.assertEqual(self.counters(), (0, 1, 1))
+        self.assertEqual(os.listdir(os.path.dirname(spool)), [])  # nothing left to replay
+
+
+@override_settings(VOTE_LOCK_RETRIES=100)
+class ConcurrentVoteTests(TransactionTestCase):
+    def run_in_parallel(self, calls):
+        """Start every ``(fn, args)`` call on its own thread at once; return the exceptions raised."""
+        start = threading.Barrier(len(calls))
+        errors = []
+
+        def run(fn, args):
+            try:
+                start.wait()
+                fn(*args)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=call) for call in calls]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_parallel_voters_keep_counters_exact(self):
+        users = [
+            User.objects.create_user(username=f"voter{i}", email=f"voter{i}@th-deg.de", password="pass12345")
+            for i in range(12)
+        ]
+        room = Room.objects.create(host=users[0], name="Busy post")
+
+        def click(user, values):
+            for value in values:
+                cast_vote(user.id, room.id, value)
+
+        calls = [(click, (user, [1])) for user in users[:6]]  # plain upvotes
+        calls += [(click, (user, [1, -1])) for user in users[6:10]]  # flipped to down
+        calls += [(click, (users[10], [-1])) for _ in range(3)]  # the same user clicking down 3 times
+        calls += [(click, (users[11], [1, 1]))]  # voted and withdrawn
+        self.assertEqual(self.run_in_parallel(calls), [])
+
+        room.refresh_from_db()
+        self.assertEqual(PostVote.objects.get(user=users[10]).value, -1)
+        self.assertEqual((room.upvotes, room.downvotes, room.score), (6, 5, 1))
+        self.assertEqual(room.upvotes, PostVote.objects.filter(room=room, value=1).count())
+        self.assertEqual(room.downvotes, PostVote.objects.filter(room=room, value=-1).count())
@@ -0,0 +1,133 @@
+"""
+Topic catalogue, category groupings and cached per-topic post counts.
+
+The topic table is small and rarely edited, so the whole catalogue is cached
+(and invalidated from base.signals whenever a topic is saved or deleted).
+Views resolve slugs to ids through it and filter rooms on ``topic_id``
+directly, which keeps the topic table out of the hot path entirely.
+
+Signals only clear the cache of the process that made the change. With the
+default per-process cache, writes from other processes (another worker, the
+admin, ``seed_demo_data``) show up once the entries expire after
+``TOPIC_CACHE_TIMEOUT`` seconds; a shared cache backend makes them immediate.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+JOBS_REFERRALS_SLUG = 'jobs-referrals'
+STUDY_MATERIALS_SLUGS = ['exams-study', 'tech-projects']
+
+# Category groupings for landing page
+CATEGORY_GROUPS = {
+    'community': ['wellbeing', 'events-clubs', 'housing', 'relocation', 'buy-sell', 'admin-paperwork', 'other'],
+    'jobs': ['jobs-referrals', 'internships'],
+    'study': ['exams-study', 'tech-projects'],
+    'mentorship': ['alumni-network', 'mentorship'],
+}
+
+TOPIC_CATALOGUE_CACHE_KEY = 'topics:catalogue'
+TOPIC_ROOM_COUNTS_CACHE_KEY = 'topics:room-counts'
+
+
+def _timeout():
+    return getattr(settings, 'TOPIC_CACHE_TIMEOUT', 60)
+
+
+def get_topics():
+    """
+    Return every Topic, ordered by id, from the cached catalogue.
+
+    The instances are plain Topic objects, so they can be assigned to
+    ``Room.topic`` or rendered like queryset results.
+    """
+    topics = cache.get(TOPIC_CATALOGUE_CACHE_KEY)
+    if topics is None:
+        from .models import Topic
+
+        topics = list(Topic.objects.order_by('id'))
+        cache.set(TOPIC_CATALOGUE_CACHE_KEY, topics, timeout=_timeout())
+    return topics
+
+
+def get_topic(topic_id):
+    """Look up a topic by id (as int or string); ``None`` if there is no such topic."""
+    try:
+        topic_id = int(topic_id)
+    except (TypeError, ValueError):
+        return None
+    for topic in get_topics():
+        if topic.id == topic_id:
+            return topic
+    return None
+
+
+def get_topic_by_slug(slug):
+    for topic in get_topics():
+        if slug and topic.slug == slug:
+            return topic
+    return None
+
+
+def topic_id_for_slug(slug):
+    topic = get_topic_by_slug(slug)
+    return topic.id if topic else None
+
+
+def topic_ids_for_slugs(slugs):
+    slugs = set(slugs)
+    return [topic.id for topic in get_topics() if topic.slug in slugs]
+
+
+def attach_topics(rooms):
+    """Set ``room.topic`` from the catalogue on already-loaded rooms, instead of joining base_topic."""
+    topics_by_id = {topic.id: topic for topic in get_topics()}
+    for room in rooms:
+        # Assigning None would also clear topic_id; leave unknown ids to the lazy lookup.
+        if room.topic_id in topics_by_id:
+            room.topic = topics_by_id[room.topic_id]
+    return rooms
+
+
+def invalidate_topics():
+    cache.delete(TOPIC_CATALOGUE_CACHE_KEY)
+
+
+def get_topic_room_counts():
+    """
+    Return ``{topic_id: post count}``; posts without a topic are counted under ``None``.
+
+    Computed with one grouped query on ``base_room`` and cached until a post
+    or topic changes (see base.signals) or TOPIC_CACHE_TIMEOUT passes.
+    """
+    counts = cache.get(TOPIC_ROOM_COUNTS_CACHE_KEY)
+    if counts is None:
+        from .models import Room
+
+        rows = (
+            Room.objects
+            .values('topic_id')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        counts = {row['topic_id']: row['total'] for row in rows}
+        cache.set(TOPIC_ROOM_COUNTS_CACHE_KEY, counts, timeout=_timeout())
+    return counts
+
+
+def get_category_counts():
+    """
+    Return ``{group: post count}`` for every group in CATEGORY_GROUPS.
+
+    Built from the cached catalogue and per-topic counts, so steady-state
+    landing page hits do no database work.
+    """
+    per_topic = get_topic_room_counts()
+    return {
+        group: sum(per_topic.get(topic_id, 0) for topic_id in topic_ids_for_slugs(slugs))
+        for group, slugs in CATEGORY_GROUPS.items()
+    }
+
+
+def invalidate_room_counts():
+    cache.delete(TOPIC_ROOM_COUNTS_CACHE_KEY)
@@ -0,0 +1,175 @@
+"""
+Attachment uploads for Study Materials posts and comments.
+
+Django's default handlers buffer the whole upload (in memory or a temp
+file) before a view ever sees it. Checking ``size`` and the client-supplied
+``content_type`` afterwards therefore comes too late, and the content type
+proves nothing. Views decorated with ``attachment_upload`` put
+AttachmentUploadHandler in front of the default handlers. It checks each
+``attachment`` file while it streams in:
+
+* the first bytes must match one of ATTACHMENT_KINDS (PDF, Word 97-2003 or
+  Word 2007+) and the file name must carry that kind's extension, so a
+  ``.html`` file cannot pass as a PDF; anything else is skipped before it
+  is stored;
+* once more than ``ATTACHMENT_MAX_UPLOAD_SIZE`` bytes have arrived, the
+  upload is stopped and the connection reset, so the rest of the body is
+  never read. Fields after the file are not parsed either;
+* a SHA-256 of the content is computed in the same pass.
+
+The view then calls ``checked_attachment`` to get the file (with ``sha256``
+and ``kind`` set) or the reason it was rejected.
+"""
+import hashlib
+import os
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+FIELD_NAME = 'attachment'
+# Kind -> magic bytes the file must start with. A .docx is a ZIP archive,
+# which is as far as the first bytes go.
+ATTACHMENT_KINDS = {
+    'pdf': b'%PDF-',
+    'doc': b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',
+    'docx': b'PK\x03\x04',
+}
+# Kind -> the file name extension it must be uploaded (and is stored) with.
+KIND_EXTENSIONS = {
+    'pdf': '.pdf',
+    'doc': '.doc',
+    'docx': '.docx',
+}
+SNIFF_BYTES = max(len(magic) for magic in ATTACHMENT_KINDS.values())
+TYPE_ERROR = 'Only PDF and Word documents are allowed.'
+
+
+def max_attachment_size():
+    return getattr(settings, 'ATTACHMENT_MAX_UPLOAD_SIZE', 10 * 1024 * 1024)
+
+
+def size_error():
+    return f'File size must be less than {max_attachment_size() // (1024 * 1024)}MB.'
+
+
+def sniff(head):
+    """The ATTACHMENT_KINDS name ``head`` (the first bytes of a file) belongs to, or None."""
+    for kind, magic in ATTACHMENT_KINDS.items():
+        if head.startswith(magic):
+            return kind
+    return None
+
+
+class AttachmentUploadHandler(FileUploadHandler):
+    """
+    Checks ``attachment`` files while they stream in and passes every chunk
+    on to the next handler, which stores the file. Other fields are left alone.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = max_attachment_size()
+        # Field name -> sha256 / kind of accepted files, or why one was rejected.
+        self.digests = {}
+        self.kinds = {}
+        self.errors = {}
+        self._checking = False
+
+    def _reject(self, message, stop=False):
+        """Record why the file was rejected and skip it, or with ``stop`` abort the whole upload."""
+        self.errors[self.field_name] = message
+        self._checking = False
+        if stop:
+            raise StopUpload(connection_reset=True)
+        raise SkipFile()
+
+    def _sniffed_kind(self):
+        """The kind sniffed so far, or None if unknown or the file name claims another one."""
+        kind = sniff(self._head)
+        if kind is None or KIND_EXTENSIONS[kind] != self._extension:
+            return None
+        return kind
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self._checking = field_name == FIELD_NAME
+        if not self._checking:
+            return
+        self._sha256 = hashlib.sha256()
+        self._head = b''
+        self._size = 0
+        self._extension = os.path.splitext(file_name)[1].lower()
+        if content_length is not None and content_length > self.max_size:
+            self._reject(size_error(), stop=True)
+        if self._extension not in KIND_EXTENSIONS.values():
+            self._reject(TYPE_ERROR)
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self._checking:
+            return raw_data
+        self._size += len(raw_data)
+        if self._size > self.max_size:
+            self._reject(size_error(), stop=True)
+        if len(self._head) < SNIFF_BYTES:
+            self._head += raw_data[:SNIFF_BYTES - len(self._head)]
+            if len(self._head) >= SNIFF_BYTES and self._sniffed_kind() is None:
+                self._reject(TYPE_ERROR)
+        self._sha256.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self._checking:
+            # Files shorter than SNIFF_BYTES are only sniffed here, after the
+            # next handler has stored them; checked_attachment drops them.
+            kind = self._sniffed_kind()
+            if kind is None:
+                self.errors[self.field_name] = TYPE_ERROR
+            else:
+                self.kinds[self.field_name] = kind
+                self.digests[self.field_name] = self._sha256.hexdigest()
+            self._checking = False
+        return None
+
+
+def attachment_upload(view):
+    """
+    Decorate a view that accepts an ``attachment`` upload.
+
+    Upload handlers can only be changed before the request body is parsed,
+    and CsrfViewMiddleware parses it to read the token. The view is
+    therefore exempted from the middleware and CSRF-protected again once the
+    handler is in place.
+    """
+    protected = csrf_protect(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers.insert(0, AttachmentUploadHandler(request))
+        return protected(request, *args, **kwargs)
+
+    return csrf_exempt(wrapper)
+
+
+def checked_attachment(request):
+    """
+    Return ``(file, error)`` for the request's ``attachment`` upload.
+
+    ``file`` is None when nothing (acceptable) was uploaded; ``error`` is the
+    message to show when the upload was rejected. An accepted file carries
+    its ``sha256`` hex digest and sniffed ``kind``.
+    """
+    handler = next((h for h in request.upload_handlers if isinstance(h, AttachmentUploadHandler)), None)
+    if handler is None:
+        raise ImproperlyConfigured('The view must be decorated with base.uploads.attachment_upload.')
+    uploaded_file = request.FILES.get(FIELD_NAME)
+    error = handler.errors.get(FIELD_NAME)
+    if error:
+        return None, error
+    if uploaded_file is None:
+        return None, None
+    uploaded_file.sha256 = handler.digests[FIELD_NAME]
+    uploaded_file.kind = handler.kinds[FIELD_NAME]
+    return uploaded_file, None
@@ -8,7 +8,9 @@ urlpatterns = [
     path('register/', views.registerPage, name = "register"),
     path('home/', views.home, name="home"),
     path('room/<str:pk>/', views.room, name ="room"),
+    path('room/<str:pk>/comments/', views.room_comments, name='room-comments'),
     path('room/<str:pk>/vote/', views.voteRoom, name='vote-room'),
+    path('room/<str:pk>/vote.json', views.vote_room_json, name='vote-room-json'),
     path('profile/<str:pk>/', views.userProfile, name="user-profile"),
     path('create-room/', views.createRoom, name = "create-room"),
     path('update-room/<str:pk>/', views.updateRoom, name = "update-room"),
@@ -20,7 +22,10 @@ urlpatterns = [
     # Messaging
     path('messages/', views.inbox, name='inbox'),
     path('messages/new/', views.start_conversation, name='start-conversation'),
+    path('messages/events/', views.message_events, name='message-events'),
+    path('messages/users/', views.user_search, name='user-search'),
     path('messages/<str:pk>/', views.conversation, name='conversation'),
+    path('messages/<str:pk>/earlier/', views.conversation_history, name='conversation-history'),
     # Mentorship
     path('mentorship/profile/', views.mentorship_profile, name='mentorship-profile'),
     path('mentorship/profile/delete/', views.delete_mentorship_profile, name='delete-mentorship-profile'),
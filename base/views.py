@@ -1,24 +1,31 @@
+import json
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.contrib import messages
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Sum
-from django.db.models.functions import Coalesce
 from django.contrib.auth import authenticate, login, logout
 from django.conf import settings
-from .models import Room, Topic, Message, User, PostVote, DirectMessage, MentorProfile
+from django.db import connection
+from .models import Room, Message, User, MentorProfile
 from .forms import RoomForm, UserForm, MyUserCreationForm, MentorProfileForm
+from .pagination import InvalidCursor, keyset_paginate
+from .topics import (
+    CATEGORY_GROUPS, JOBS_REFERRALS_SLUG, STUDY_MATERIALS_SLUGS, attach_topics, get_category_counts, get_topic,
+    get_topic_by_slug, get_topic_room_counts, get_topics, topic_id_for_slug, topic_ids_for_slugs,
+)
+from . import activity, events, messaging, search, uploads, votes
 
 
-JOBS_REFERRALS_SLUG = 'jobs-referrals'
-STUDY_MATERIALS_SLUGS = ['exams-study', 'tech-projects']
 
-# Category groupings for landing page
-CATEGORY_GROUPS = {
-    'community': ['wellbeing', 'events-clubs', 'housing', 'relocation', 'buy-sell', 'admin-paperwork', 'other'],
-    'jobs': ['jobs-referrals', 'internships'],
-    'study': ['exams-study', 'tech-projects'],
-    'mentorship': ['alumni-network', 'mentorship'],
+# Feed orderings: ?sort=<key> -> (label, indexed Room column used as the keyset).
+FEED_SORTS = {
+    'new': ('Newest', 'created'),
+    'top': ('Top', 'score'),
+    'hot': ('Hot', 'hot_rank'),
 }
 
 
@@ -26,16 +33,102 @@ def _user_can_access_jobs_referrals(user):
     return bool(getattr(user, 'is_paid', False))
 
 
-def _restrict_jobs_referrals_rooms(queryset, user):
+def _is_jobs_referrals(room):
+    jobs_topic_id = topic_id_for_slug(JOBS_REFERRALS_SLUG)
+    return jobs_topic_id is not None and room.topic_id == jobs_topic_id
+
+
+def _restrict_jobs_referrals_rooms(queryset, user, topic_field='topic_id'):
     if _user_can_access_jobs_referrals(user):
         return queryset
-    return queryset.exclude(topic__slug=JOBS_REFERRALS_SLUG)
+    jobs_topic_id = topic_id_for_slug(JOBS_REFERRALS_SLUG)
+    if jobs_topic_id is None:
+        return queryset
+    return queryset.exclude(**{topic_field: jobs_topic_id})
 
 
-def _restrict_jobs_referrals_topics(queryset, user):
+def _restrict_jobs_referrals_topics(topics, user):
     if _user_can_access_jobs_referrals(user):
-        return queryset
-    return queryset.exclude(slug=JOBS_REFERRALS_SLUG)
+        return list(topics)
+    return [topic for topic in topics if topic.slug != JOBS_REFERRALS_SLUG]
+
+
+def _feed_page_size(request):
+    default = getattr(settings, 'FEED_PAGE_SIZE', 20)
+    maximum = getattr(settings, 'FEED_MAX_PAGE_SIZE', 100)
+    try:
+        size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+def _feed_sort(request, ranked=False):
+    sort = request.GET.get('sort')
+    if ranked and sort in (None, 'relevance'):
+        return 'relevance'
+    return sort if sort in FEED_SORTS else 'new'
+
+
+def _feed_sort_links(request, ranked=False):
+    sorts = list(FEED_SORTS.items())
+    if ranked:
+        sorts.insert(0, ('relevance', ('Relevance', None)))
+    links = []
+    for key, (label, _) in sorts:
+        params = request.GET.copy()
+        params.pop('cursor', None)
+        params['sort'] = key
+        links.append({'key': key, 'label': label, 'query': params.urlencode()})
+    return links
+
+
+def _feed_room_count(user, category, topic_slug, topic):
+    """Number of posts in the (unsearched) feed, from the cached per-topic counts."""
+    counts = get_topic_room_counts()
+    topic_ids = set(counts)
+    if category in CATEGORY_GROUPS:
+        topic_ids &= set(topic_ids_for_slugs(CATEGORY_GROUPS[category]))
+    if topic_slug:
+        topic_ids &= {topic.id} if topic else set()
+    if not _user_can_access_jobs_referrals(user):
+        topic_ids.discard(topic_id_for_slug(JOBS_REFERRALS_SLUG))
+    return sum(counts[topic_id] for topic_id in topic_ids)
+
+
+def _capped_count(queryset, limit):
+    """``(count, capped)``: counts at most ``limit`` rows, so big search results cost no more than small ones."""
+    count = queryset.order_by().values('pk')[:limit + 1].count()
+    return min(count, limit), count > limit
+
+
+def _feed_page(request, rooms, ranked=False):
+    """
+    Return one keyset page of ``rooms`` for the requested sort plus the "load more" query string.
+
+    ``ranked`` means ``rooms`` carries a full-text ``search_rank``, which
+    becomes the default (ascending) ordering.
+    """
+    rooms = rooms.select_related('host')
+    sort = _feed_sort(request, ranked)
+    if sort == 'relevance':
+        key, descending = 'search_rank', False
+    else:
+        key, descending = FEED_SORTS[sort][1], True
+    page_size = _feed_page_size(request)
+    try:
+        page = keyset_paginate(rooms, key, request.GET.get('cursor'), page_size, descending)
+    except InvalidCursor:
+        page = keyset_paginate(rooms, key, None, page_size, descending)
+    # Topics come from the cached catalogue rather than a join per page.
+    attach_topics(page)
+
+    next_page_query = ''
+    if page.has_next:
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        next_page_query = params.urlencode()
+    return page, next_page_query
 
 
 
@@ -91,17 +184,14 @@ def registerPage(request):
 
 def landing(request):
     """Landing page with 4 main categories."""
-    # Count posts for each category group
-    community_count = Room.objects.filter(topic__slug__in=CATEGORY_GROUPS['community']).count()
-    jobs_count = Room.objects.filter(topic__slug__in=CATEGORY_GROUPS['jobs']).count()
-    study_count = Room.objects.filter(topic__slug__in=CATEGORY_GROUPS['study']).count()
-    mentorship_count = Room.objects.filter(topic__slug__in=CATEGORY_GROUPS['mentorship']).count()
+    # Count posts for each category group (cached, see base.topics)
+    counts = get_category_counts()
 
     context = {
-        'community_count': community_count,
-        'jobs_count': jobs_count,
-        'study_count': study_count,
-        'mentorship_count': mentorship_count,
+        'community_count': counts['community'],
+        'jobs_count': counts['jobs'],
+        'study_count': counts['study'],
+        'mentorship_count': counts['mentorship'],
     }
     return render(request, 'base/landing.html', context)
 
@@ -120,28 +210,33 @@ def home(request):
     
     # Filter by category group (from landing page)
     if category and category in CATEGORY_GROUPS:
-        category_slugs = CATEGORY_GROUPS[category]
-        rooms = rooms.filter(topic__slug__in=category_slugs)
-    
-    if topic_slug:
-        rooms = rooms.filter(topic__slug=topic_slug)
-    if q:
-        rooms = rooms.filter(
-            Q(name__icontains=q) |
-            Q(description__icontains=q) |
-            Q(topic__name__icontains=q)
-        )
+        rooms = rooms.filter(topic_id__in=topic_ids_for_slugs(CATEGORY_GROUPS[category]))
 
+    topic = get_topic_by_slug(topic_slug)
+    if topic_slug:
+        rooms = rooms.filter(topic_id=topic.id) if topic else rooms.none()
     rooms = _restrict_jobs_referrals_rooms(rooms, request.user)
-    rooms = rooms.annotate(score=Coalesce(Sum('votes__value'), 0)).order_by('-created')
+    ranked = False
+    if q:
+        rooms, ranked = search.search_rooms(rooms, q)
 
-    topics = _restrict_jobs_referrals_topics(Topic.objects.all(), request.user)
-    room_count = rooms.count()
-    room_messages = Message.objects.filter(Q(room__topic__slug=topic_slug) if topic_slug else Q())
-    if not _user_can_access_jobs_referrals(request.user):
-        room_messages = room_messages.exclude(room__topic__slug=JOBS_REFERRALS_SLUG)
     if q:
-        room_messages = room_messages.filter(Q(room__topic__name__icontains=q) | Q(body__icontains=q))
+        room_count, room_count_capped = _capped_count(rooms, settings.FEED_SEARCH_COUNT_LIMIT)
+    else:
+        room_count, room_count_capped = _feed_room_count(request.user, category, topic_slug, topic), False
+    page, next_page_query = _feed_page(request, rooms, ranked)
+
+    topics = _restrict_jobs_referrals_topics(get_topics(), request.user)
+    if topic_slug or q:
+        room_messages = Message.objects.all()
+        if topic_slug:
+            room_messages = room_messages.filter(room__topic_id=topic.id) if topic else room_messages.none()
+        room_messages = _restrict_jobs_referrals_rooms(room_messages, request.user, 'room__topic_id')
+        if q:
+            room_messages = search.search_messages(room_messages, q)
+        room_messages = activity.bounded_activity(room_messages)
+    else:
+        room_messages = activity.recent_activity(_user_can_access_jobs_referrals(request.user))
 
     # Get category name for display
     category_names = {
@@ -153,9 +248,13 @@ def home(request):
     current_category = category_names.get(category, '')
 
     context = {
-        'rooms': rooms, 
+        'rooms': page,
+        'next_page_query': next_page_query,
+        'current_sort': _feed_sort(request, ranked),
+        'sort_links': _feed_sort_links(request, ranked),
         'topics': topics, 
         'room_count': room_count, 
+        'room_count_capped': room_count_capped,
         'room_messages': room_messages,
         'current_category': current_category,
         'is_mentorship_category': category == 'mentorship',
@@ -175,70 +274,93 @@ def home(request):
     return render(request, 'base/home.html', context)
 
 
+def _comment_page(room, cursor):
+    """One page of a post's comments, newest first, with their authors loaded."""
+    comments = Message.objects.filter(room=room).select_related('user')
+    return keyset_paginate(comments, 'created', cursor, settings.ROOM_COMMENTS_PAGE_SIZE)
+
+
 @login_required(login_url='login')
+@uploads.attachment_upload
 def room(request, pk):
     room = Room.objects.get(id=pk)
 
-    if getattr(room.topic, 'slug', None) == JOBS_REFERRALS_SLUG and not _user_can_access_jobs_referrals(request.user):
+    if _is_jobs_referrals(room) and not _user_can_access_jobs_referrals(request.user):
         messages.error(request, 'Jobs & Referrals is a premium category. Enable premium access to view and comment.')
         return redirect('home')
 
-    score = room.votes.aggregate(score=Coalesce(Sum('value'), 0))['score']
-    room_messages = room.message_set.all().order_by('-created')
-    participants = room.participants.all()
+    score = room.score
     if request.method == 'POST':
-        if getattr(room.topic, 'slug', None) == JOBS_REFERRALS_SLUG and not _user_can_access_jobs_referrals(request.user):
+        if _is_jobs_referrals(room) and not _user_can_access_jobs_referrals(request.user):
             messages.error(request, 'Premium access is required to comment in Jobs & Referrals.')
             return redirect('home')
         
         # Handle file attachment for Study Materials comments
         attachment_file = None
-        if room.is_study_material() and 'attachment' in request.FILES:
-            uploaded_file = request.FILES['attachment']
-            # Validate file type
-            allowed_types = ['application/pdf', 'application/msword', 
-                           'application/vnd.openxmlformats-officedocument.wordprocessingml.document']
-            if uploaded_file.content_type not in allowed_types:
-                messages.error(request, 'Only PDF and Word documents are allowed.')
-                return redirect('room', pk=room.id)
-            # Validate file size (max 10MB)
-            if uploaded_file.size > 10 * 1024 * 1024:
-                messages.error(request, 'File size must be less than 10MB.')
+        if room.is_study_material():
+            # Type and size were checked while the file streamed in.
+            attachment_file, error = uploads.checked_attachment(request)
+            if error:
+                messages.error(request, error)
                 return redirect('room', pk=room.id)
-            attachment_file = uploaded_file
         
         message = Message.objects.create(
             user = request.user,
             room = room,
             body = request.POST.get('body'),
-            attachment = attachment_file
+            attachment = attachment_file,
+            attachment_sha256 = attachment_file.sha256 if attachment_file else '',
         )
         room.participants.add(request.user)
         return redirect('room', pk = room.id)
 
     user_vote = 0
     if request.user.is_authenticated:
-        existing = PostVote.objects.filter(user=request.user, room=room).first()
-        user_vote = existing.value if existing else 0
+        user_vote, score = votes.viewer_state(request.user.id, room)
+
+    try:
+        comments = _comment_page(room, request.GET.get('cursor'))
+    except InvalidCursor:
+        comments = _comment_page(room, None)
+    participants = list(room.participants.order_by('id')[:settings.ROOM_PARTICIPANTS_SHOWN])
 
     context = {
         'room': room,
-        'room_messages': room_messages,
+        'room_messages': comments.items,
+        'older_cursor': comments.next_cursor,
         'participants': participants,
+        'participant_count': room.participant_count,
+        'more_participants': max(room.participant_count - len(participants), 0),
         'score': score,
         'user_vote': user_vote,
     }
     return render (request, 'base/room.html', context)
 
+@login_required(login_url='login')
+def room_comments(request, pk):
+    """JSON page of older comments on a post, rendered as HTML, for "show older"."""
+    room = Room.objects.get(id=pk)
+    if _is_jobs_referrals(room) and not _user_can_access_jobs_referrals(request.user):
+        return JsonResponse({'detail': 'Premium access is required for Jobs & Referrals.'}, status=403)
+    try:
+        comments = _comment_page(room, request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'detail': 'Invalid cursor.'}, status=400)
+
+    html = render_to_string(
+        'base/room_comments.html', {'room': room, 'room_messages': comments.items}, request=request,
+    )
+    return JsonResponse({'html': html, 'next_cursor': comments.next_cursor})
+
+
 @login_required(login_url='login')
 def userProfile(request, pk):
     user = User.objects.get(id=pk)
     rooms = _restrict_jobs_referrals_rooms(user.room_set.all(), request.user)
-    rooms = rooms.annotate(score=Coalesce(Sum('votes__value'), 0)).order_by('-created')
-    room_messages = user.message_set.all()
-    if not _user_can_access_jobs_referrals(request.user):
-        room_messages = room_messages.exclude(room__topic__slug=JOBS_REFERRALS_SLUG)
-    topics = _restrict_jobs_referrals_topics(Topic.objects.all(), request.user)
+    page, next_page_query = _feed_page(request, rooms)
+    room_messages = _restrict_jobs_referrals_rooms(user.message_set.all(), request.user, 'room__topic_id')
+    room_messages = activity.bounded_activity(room_messages)
+    topics = _restrict_jobs_referrals_topics(get_topics(), request.user)
     
     # Get mentor profile if exists
     try:
@@ -248,7 +370,8 @@ def userProfile(request, pk):
     
     context = {
         'user': user, 
-        'rooms': rooms, 
+        'rooms': page,
+        'next_page_query': next_page_query,
         'room_messages': room_messages, 
         'topics': topics,
         'mentor_profile': mentor_profile,
@@ -257,20 +380,21 @@ def userProfile(request, pk):
 
 
 @login_required(login_url= 'login')
+@uploads.attachment_upload
 def createRoom(request):
     form = RoomForm()
-    topics = _restrict_jobs_referrals_topics(Topic.objects.all(), request.user)
+    topics = _restrict_jobs_referrals_topics(get_topics(), request.user)
     # Check if we're creating a study material post
     category = request.GET.get('category', '')
     is_study_category = category == 'study'
     
     # Get default topic based on category
     if is_study_category:
-        default_topic = Topic.objects.filter(slug='exams-study').first()
+        default_topic = get_topic_by_slug('exams-study')
     else:
-        default_topic = Topic.objects.filter(slug='community').first()
+        default_topic = get_topic_by_slug('community')
     if not default_topic:
-        default_topic = Topic.objects.first()
+        default_topic = next(iter(get_topics()), None)
     
     if request.method == 'POST':
         description = request.POST.get('description', '').strip()
@@ -283,19 +407,12 @@ def createRoom(request):
 
         # Handle file upload for Study Materials
         attachment = None
-        if is_study_category and 'attachment' in request.FILES:
-            uploaded_file = request.FILES['attachment']
-            # Validate file type (PDF and Word documents only)
-            allowed_types = ['application/pdf', 'application/msword', 
-                           'application/vnd.openxmlformats-officedocument.wordprocessingml.document']
-            if uploaded_file.content_type not in allowed_types:
-                messages.error(request, 'Only PDF and Word documents are allowed.')
-                return render(request, 'base/room_form.html', {'form': form, 'topics': topics, 'room': None, 'is_study_category': is_study_category})
-            # Limit file size to 10MB
-            if uploaded_file.size > 10 * 1024 * 1024:
-                messages.error(request, 'File size must be less than 10MB.')
+        if is_study_category:
+            # PDF and Word documents only, checked while the file streamed in.
+            attachment, error = uploads.checked_attachment(request)
+            if error:
+                messages.error(request, error)
                 return render(request, 'base/room_form.html', {'form': form, 'topics': topics, 'room': None, 'is_study_category': is_study_category})
-            attachment = uploaded_file
 
         room = Room.objects.create(
             host = request.user,
@@ -303,6 +420,7 @@ def createRoom(request):
             name = name,
             description = description,
             attachment = attachment,
+            attachment_sha256 = attachment.sha256 if attachment else '',
         )
 
         if is_study_category:
@@ -316,13 +434,13 @@ def createRoom(request):
 def updateRoom(request, pk):
     room = Room.objects.get(id = pk)
     form = RoomForm(instance=room)
-    topics = _restrict_jobs_referrals_topics(Topic.objects.all(), request.user)
+    topics = _restrict_jobs_referrals_topics(get_topics(), request.user)
     if request.user != room.host:
         return HttpResponse('You are not allowed here!')
 
     if request.method == 'POST':
         topic_id = request.POST.get('topic')
-        topic = Topic.objects.filter(id=topic_id).first()
+        topic = get_topic(topic_id)
         if not topic:
             messages.error(request, 'Please select a valid category.')
             return render(request, 'base/room_form.html', {'form': form, 'topics': topics, 'room': room})
@@ -378,12 +496,10 @@ def updateUser(request):
             return redirect('user-profile', pk=user.id)
 
     # Topics for the left sidebar
-    topics = _restrict_jobs_referrals_topics(Topic.objects.all(), request.user)
+    topics = _restrict_jobs_referrals_topics(get_topics(), request.user)
 
     # Activity for the right sidebar
-    room_messages = Message.objects.all().order_by('-created')
-    if not _user_can_access_jobs_referrals(request.user):
-        room_messages = room_messages.exclude(room__topic__slug=JOBS_REFERRALS_SLUG)
+    room_messages = activity.recent_activity(_user_can_access_jobs_referrals(request.user))
 
     context = {
         'form': form,
@@ -396,8 +512,12 @@ def updateUser(request):
 @login_required(login_url='login')
 def topicsPage(request):
     q = request.GET.get('q') if request.GET.get('q') != None else ''
-    topics = Topic.objects.filter(name__icontains=q)
+    needle = q.casefold()
+    topics = [topic for topic in get_topics() if needle in topic.name.casefold()]
     topics = _restrict_jobs_referrals_topics(topics, request.user)
+    room_counts = get_topic_room_counts()
+    for topic in topics:
+        topic.room_count = room_counts.get(topic.id, 0)
     return render(request, 'base/topics.html', {'topics': topics})
 
 
@@ -405,29 +525,35 @@ def topicsPage(request):
 def voteRoom(request, pk):
     room = Room.objects.get(id=pk)
 
-    if getattr(room.topic, 'slug', None) == JOBS_REFERRALS_SLUG and not _user_can_access_jobs_referrals(request.user):
+    if _is_jobs_referrals(room) and not _user_can_access_jobs_referrals(request.user):
         messages.error(request, 'Premium access is required for Jobs & Referrals.')
         return redirect('home')
 
     direction = request.POST.get('direction')
     value = 1 if direction == 'up' else -1
-
-    existing = PostVote.objects.filter(user=request.user, room=room).first()
-    if existing and existing.value == value:
-        existing.delete()
-    else:
-        PostVote.objects.update_or_create(
-            user=request.user,
-            room=room,
-            defaults={'value': value},
-        )
+    votes.cast_vote(request.user.id, room.id, value)
     return redirect('room', pk=room.id)
 
+
+@login_required(login_url='login')
+def vote_room_json(request, pk):
+    """POST ``direction=up|down``; toggles the vote and returns the new counters as JSON."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required.'}, status=405)
+    direction = request.POST.get('direction')
+    if direction not in ('up', 'down'):
+        return JsonResponse({'error': 'direction must be "up" or "down".'}, status=400)
+    row = Room.objects.filter(id=pk).values('id', 'topic_id').first() if pk.isdigit() else None
+    if row is None:
+        return JsonResponse({'error': 'Post not found.'}, status=404)
+    jobs_topic_id = topic_id_for_slug(JOBS_REFERRALS_SLUG)
+    if jobs_topic_id is not None and row['topic_id'] == jobs_topic_id and not _user_can_access_jobs_referrals(request.user):
+        return JsonResponse({'error': 'Premium access is required for Jobs & Referrals.'}, status=403)
+    return JsonResponse(votes.cast_vote(request.user.id, row['id'], 1 if direction == 'up' else -1))
+
 @login_required(login_url='login')
 def activityPage(request):
-    room_messages = Message.objects.all()
-    if not _user_can_access_jobs_referrals(request.user):
-        room_messages = room_messages.exclude(room__topic__slug=JOBS_REFERRALS_SLUG)
+    room_messages = activity.recent_activity(_user_can_access_jobs_referrals(request.user))
     return render(request, 'base/activity.html', {'room_messages': room_messages})
 
 
@@ -457,35 +583,18 @@ def demoUnsubscribe(request):
 def inbox(request):
     """Show list of conversations for the current user."""
     user = request.user
-    
-    # Get all users the current user has exchanged messages with
-    sent_to = DirectMessage.objects.filter(sender=user).values_list('receiver', flat=True)
-    received_from = DirectMessage.objects.filter(receiver=user).values_list('sender', flat=True)
-    conversation_user_ids = set(sent_to) | set(received_from)
-    
+
     conversations = []
-    for other_user_id in conversation_user_ids:
-        other_user = User.objects.get(id=other_user_id)
-        # Get last message in this conversation
-        last_message = DirectMessage.objects.filter(
-            Q(sender=user, receiver=other_user) | Q(sender=other_user, receiver=user)
-        ).order_by('-created').first()
-        # Count unread messages from this user
-        unread_count = DirectMessage.objects.filter(
-            sender=other_user, receiver=user, is_read=False
-        ).count()
+    total_unread = 0
+    for thread in messaging.inbox_conversations(user):
+        unread_count = thread.unread_for(user)
+        total_unread += unread_count
         conversations.append({
-            'user': other_user,
-            'last_message': last_message,
+            'user': thread.other_user(user),
+            'last_message': thread.last_message,
             'unread_count': unread_count,
         })
-    
-    # Sort by last message time (most recent first)
-    conversations.sort(key=lambda x: x['last_message'].created if x['last_message'] else None, reverse=True)
-    
-    # Total unread count
-    total_unread = DirectMessage.objects.filter(receiver=user, is_read=False).count()
-    
+
     context = {
         'conversations': conversations,
         'total_unread': total_unread,
@@ -502,53 +611,146 @@ def conversation(request, pk):
     if request.method == 'POST':
         content = request.POST.get('content', '').strip()
         if content:
-            DirectMessage.objects.create(
-                sender=user,
-                receiver=other_user,
-                content=content
-            )
+            messaging.send_direct_message(user, other_user, content)
             return redirect('conversation', pk=pk)
     
-    # Get all messages between these two users
-    conversation_messages = DirectMessage.objects.filter(
-        Q(sender=user, receiver=other_user) | Q(sender=other_user, receiver=user)
-    ).order_by('created')
-    
+    # Newest page of the thread; older pages come from conversation_history.
+    thread = messaging.get_conversation(user, other_user)
+    conversation_messages = []
+    earlier_cursor = None
+    if thread is not None:
+        page = messaging.history_page(thread)
+        conversation_messages = list(reversed(page.items))
+        earlier_cursor = page.next_cursor
+
     # Mark received messages as read
-    DirectMessage.objects.filter(sender=other_user, receiver=user, is_read=False).update(is_read=True)
+    messaging.mark_conversation_read(thread, user)
     
     context = {
         'other_user': other_user,
         'conversation_messages': conversation_messages,
+        'earlier_cursor': earlier_cursor,
     }
     return render(request, 'base/conversation.html', context)
 
 
+@login_required(login_url='login')
+def conversation_history(request, pk):
+    """JSON page of older messages in a conversation, for "load earlier"."""
+    other_user = User.objects.get(id=pk)
+    thread = messaging.get_conversation(request.user, other_user)
+    if thread is None:
+        return JsonResponse({'messages': [], 'next_cursor': None})
+    try:
+        page = messaging.history_page(thread, request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'detail': 'Invalid cursor.'}, status=400)
+
+    return JsonResponse({
+        # Oldest first, ready to be prepended above what is already shown.
+        'messages': [messaging.message_payload(message, request.user.id) for message in reversed(page.items)],
+        'next_cursor': page.next_cursor,
+    })
+
+
 @login_required(login_url='login')
 def start_conversation(request):
     """Start a new conversation by selecting a user."""
     q = request.GET.get('q', '')
-    
-    # Search for users (exclude self)
-    if q:
-        users = User.objects.filter(
-            Q(username__icontains=q) | Q(name__icontains=q) | Q(email__icontains=q)
-        ).exclude(id=request.user.id)[:20]
-    else:
-        users = User.objects.exclude(id=request.user.id)[:20]
-    
+    users = _find_users(request.user, q, 20)
+
     context = {
         'users': users,
-        'q': q,
+        'search_query': q,
     }
     return render(request, 'base/start_conversation.html', context)
 
 
+def _find_users(user, q, limit):
+    """Other users matching ``q``, best matches first (through the user FTS index when available)."""
+    users = User.objects.exclude(id=user.id)
+    if q:
+        users, ranked = search.search_users(users, q)
+        if ranked:
+            users = users.order_by('search_rank', 'id')
+    return users[:limit]
+
+
+@login_required(login_url='login')
+def user_search(request):
+    """JSON typeahead for picking someone to message."""
+    q = request.GET.get('q', '').strip()
+    if not q:
+        return JsonResponse({'results': []})
+    return JsonResponse({
+        'results': [
+            {
+                'id': user.id,
+                'username': user.username,
+                'name': user.name or user.username,
+                'affiliation': user.get_affiliation_display(),
+                'avatar': user.avatar.url if user.avatar else '',
+                'url': reverse('conversation', args=[user.id]),
+            }
+            for user in _find_users(request.user, q, 8)
+        ],
+    })
+
+
+def _unread_count_and_release_connection(user_id):
+    count = messaging.unread_count(user_id)
+    # The stream itself never touches the database; don't keep a connection open for it.
+    connection.close()
+    return count
+
+
+def _sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+@login_required(login_url='login')
+async def message_events(request):
+    """
+    Server-Sent Events stream of the user's new direct messages and unread count.
+
+    Under ASGI (webappname.asgi) an open stream is just a coroutine waiting on
+    its base.events subscription: it holds no thread and, after the initial
+    unread count, no database connection. Under WSGI the endless stream would
+    tie up a worker, so the view answers 204, which tells EventSource clients
+    not to reconnect.
+    """
+    if not events.streaming_supported(request):
+        return HttpResponse(status=204)
+    user = await request.auser()
+    count = await sync_to_async(_unread_count_and_release_connection)(user.id)
+    keepalive = getattr(settings, 'EVENTS_KEEPALIVE_SECONDS', 15)
+
+    async def stream():
+        subscription = events.get_backend().subscribe(user.id)
+        try:
+            yield 'retry: 5000\n\n'
+            yield _sse({'type': 'unread', 'count': count})
+            while True:
+                pending = await subscription.get(keepalive)
+                if not pending:
+                    # Comment line: keeps proxies from timing out the idle connection.
+                    yield ': keepalive\n\n'
+                for event in pending:
+                    yield _sse(event)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 def get_unread_message_count(user):
     """Helper function to get unread message count for a user."""
     if not user.is_authenticated:
         return 0
-    return DirectMessage.objects.filter(receiver=user, is_read=False).count()
+    return messaging.unread_count(user.id)
 
 
 @login_required(login_url='login')
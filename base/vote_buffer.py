@@ -0,0 +1,294 @@
+"""
+Write-behind buffering for post votes (``VOTE_WRITE_BEHIND = True``).
+
+During a voting burst every click would otherwise take SQLite's write lock.
+In write-behind mode base.votes only records the click here and answers
+straight away. ``flush()`` later applies every buffered click to PostVote
+and the room counters, a few hundred pairs per transaction. It runs
+opportunistically at most once every ``VOTE_BUFFER_FLUSH_INTERVAL_MS``
+(during a vote) and from ``manage.py flush_vote_buffer``.
+
+The buffer stores the *resulting* vote of each click (1, -1 or 0 for
+"withdrawn"), not a delta. Applying entries is therefore idempotent and the
+last entry for a user/room pair wins. Counter deltas are worked out at
+flush time against what is actually stored.
+
+Read-your-own-vote: each voter's pending vote is also kept in the cache,
+and ``pending_vote`` overlays it on the stored one until the flush lands.
+Voters see their own click immediately; everyone else sees it after the
+flush. Across several workers that needs a shared cache.
+
+``VOTE_BUFFER_DURABILITY`` decides what a crash can lose:
+
+* ``'none'``: entries live only in the cache, so losing the cache loses
+  clicks not yet flushed. It needs a shared cache: the opportunistic flush
+  only runs when a later click comes in, so the tail of a burst waits for
+  ``manage.py flush_vote_buffer``, which could never see a local-memory
+  cache. That combination is refused.
+* ``'spool'``: entries are appended to a spool file
+  (``VOTE_BUFFER_SPOOL_PATH``) and handed to the OS. They survive a process
+  crash but not a power failure.
+* ``'fsync'``: as ``'spool'``, but every click is fsync'ed before the
+  response, so it survives a power failure too. This is the slowest.
+"""
+import glob
+import json
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not on POSIX
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_LEVELS = ('none', 'spool', 'fsync')
+PENDING_KEY = 'votes:pending:{}:{}'
+FLUSH_DUE_KEY = 'votes:buffer:flush-due'
+FLUSH_LOCK_KEY = 'votes:buffer:flush-lock'
+# User/room pairs applied per transaction.
+FLUSH_BATCH_SIZE = 200
+
+
+def is_enabled():
+    return getattr(settings, 'VOTE_WRITE_BEHIND', False)
+
+
+class CacheBuffer:
+    """Entries under a per-buffer sequence number in the (shared) cache."""
+
+    sequence_key = 'votes:buffer:seq'
+    flushed_key = 'votes:buffer:flushed'
+    gap_key = 'votes:buffer:gap'
+
+    @staticmethod
+    def entry_key(seq):
+        return f'votes:buffer:{seq}'
+
+    def append(self, entry):
+        cache.add(self.sequence_key, 0, None)
+        seq = cache.incr(self.sequence_key)
+        cache.set(self.entry_key(seq), entry, None)
+
+    def drain(self):
+        """Return ``(entries, done)``; call ``done()`` once the entries are safely applied."""
+        flushed = cache.get(self.flushed_key, 0)
+        latest = cache.get(self.sequence_key, 0)
+        seqs = range(flushed + 1, latest + 1)
+        found = cache.get_many([self.entry_key(seq) for seq in seqs])
+        entries = []
+        for seq in seqs:
+            entry = found.get(self.entry_key(seq))
+            if entry is None:
+                # The writer bumps the sequence before storing the entry: wait
+                # for it one flush, then treat it as evicted.
+                if cache.get(self.gap_key) != seq:
+                    cache.set(self.gap_key, seq, None)
+                    latest = seq - 1
+                    break
+            else:
+                entries.append(entry)
+
+        def done():
+            cache.set(self.flushed_key, latest, None)
+            cache.delete_many([self.entry_key(seq) for seq in range(flushed + 1, latest + 1)])
+
+        return entries, done
+
+
+class SpoolBuffer:
+    """
+    Entries appended as JSON lines to a spool file.
+
+    Writers append under a shared ``flock``. ``drain`` takes the exclusive
+    lock and renames the spool aside, so no write can land in a file that is
+    being applied. Renamed files are only deleted after their entries are
+    committed, and leftovers from a crashed flush are picked up (in order)
+    by the next one.
+    """
+
+    def __init__(self, path, fsync=False):
+        self.path = str(path)
+        self.fsync = fsync
+
+    def _open_current(self, lock):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        while True:
+            spool = open(self.path, 'a', encoding='utf-8')
+            if fcntl is None:
+                return spool
+            fcntl.flock(spool, lock)
+            try:
+                if os.fstat(spool.fileno()).st_ino == os.stat(self.path).st_ino:
+                    return spool
+            except FileNotFoundError:
+                pass
+            # Renamed aside by a flush while we waited for the lock.
+            spool.close()
+
+    def append(self, entry):
+        with self._open_current(fcntl.LOCK_SH if fcntl else None) as spool:
+            spool.write(json.dumps(entry) + '\n')
+            spool.flush()
+            if self.fsync:
+                os.fsync(spool.fileno())
+
+    def drain(self):
+        with self._open_current(fcntl.LOCK_EX if fcntl else None):
+            if os.path.getsize(self.path):
+                os.replace(self.path, f'{self.path}.{time.time_ns()}.flushing')
+        paths = sorted(glob.glob(glob.escape(self.path) + '.*.flushing'))
+        entries = []
+        for path in paths:
+            with open(path, encoding='utf-8') as spool:
+                for line in spool:
+                    try:
+                        entries.append(tuple(json.loads(line)))
+                    except ValueError:
+                        continue  # a line torn by a crash mid-write
+
+        def done():
+            for path in paths:
+                os.remove(path)
+
+        return entries, done
+
+
+def get_buffer():
+    durability = getattr(settings, 'VOTE_BUFFER_DURABILITY', 'none')
+    if durability not in DURABILITY_LEVELS:
+        raise ImproperlyConfigured(f'VOTE_BUFFER_DURABILITY must be one of {", ".join(DURABILITY_LEVELS)}.')
+    if durability == 'none':
+        if isinstance(caches['default'], LocMemCache):
+            # Clicks after the last flush of a burst wait for manage.py
+            # flush_vote_buffer, which runs in another process with its own,
+            # empty local-memory cache: they would be lost on restart.
+            raise ImproperlyConfigured(
+                "VOTE_BUFFER_DURABILITY = 'none' needs a shared cache; "
+                "the local-memory cache cannot be flushed by manage.py flush_vote_buffer."
+            )
+        return CacheBuffer()
+    return SpoolBuffer(settings.VOTE_BUFFER_SPOOL_PATH, fsync=durability == 'fsync')
+
+
+def pending_vote(user_id, room_id):
+    """The voter's buffered vote on a room (1, -1 or 0), or None if nothing is pending."""
+    return cache.get(PENDING_KEY.format(user_id, room_id))
+
+
+def buffer_vote(user_id, room_id, value):
+    """Record a click in the buffer; returns the same shape as base.votes.cast_vote, as the voter sees it."""
+    from .models import PostVote, Room
+
+    stored = PostVote.objects.filter(user_id=user_id, room_id=room_id).values_list('value', flat=True).first() or 0
+    pending = pending_vote(user_id, room_id)
+    current = stored if pending is None else pending
+    new_value = 0 if current == value else value
+
+    get_buffer().append((user_id, room_id, new_value))
+    cache.set(PENDING_KEY.format(user_id, room_id), new_value, None)
+
+    counters = Room.objects.filter(id=room_id).values('score', 'upvotes', 'downvotes').get()
+    for name, delta in Room.vote_counter_deltas(stored, new_value).items():
+        counters[name] += delta
+    result = {'vote': new_value, **counters}
+    interval = getattr(settings, 'VOTE_BUFFER_FLUSH_INTERVAL_MS', 500)
+    if interval and cache.add(FLUSH_DUE_KEY, 1, interval / 1000):
+        try:
+            flush()
+        except Exception:
+            # The click is already buffered; the next flush will retry it.
+            logger.exception('Flushing the vote buffer failed')
+    return result
+
+
+def _apply(targets):
+    """
+    Bring PostVote and the room counters to ``{(user_id, room_id): value}`` in one transaction.
+
+    Pairs whose room or user has been deleted since the click are dropped.
+    """
+    from .models import PostVote, Room, User
+    from .ranking import refresh_hot_rank
+
+    with transaction.atomic():
+        live_rooms = set(Room.objects.filter(id__in={room_id for _, room_id in targets}).values_list('id', flat=True))
+        live_users = set(User.objects.filter(id__in={user_id for user_id, _ in targets}).values_list('id', flat=True))
+        targets = {
+            (user_id, room_id): value for (user_id, room_id), value in targets.items()
+            if room_id in live_rooms and user_id in live_users
+        }
+        existing = {
+            (user_id, room_id): (vote_id, value)
+            for vote_id, user_id, room_id, value in PostVote.objects.filter(
+                user_id__in={user_id for user_id, _ in targets},
+                room_id__in={room_id for _, room_id in targets},
+            ).values_list('id', 'user_id', 'room_id', 'value')
+        }
+        to_delete, to_upsert, room_deltas = [], [], {}
+        for (user_id, room_id), value in targets.items():
+            vote_id, old_value = existing.get((user_id, room_id), (None, 0))
+            if value == old_value:
+                continue
+            if value:
+                to_upsert.append(PostVote(user_id=user_id, room_id=room_id, value=value))
+            else:
+                to_delete.append(vote_id)
+            deltas = room_deltas.setdefault(room_id, {})
+            for name, delta in Room.vote_counter_deltas(old_value, value).items():
+                deltas[name] = deltas.get(name, 0) + delta
+
+        if to_delete:
+            PostVote.objects.filter(id__in=to_delete).delete()
+        if to_upsert:
+            PostVote.objects.bulk_create(
+                to_upsert, update_conflicts=True, unique_fields=['user', 'room'], update_fields=['value'],
+            )
+        now = timezone.now()
+        for room_id, deltas in room_deltas.items():
+            Room.objects.filter(id=room_id).update(
+                updated=now, **{name: F(name) + delta for name, delta in deltas.items()},
+            )
+            refresh_hot_rank(room_id, count_comments=False)
+
+
+def flush():
+    """Apply every buffered vote; returns how many user/room pairs were written."""
+    if not cache.add(FLUSH_LOCK_KEY, 1, 60):
+        return 0  # another flush is running
+    try:
+        entries, done = get_buffer().drain()
+        targets = {}
+        for user_id, room_id, value in entries:
+            targets[(user_id, room_id)] = value
+        pairs = list(targets.items())
+        for start in range(0, len(pairs), FLUSH_BATCH_SIZE):
+            batch = dict(pairs[start:start + FLUSH_BATCH_SIZE])
+            try:
+                _apply(batch)
+            except IntegrityError:
+                # A room or user deleted while the batch was applied. Retry pair
+                # by pair so one bad entry cannot hold back the rest (and done()).
+                for pair, value in batch.items():
+                    try:
+                        _apply({pair: value})
+                    except IntegrityError:
+                        logger.warning('Dropping buffered vote %s -> %s', pair, value, exc_info=True)
+        done()
+        # Drop overlays the database now agrees with; newer clicks keep theirs.
+        keys = {PENDING_KEY.format(*pair): value for pair, value in targets.items()}
+        current = cache.get_many(list(keys))
+        cache.delete_many([key for key, value in current.items() if value == keys[key]])
+        return len(targets)
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
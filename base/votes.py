@@ -0,0 +1,100 @@
+"""
+Post votes: toggling a user's vote and keeping the room counters exact.
+
+``cast_vote`` locks the user's vote row (``SELECT ... FOR UPDATE``), then
+writes the toggled value with a statement conditioned on the value it read.
+The room counters only move by what that write reports as changed, so two
+concurrent clicks (even by the same user) cannot both apply their deltas:
+one waits for the lock, or finds the row already changed and starts over.
+A first vote is inserted in a savepoint; losing the insert race to another
+click just means toggling the row that click created.
+
+When the database is busy (SQLite's "database is locked"), the whole
+transaction is retried (``VOTE_LOCK_RETRIES`` times) before giving up.
+"""
+import random
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.utils import timezone
+
+from . import vote_buffer
+from .models import PostVote, Room
+from .ranking import refresh_hot_rank
+
+
+def _toggle(user_id, room_id, value):
+    """Apply one click and return ``(old_value, new_value)``; must run inside a transaction."""
+    votes = PostVote.objects.filter(user_id=user_id, room_id=room_id)
+    while True:
+        old_value = votes.select_for_update().values_list('value', flat=True).first()
+        if old_value is None:
+            try:
+                with transaction.atomic():
+                    PostVote.objects.create(user_id=user_id, room_id=room_id, value=value)
+            except IntegrityError:
+                if not votes.exists():
+                    raise  # not a duplicate vote (e.g. the room is gone)
+                continue  # another click inserted the vote first: toggle that one
+            return 0, value
+        current = votes.filter(value=old_value)
+        if old_value == value:
+            changed, _ = current.delete()
+        else:
+            changed = current.update(value=value)
+        if changed:
+            return old_value, (0 if old_value == value else value)
+
+
+def _cast_vote(user_id, room_id, value):
+    with transaction.atomic():
+        old_value, new_value = _toggle(user_id, room_id, value)
+        Room.objects.filter(id=room_id).update(
+            updated=timezone.now(),
+            **Room.vote_counter_changes(old_value, new_value),
+        )
+        # Reuses the stored comment count: a vote never counts the room's comments.
+        refresh_hot_rank(room_id, count_comments=False)
+        counters = Room.objects.filter(id=room_id).values('score', 'upvotes', 'downvotes').get()
+    return {'vote': new_value, **counters}
+
+
+def cast_vote(user_id, room_id, value):
+    """
+    Toggle ``user_id``'s ``value`` (+1 / -1) vote on a room.
+
+    Clicking the current vote removes it; clicking the other one flips it.
+    Returns ``{'vote', 'score', 'upvotes', 'downvotes'}`` after the change.
+    With ``VOTE_WRITE_BEHIND`` the click goes to base.vote_buffer instead and
+    the result is what the voter will see once it is flushed.
+    """
+    if value not in (PostVote.Value.UP, PostVote.Value.DOWN):
+        raise ValueError(value)
+    if vote_buffer.is_enabled():
+        return vote_buffer.buffer_vote(user_id, room_id, value)
+    retries = getattr(settings, 'VOTE_LOCK_RETRIES', 5)
+    for attempt in range(retries + 1):
+        try:
+            return _cast_vote(user_id, room_id, value)
+        except OperationalError as exc:
+            # Inside an outer transaction the failed statement has already
+            # poisoned it, so only a top-level vote can be retried.
+            if 'locked' not in str(exc) or attempt == retries or connection.in_atomic_block:
+                raise
+            # Jittered, capped backoff so voters that collided don't retry in lockstep.
+            time.sleep(random.uniform(0, min(0.2, 0.01 * 2 ** attempt)))
+
+
+def viewer_state(user_id, room):
+    """
+    ``(vote, score)`` of a room as ``user_id`` should see it: 1, -1 or 0, and the score.
+
+    A vote still waiting in the write-behind buffer is included, so voters
+    always see their own click.
+    """
+    stored = PostVote.objects.filter(user_id=user_id, room_id=room.id).values_list('value', flat=True).first() or 0
+    pending = vote_buffer.pending_vote(user_id, room.id)
+    if pending is None:
+        return stored, room.score
+    return pending, room.score + pending - stored
@@ -0,0 +1,44 @@
+"""
+Shared setup for the benchmark scripts in this directory.
+
+Each script runs against a throwaway SQLite file (never the developer's
+``db.sqlite3``) so it can be pointed at any checkout:
+
+    python benchmarks/<script>.py --help
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'webappname.settings')
+
+
+def setup_django():
+    import django
+    from django.conf import settings
+
+    db_dir = tempfile.mkdtemp(prefix='bghi7-bench-')
+    settings.DATABASES['default']['NAME'] = os.path.join(db_dir, 'bench.sqlite3')
+    settings.DEBUG = False
+    django.setup()
+
+    from django.core.management import call_command
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    call_command('migrate', verbosity=0)
+
+
+def timed(fn, repeat=5):
+    """Return the best wall-clock time of ``repeat`` calls, in milliseconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
@@ -0,0 +1,81 @@
+"""
+Serialization cost of ``GET /api/rooms/``.
+
+Compares the old endpoint (every room through RoomSerializer with lazy
+host/topic/participants lookups) with the current one: the same serializer
+over a prefetched queryset, one keyset page, and a sparse ``fields=`` page.
+Example:
+
+    python benchmarks/api_rooms.py --rooms 10000 --participants 3
+"""
+import argparse
+
+from _bootstrap import setup_django, timed
+
+
+def seed(rooms, participants):
+    from base.models import Room, Topic, User
+
+    members = [
+        User.objects.create_user(username=f'member{i}', email=f'member{i}@th-deg.de', password='bench12345')
+        for i in range(max(participants, 1))
+    ]
+    topics = list(Topic.objects.exclude(slug='jobs-referrals'))
+    batch = [
+        Room(host=members[i % len(members)], topic=topics[i % len(topics)], name=f'Bench post {i}', description='x' * 80)
+        for i in range(rooms)
+    ]
+    created = Room.objects.bulk_create(batch, batch_size=5000)
+    through = Room.participants.through
+    through.objects.bulk_create(
+        [through(room_id=room.id, user_id=member.id) for room in created for member in members[:participants]],
+        batch_size=5000,
+    )
+    return members[0]
+
+
+def legacy_rooms():
+    from base.api.serializers import RoomSerializer
+    from base.models import Room
+
+    rooms = Room.objects.exclude(topic__slug='jobs-referrals')
+    return RoomSerializer(rooms, many=True).data
+
+
+def prefetched_rooms():
+    from base.api.serializers import RoomSerializer
+    from base.api.views import _room_queryset
+    from base.topics import attach_topics
+
+    rooms = list(_room_queryset(None).exclude(topic__slug='jobs-referrals'))
+    return RoomSerializer(attach_topics(rooms), many=True).data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=10000)
+    parser.add_argument('--participants', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from rest_framework.test import APIClient
+
+    user = seed(args.rooms, args.participants)
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    rows = [
+        ('legacy, all rooms', lambda: legacy_rooms()),
+        ('prefetched, all rooms', lambda: prefetched_rooms()),
+        ('GET /api/rooms/ (one page)', lambda: client.get('/api/rooms/')),
+        ('GET /api/rooms/?fields=id,name', lambda: client.get('/api/rooms/?fields=id,name')),
+    ]
+    print(f'{args.rooms} rooms, {args.participants} participants each')
+    for label, fn in rows:
+        print(f'{label:<34} {timed(fn, args.repeat):>10.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
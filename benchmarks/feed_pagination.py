@@ -0,0 +1,80 @@
+"""
+Home feed latency as the number of rooms grows.
+
+Compares the keyset-paginated ``home`` view (first page and a page deep in
+the feed) against the old unbounded queryset that annotated a vote sum over
+every room. Example:
+
+    python benchmarks/feed_pagination.py --sizes 500 5000 50000 500000
+"""
+import argparse
+
+from _bootstrap import setup_django, timed
+
+
+def seed_rooms(target, host, topics):
+    from base.models import Room
+
+    missing = target - Room.objects.count()
+    batch = []
+    for i in range(missing):
+        batch.append(Room(host=host, topic=topics[i % len(topics)], name=f'Bench post {i}', description='x' * 80))
+        if len(batch) == 5000:
+            Room.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Room.objects.bulk_create(batch)
+
+
+def legacy_feed(user):
+    from django.db.models import Sum
+    from django.db.models.functions import Coalesce
+
+    from base.models import Room
+
+    rooms = Room.objects.exclude(topic__slug='jobs-referrals')
+    return list(rooms.annotate(vote_total=Coalesce(Sum('votes__value'), 0)).order_by('-created'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 5000, 50000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--legacy-limit', type=int, default=50000,
+                        help='Skip the unbounded legacy query above this many rooms.')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.test import Client
+
+    from base.models import Topic, User
+
+    user = User.objects.create_user(username='bench', email='bench@th-deg.de', password='bench12345')
+    topics = list(Topic.objects.exclude(slug='jobs-referrals'))
+    client = Client()
+    client.force_login(user)
+
+    print(f"{'rooms':>8}  {'page 1 (ms)':>12}  {'page 50 (ms)':>12}  {'legacy (ms)':>12}")
+    for size in sorted(args.sizes):
+        seed_rooms(size, user, topics)
+
+        first = timed(lambda: client.get('/home/'), args.repeat)
+
+        query = ''
+        for _ in range(49):
+            resp = client.get('/home/?' + query)
+            query = resp.context['next_page_query']
+            if not query:
+                break
+        deep = timed(lambda: client.get('/home/?' + query), args.repeat) if query else float('nan')
+
+        legacy = float('nan')
+        if size <= args.legacy_limit:
+            legacy = timed(lambda: legacy_feed(user), min(args.repeat, 3))
+
+        print(f'{size:>8}  {first:>12.1f}  {deep:>12.1f}  {legacy:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+RoomSerializer vs. the ``.values()`` fast path (RoomValuesSerializer).
+
+Times fetching and serializing the same rooms both ways, without HTTP or
+rendering in the way, for a full page and for a sparse field set. Example:
+
+    python benchmarks/room_serializers.py --rooms 5000 --page 200
+"""
+import argparse
+
+from _bootstrap import setup_django, timed
+from api_rooms import seed
+
+
+def model_serializer(count, fields):
+    from base.api.serializers import RoomSerializer
+    from base.api.views import _room_queryset
+    from base.models import Room
+    from base.topics import attach_topics
+
+    rooms = attach_topics(list(_room_queryset(fields, Room.objects.order_by('-created', '-id'))[:count]))
+    return RoomSerializer(rooms, many=True, fields=fields).data
+
+
+def values_serializer(count, fields):
+    from base.api.serializers import RoomValuesSerializer
+    from base.models import Room
+
+    rows = list(RoomValuesSerializer.values(Room.objects.order_by('-created', '-id'), fields)[:count])
+    return RoomValuesSerializer(rows, fields).data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=5000)
+    parser.add_argument('--participants', type=int, default=3)
+    parser.add_argument('--page', type=int, default=200, help='Rooms serialized per call.')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    seed(args.rooms, args.participants)
+
+    assert model_serializer(args.page, None) == values_serializer(args.page, None)
+    print(f'{args.page} of {args.rooms} rooms, {args.participants} participants each')
+    for label, fields in (('all fields', None), ('fields=id,name,host', ['id', 'name', 'host'])):
+        slow = timed(lambda: model_serializer(args.page, fields), args.repeat)
+        fast = timed(lambda: values_serializer(args.page, fields), args.repeat)
+        print(f'{label:<22} RoomSerializer {slow:>8.1f} ms   RoomValuesSerializer {fast:>8.1f} ms   {slow / fast:>5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
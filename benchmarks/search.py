@@ -0,0 +1,78 @@
+"""
+Home feed search latency, full-text index vs. the old ``icontains`` scan.
+
+Seeds ``--rooms`` posts of which ``--common`` (a fraction) mention a common
+word, then times ``/home/?q=`` for that word and for a rare one, next to the
+old unindexed query (``icontains`` filter, full COUNT and first page).
+Example:
+
+    python benchmarks/search.py --rooms 200000 --common 0.4
+"""
+import argparse
+import random
+
+from _bootstrap import setup_django, timed
+
+WORDS = ['alpha', 'beta', 'gamma', 'delta', 'kappa', 'omega', 'sigma', 'theta', 'zeta', 'lambda']
+
+
+def seed_rooms(count, common, host, topics):
+    from base import search
+    from base.models import Room
+
+    rng = random.Random(1)
+    batch = []
+    for i in range(count):
+        words = [f'{rng.choice(WORDS)}{rng.randint(0, 500)}' for _ in range(10)]
+        if rng.random() < common:
+            words.append('python')
+        if i == count // 2:
+            words.append('haskell')
+        batch.append(Room(host=host, topic=topics[i % len(topics)], name=f'Bench post {i}', description=' '.join(words)))
+        if len(batch) == 5000:
+            Room.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Room.objects.bulk_create(batch)
+    # bulk_create sends no signals.
+    search.rebuild()
+
+
+def legacy_search(q):
+    from django.db.models import Q
+
+    from base.models import Room
+
+    rooms = Room.objects.exclude(topic__slug='jobs-referrals').filter(
+        Q(name__icontains=q) | Q(description__icontains=q) | Q(topic__name__icontains=q)
+    )
+    return rooms.count(), list(rooms.order_by('-created')[:20])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=50000)
+    parser.add_argument('--common', type=float, default=0.4)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.test import Client
+
+    from base.models import Topic, User
+
+    user = User.objects.create_user(username='bench', email='bench@th-deg.de', password='bench12345')
+    seed_rooms(args.rooms, args.common, user, list(Topic.objects.exclude(slug='jobs-referrals')))
+    client = Client()
+    client.force_login(user)
+
+    print(f"{'query':>10}  {'home (ms)':>10}  {'legacy (ms)':>12}")
+    for q in ('python', 'haskell'):
+        home = timed(lambda: client.get('/home/', {'q': q}), args.repeat)
+        legacy = timed(lambda: legacy_search(q), args.repeat)
+        print(f'{q:>10}  {home:>10.1f}  {legacy:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -67,3 +67,27 @@ if (photoInput)
 // Scroll to Bottom
 const conversationThread = document.querySelector(".room__box");
 if (conversationThread) conversationThread.scrollTop = conversationThread.scrollHeight;
+
+// Live direct messages: keep the inbox badge current and let pages react to
+// new messages (the conversation page listens for "dm:message").
+const messagesLink = document.querySelector(".header__messages[data-events-url]");
+if (messagesLink && window.EventSource) {
+  const source = new EventSource(messagesLink.dataset.eventsUrl);
+  source.addEventListener("unread", (event) => {
+    const { count } = JSON.parse(event.data);
+    let badge = messagesLink.querySelector(".header__messages-badge");
+    if (!count) {
+      if (badge) badge.remove();
+      return;
+    }
+    if (!badge) {
+      badge = document.createElement("span");
+      badge.className = "header__messages-badge";
+      messagesLink.append(badge);
+    }
+    badge.textContent = count;
+  });
+  source.addEventListener("message", (event) => {
+    document.dispatchEvent(new CustomEvent("dm:message", { detail: JSON.parse(event.data) }));
+  });
+}
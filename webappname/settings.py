@@ -90,6 +90,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'base.context_processors.unread_message_count',
+                'base.context_processors.live_message_events',
             ],
         },
     },
@@ -163,6 +164,83 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Caching: without a CACHES setting Django uses a per-process local-memory
+# cache, and invalidation from base.signals only reaches the process that made
+# the change. Cached topics and post counts therefore expire after
+# TOPIC_CACHE_TIMEOUT seconds so changes from other processes (workers, admin,
+# management commands) show up; set CACHES to a shared backend such as Redis
+# or Memcached to make them immediate.
+TOPIC_CACHE_TIMEOUT = 60
+
+# Feed pagination (keyset / "load more"). Clients may ask for ?page_size=
+# up to FEED_MAX_PAGE_SIZE.
+FEED_PAGE_SIZE = int(os.getenv('FEED_PAGE_SIZE', '20'))
+FEED_MAX_PAGE_SIZE = 100
+# Searches count at most this many matching posts ("1000+ posts").
+FEED_SEARCH_COUNT_LIMIT = 1000
+# Full-text post searches rank only the newest this many matches by relevance;
+# older matches are still shown, after them (base.search).
+SEARCH_RESULT_WINDOW = 1000
+
+# /api/rooms/ pagination (keyset, next page in the Link header).
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+# List endpoints (URL names) that build their JSON from .values() rows with
+# RoomValuesSerializer instead of RoomSerializer; the output is identical.
+API_FAST_SERIALIZERS = ['api-rooms', 'api-room-changes', 'api-rooms-batch']
+
+# /api/rooms/changes/ keeps deleted-room tombstones this long (prune them with
+# `manage.py prune_room_tombstones`); older sync cursors must resync from scratch.
+CHANGES_TOMBSTONE_RETENTION_DAYS = 30
+
+# Seconds a rendered feed row stays cached. Row keys are versioned, so this
+# only bounds how long superseded versions linger.
+FEED_ROW_CACHE_TIMEOUT = 3600
+
+# Number of entries in the "Recent Activities" sidebar.
+ACTIVITY_STREAM_SIZE = 20
+# Seconds the sidebar's comment list stays cached when no change drops it
+# sooner; bounds staleness across processes (see CACHES above).
+ACTIVITY_CACHE_TIMEOUT = 60
+
+# Seconds a user's cached unread direct message count (the navbar badge) lives.
+# Short, so a count dropped in one process is not wrong in another for long.
+UNREAD_COUNT_CACHE_TIMEOUT = 60
+
+# Direct messages shown when a conversation opens and per "load earlier" page.
+CONVERSATION_PAGE_SIZE = 50
+
+# Comments shown per page on a post (newest first, "show older" for more), and
+# how many participants the post page lists next to the total.
+ROOM_COMMENTS_PAGE_SIZE = 30
+ROOM_PARTICIPANTS_SHOWN = 24
+
+# Largest Study Materials attachment (PDF/Word) accepted, enforced by
+# base.uploads while the file streams in.
+ATTACHMENT_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+
+# Live direct-message events (see base.events). The in-process backend only
+# reaches connections served by the same process; use
+# 'base.events.CacheEventBackend' with a shared cache when running several
+# workers. Idle streams send a keepalive comment every EVENTS_KEEPALIVE_SECONDS.
+EVENTS_BACKEND = os.getenv('EVENTS_BACKEND', 'base.events.InProcessEventBackend')
+EVENTS_KEEPALIVE_SECONDS = 15
+EVENTS_POLL_INTERVAL = 1.0
+
+# How many times base.votes retries a vote whose transaction hit
+# "database is locked" (with jittered backoff) before returning an error.
+VOTE_LOCK_RETRIES = 5
+
+# Write-behind voting (see base.vote_buffer): clicks are buffered and applied
+# in batches at most every VOTE_BUFFER_FLUSH_INTERVAL_MS (0 = only by
+# `manage.py flush_vote_buffer`). VOTE_BUFFER_DURABILITY is 'none' (cache
+# only), 'spool' (survives a process crash) or 'fsync' (survives power loss).
+# 'none' needs a shared cache (see CACHES above).
+VOTE_WRITE_BEHIND = _env_bool('VOTE_WRITE_BEHIND')
+VOTE_BUFFER_FLUSH_INTERVAL_MS = int(os.getenv('VOTE_BUFFER_FLUSH_INTERVAL_MS', '500'))
+VOTE_BUFFER_DURABILITY = os.getenv('VOTE_BUFFER_DURABILITY', 'none')
+VOTE_BUFFER_SPOOL_PATH = BASE_DIR / 'var' / 'vote-buffer.spool'
+
 # University-only community settings
 # Students can sign up with emails ending in any of these domains.
 # Alumni can sign up with any email, but must provide a valid invitation code.